@@ -1,3 +1,5 @@
-from .video_generator import VideoGenerator
+from .video_generator import VideoGenerator, ProviderError
 from .runway_client import RunwayClient
 from .pika_client import PikaClient
+from .router import VideoRouter, RenderRequest, AllProvidersFailed
+from .render_tasks import RenderSupervisor, RenderTask
@@ -0,0 +1,132 @@
+import logging
+import random
+import threading
+import time
+
+from monitoring.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    "pumpreels_provider_circuit_state",
+    "Circuit breaker state per provider (0 closed, 1 half-open, 2 open).",
+    ("provider",),
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "pumpreels_provider_circuit_transitions_total",
+    "Circuit breaker state changes per provider, by the state entered.",
+    ("provider", "state"),
+)
+PROVIDER_RETRIES = Counter(
+    "pumpreels_provider_retries_total",
+    "Submission retries per provider, and retries refused because the budget was spent.",
+    ("provider", "outcome"),
+)
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. Opens after `failure_threshold` consecutive failures,
+    rejects calls for `open_seconds`, then lets up to `half_open_probes` calls
+    through; one success closes it again and one failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, open_seconds: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set_function(lambda: _STATE_VALUES[self.state])
+
+    @property
+    def state(self) -> str:
+        """Current state; an open breaker whose timeout has elapsed reads as half-open."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through. Does not use up a probe."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self._state == OPEN or self._probes < self.half_open_probes
+        return False
+
+    def allow_request(self) -> bool:
+        """Claims permission for one call. Every allowed call must be followed by record_success or record_failure."""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == OPEN:
+                return False
+            if self._state == OPEN:
+                self._transition(HALF_OPEN)
+            if self._probes >= self.half_open_probes:
+                return False
+            self._probes += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._probes = 0
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._probes = 0
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != self._state:
+            logger.warning("Circuit for %s: %s -> %s", self.name, self._state, state)
+            self._state = state
+            CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent traffic so a struggling provider is not
+    hit with a multiple of its normal load. Each first attempt deposits `ratio`
+    tokens and each retry spends one; `min_tokens` always remain available for
+    low-traffic periods.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 5.0) -> float:
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
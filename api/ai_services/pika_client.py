@@ -1,12 +1,30 @@
+import asyncio
 import requests
 import os
 
-class PikaClient:
+from ai_services.video_generator import VideoGenerator, ProviderError, QUEUED, STARTED, FINISHED, FAILED, CANCELED
+from monitoring.metrics import instrumented
+
+_STATUS_MAP = {
+    "queued": QUEUED,
+    "pending": QUEUED,
+    "started": STARTED,
+    "finished": FINISHED,
+    "failed": FAILED,
+    "canceled": CANCELED,
+}
+
+
+class PikaClient(VideoGenerator):
+    name = "pika"
+    cost_per_second = float(os.environ.get('PIKA_COST_PER_SECOND', 0.04))
+
     def __init__(self):
         self.api_key = os.environ.get('PIKA_API_KEY')
-        self.base_url = 'https://devapi.pika.art'
+        self.base_url = os.environ.get('PIKA_BASE_URL', 'https://devapi.pika.art')
 
 
+    @instrumented("pika", "submit")
     def generate_video(self, image_file, image_bytes, prompt_text, negative_prompt, duration, resolution):
         payload = {
             "promptText": prompt_text,
@@ -24,11 +42,13 @@ class PikaClient:
         }
         url = f"{self.base_url}/generate/2.2/i2v"
 
-        response = requests.post(url, data=payload, headers=headers, files=files)
-
+        response = requests.post(url, data=payload, headers=headers, files=files, timeout=30)
+        if response.status_code >= 400:
+            raise ProviderError(self.name, f"submit failed with {response.status_code}: {response.text[:200]}")
         return response.json()
 
 
+    @instrumented("pika", "poll")
     def check_video_status(self, video_id):
         url = f"{self.base_url}/videos/{video_id}"
         headers = {
@@ -36,5 +56,30 @@ class PikaClient:
             "Accept": "application/json"
         }
 
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=10)
+        # Error bodies (e.g. 404 for an unknown id) carry no status and would read as queued.
+        if response.status_code >= 400:
+            raise ProviderError(self.name, f"status failed with {response.status_code}: {response.text[:200]}")
         return response.json()
+
+
+    async def create_video(self, image_bytes: bytes, prompt_text: str, negative_prompt: str = "",
+                           duration: int = 5, resolution: str = "720p") -> str:
+        # requests is blocking; keep it off the event loop.
+        result = await asyncio.to_thread(
+            self.generate_video, "image.jpg", image_bytes, prompt_text, negative_prompt, duration, resolution
+        )
+        video_id = result.get("video_id") if isinstance(result, dict) else None
+        if not video_id:
+            raise ProviderError(self.name, f"no video_id in response: {result}")
+        return video_id
+
+
+    async def get_task_status(self, task_id: str) -> dict:
+        video = await asyncio.to_thread(self.check_video_status, task_id)
+        status = video.get("status", "queued")
+        return {
+            "status": _STATUS_MAP.get(status, status),
+            "progress": video.get("progress", 0),
+            "url": video.get("url", ""),
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from monitoring.call_accounting import account_calls
+from monitoring.metrics import Counter, Gauge
+from storage.models import Render
+
+logger = logging.getLogger(__name__)
+
+RENDER_TASKS = Counter(
+    "pumpreels_render_tasks_total",
+    "Supervised render tasks by how they ended (ok, failed, cancelled).",
+    ("outcome",),
+)
+RENDER_TASKS_WAITING = Gauge(
+    "pumpreels_render_tasks_waiting",
+    "Render tasks waiting for a concurrency slot.",
+)
+
+
+class RenderTask:
+    """One supervised render and what it is currently doing."""
+    __slots__ = ("task_id", "chat_id", "doc_id", "user_id", "user_identifier", "prompt_text",
+                 "message_id", "job_id", "charged", "stage", "started_at", "stage_at", "task")
+
+    def __init__(self, task_id: int = None, **fields):
+        self.task_id = task_id
+        self.chat_id = self.doc_id = self.user_id = self.user_identifier = None
+        self.prompt_text = self.message_id = self.job_id = self.task = None
+        self.charged = False
+        self.started_at = self.stage_at = time.monotonic()
+        self.stage = "waiting"
+        self.update(**fields)
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.stage_at = time.monotonic()
+
+    def checkpoint(self) -> Render:
+        """What another replica needs to finish and deliver this render."""
+        return Render._make(getattr(self, name) for name in Render._fields)
+
+    def describe(self) -> dict:
+        now = time.monotonic()
+        return dict(
+            self.checkpoint().to_dict(),
+            task_id=self.task_id,
+            stage=self.stage,
+            charged=self.charged,
+            age_seconds=round(now - self.started_at, 1),
+            stage_age_seconds=round(now - self.stage_at, 1),
+        )
+
+
+class RenderSupervisor:
+    """
+    Owns every background render task: keeps a reference so none are garbage
+    collected mid-flight, records what each one is doing, caps how many run at
+    once (the rest wait in stage "waiting"), and logs any exception a task dies with.
+    """
+
+    def __init__(self, max_concurrent: int = 50):
+        self.max_concurrent = max_concurrent
+        self._renders = {}
+        self._ids = itertools.count(1)
+        self._slots = None
+
+    def spawn(self, coro, **fields) -> RenderTask:
+        """Starts `coro` as a supervised render; `fields` describe it (chat_id, doc_id, user_id, ...)."""
+        if self._slots is None:
+            # Created lazily so it binds to the running loop.
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        render = RenderTask(next(self._ids), **fields)
+        render.task = asyncio.create_task(self._run(render, coro), name=f"render-{render.task_id}")
+        self._renders[render.task] = render
+        render.task.add_done_callback(self._finished)
+        return render
+
+    async def _run(self, render: RenderTask, coro):
+        RENDER_TASKS_WAITING.inc()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            coro.close()
+            raise
+        finally:
+            RENDER_TASKS_WAITING.dec()
+        try:
+            render.set_stage("running")
+            # Counted on its own rather than against the update that started it, which has long returned.
+            with account_calls("render"):
+                return await coro
+        finally:
+            self._slots.release()
+
+    def _finished(self, task: asyncio.Task):
+        render = self._renders.pop(task, None)
+        if task.cancelled():
+            RENDER_TASKS.labels("cancelled").inc()
+            return
+        error = task.exception()
+        if error is None:
+            RENDER_TASKS.labels("ok").inc()
+            return
+        RENDER_TASKS.labels("failed").inc()
+        logger.error("Render task %s failed in stage %s: %r", render and render.task_id,
+                     render and render.stage, error, exc_info=error)
+
+    def current(self) -> RenderTask:
+        """The render running in the current task, or a detached record when called from anywhere else."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._renders.get(task) or RenderTask()
+
+    def renders(self) -> list:
+        return sorted(self._renders.values(), key=lambda render: render.task_id)
+
+    def get(self, task_id: int) -> RenderTask:
+        return next((render for render in self._renders.values() if render.task_id == task_id), None)
+
+    def find(self, **fields) -> RenderTask:
+        """The newest render whose attributes match every non-None value in `fields`."""
+        fields = {name: value for name, value in fields.items() if value is not None}
+        for render in reversed(self.renders()):
+            if all(getattr(render, name) == value for name, value in fields.items()):
+                return render
+        return None
+
+    def __len__(self):
+        return len(self._renders)
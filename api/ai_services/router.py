@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import time
+
+from ai_services.circuit_breaker import CircuitBreaker, RetryBudget, PROVIDER_RETRIES, backoff_delay
+from ai_services.video_generator import QUEUED, FINISHED, TERMINAL_STATUSES
+from monitoring.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_QUEUE_TIME = Gauge(
+    "pumpreels_provider_queue_time_seconds",
+    "Smoothed time jobs spend queued at each provider before rendering starts.",
+    ("provider",),
+)
+PROVIDER_ERROR_RATE = Gauge(
+    "pumpreels_provider_error_rate",
+    "Smoothed fraction of submissions and jobs that failed at each provider.",
+    ("provider",),
+)
+
+# Labelled by role so shadow jobs (ai_services.shadow) can be compared with live ones.
+RENDER_SUBMIT_LATENCY = Histogram(
+    "pumpreels_render_submit_latency_seconds",
+    "Time for a provider to accept a render submission.",
+    ("provider", "role"),
+)
+RENDER_TIME_TO_FINISH = Histogram(
+    "pumpreels_render_time_to_finish_seconds",
+    "Time from submission until a render reached a terminal state.",
+    ("provider", "role"),
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600),
+)
+RENDER_OUTCOMES = Counter(
+    "pumpreels_render_outcomes_total",
+    "Renders by provider, role and outcome (finished, failed, canceled, rejected, timeout).",
+    ("provider", "role", "outcome"),
+)
+
+
+class AllProvidersFailed(Exception):
+    """Raised when no provider accepted a job."""
+
+
+class RenderRequest:
+    """Everything needed to (re)submit a render to any provider."""
+    __slots__ = ("image_bytes", "prompt_text", "negative_prompt", "duration", "resolution")
+
+    def __init__(self, image_bytes: bytes, prompt_text: str, negative_prompt: str = "",
+                 duration: int = 5, resolution: str = "720p"):
+        self.image_bytes = image_bytes
+        self.prompt_text = prompt_text
+        self.negative_prompt = negative_prompt
+        self.duration = duration
+        self.resolution = resolution
+
+
+class ProviderStats:
+    """
+    Exponentially weighted observations for one provider. Starts optimistic so a
+    new provider gets traffic and builds up a real history.
+    """
+    __slots__ = ("queue_time", "error_rate", "alpha")
+
+    def __init__(self, alpha: float = 0.2):
+        self.queue_time = 0.0
+        self.error_rate = 0.0
+        self.alpha = alpha
+
+    def observe_queue_time(self, seconds: float):
+        self.queue_time += self.alpha * (seconds - self.queue_time)
+
+    def observe_outcome(self, failed: bool):
+        self.error_rate += self.alpha * ((1.0 if failed else 0.0) - self.error_rate)
+
+
+class VideoRouter:
+    """
+    Chooses a provider per job from observed queue time, error rate and cost, and
+    moves a job to another provider when submission fails or the job fails upstream.
+
+    Job ids handed out look like "<provider>:<task id>" so status checks can be
+    routed back; bare ids are treated as belonging to the first provider, which
+    keeps ids issued before the router existed working.
+    """
+
+    def __init__(self, providers, queue_weight: float = 1.0, error_penalty: float = 300.0, cost_weight: float = 60.0,
+                 queue_failover_after: float = 60.0, max_attempts: int = 3,
+                 failure_threshold: int = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                 open_seconds: float = float(os.environ.get("CIRCUIT_OPEN_SECONDS", 30))):
+        if not providers:
+            raise ValueError("VideoRouter needs at least one provider")
+        self.providers = {p.name: p for p in providers}
+        self.default_provider = providers[0].name
+        self.stats = {p.name: ProviderStats() for p in providers}
+        self.breakers = {p.name: CircuitBreaker(p.name, failure_threshold, open_seconds) for p in providers}
+        self.retry_budgets = {p.name: RetryBudget() for p in providers}
+        self.max_attempts = max_attempts
+        # Weights turn each signal into "seconds of user wait" so they can be summed.
+        self.queue_weight = queue_weight
+        self.error_penalty = error_penalty
+        self.cost_weight = cost_weight
+        self.queue_failover_after = queue_failover_after
+        self._submitted_at = {}
+        self._started = set()
+        for name in self.providers:
+            PROVIDER_QUEUE_TIME.labels(name).set_function(lambda name=name: self.stats[name].queue_time)
+            PROVIDER_ERROR_RATE.labels(name).set_function(lambda name=name: self.stats[name].error_rate)
+
+    @staticmethod
+    def job_id(provider: str, task_id: str) -> str:
+        return f"{provider}:{task_id}"
+
+    def parse_job_id(self, job_id: str):
+        provider, sep, task_id = job_id.partition(":")
+        if sep and provider in self.providers:
+            return self.providers[provider], task_id
+        return self.providers[self.default_provider], job_id
+
+    def score(self, name: str, duration: int = 5) -> float:
+        stats = self.stats[name]
+        provider = self.providers[name]
+        return (
+            self.queue_weight * stats.queue_time
+            + self.error_penalty * stats.error_rate
+            + self.cost_weight * provider.cost_per_second * duration
+        )
+
+    def available(self) -> bool:
+        """
+        False when every provider's circuit is open. Checked before charging credits
+        so a degraded backend rejects new renders instead of taking payment for them.
+        """
+        return any(breaker.available() for breaker in self.breakers.values())
+
+    def ranked(self, exclude=(), duration: int = 5) -> list:
+        candidates = [name for name in self.providers if name not in exclude]
+        return sorted(candidates, key=lambda name: self.score(name, duration))
+
+    async def submit(self, request: RenderRequest, exclude=()) -> str:
+        """
+        Submits to the best-ranked provider whose circuit allows it, retrying with
+        jittered backoff while the provider's retry budget lasts and then falling
+        through to the next provider. Never touches credits: the caller charges
+        once per render, however many providers it takes.
+
+        :return: A router job id
+        :raises AllProvidersFailed: If every eligible provider rejected the job
+        """
+        errors = []
+        for name in self.ranked(exclude, request.duration):
+            task_id = await self._submit_to(name, request, errors)
+            if task_id is None:
+                continue
+            job_id = self.job_id(name, task_id)
+            if len(self._submitted_at) >= 10000:
+                # Mini-app jobs whose client stopped polling are never seen again.
+                self.forget(next(iter(self._submitted_at)))
+            self._submitted_at[job_id] = time.monotonic()
+            logger.info("Routed job to %s as %s", name, job_id)
+            return job_id
+        raise AllProvidersFailed("; ".join(errors) or "no eligible providers")
+
+    async def _submit_to(self, name: str, request: RenderRequest, errors: list):
+        provider = self.providers[name]
+        breaker = self.breakers[name]
+        budget = self.retry_budgets[name]
+        if not breaker.allow_request():
+            errors.append(f"{name}: circuit open")
+            return None
+        budget.deposit()
+        attempt = 1
+        while True:
+            submit_start = time.monotonic()
+            try:
+                task_id = await provider.create_video(
+                    request.image_bytes, request.prompt_text, request.negative_prompt,
+                    request.duration, request.resolution,
+                )
+            except Exception as e:
+                RENDER_OUTCOMES.labels(name, "primary", "rejected").inc()
+                breaker.record_failure()
+                self.stats[name].observe_outcome(failed=True)
+                logger.warning("Provider %s rejected job (attempt %s): %s", name, attempt, e)
+                if attempt >= self.max_attempts:
+                    errors.append(str(e))
+                    return None
+                if not budget.try_spend():
+                    PROVIDER_RETRIES.labels(name, "budget_exhausted").inc()
+                    errors.append(str(e))
+                    return None
+                if not breaker.allow_request():
+                    errors.append(f"{name}: circuit open")
+                    return None
+                PROVIDER_RETRIES.labels(name, "retried").inc()
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            RENDER_SUBMIT_LATENCY.labels(name, "primary").observe(time.monotonic() - submit_start)
+            breaker.record_success()
+            return task_id
+
+    async def get_status(self, job_id: str) -> dict:
+        """
+        Returns the normalized status for a job and feeds what it sees back into
+        the routing statistics (queue time on first start, outcome when terminal).
+        """
+        provider, task_id = self.parse_job_id(job_id)
+        try:
+            status = await provider.get_task_status(task_id)
+        except Exception:
+            # Only jobs this router submitted count against the provider; clients can poll any
+            # id through /getVideoStatus and must not be able to open the circuit for everyone.
+            if job_id in self._submitted_at:
+                self.stats[provider.name].observe_outcome(failed=True)
+                self.breakers[provider.name].record_failure()
+            raise
+
+        submitted_at = self._submitted_at.get(job_id)
+        state = status.get("status")
+        if submitted_at is None:
+            return status
+        if state != QUEUED and job_id not in self._started:
+            # Queue time is only meaningful once.
+            self._started.add(job_id)
+            self.stats[provider.name].observe_queue_time(time.monotonic() - submitted_at)
+        if state in TERMINAL_STATUSES:
+            RENDER_TIME_TO_FINISH.labels(provider.name, "primary").observe(time.monotonic() - submitted_at)
+            RENDER_OUTCOMES.labels(provider.name, "primary", state).inc()
+            self.stats[provider.name].observe_outcome(failed=state != FINISHED)
+            # Jobs failing upstream count against the circuit just like rejected submissions.
+            if state == FINISHED:
+                self.breakers[provider.name].record_success()
+            else:
+                self.breakers[provider.name].record_failure()
+            self.forget(job_id)
+        return status
+
+    def queued_too_long(self, job_id: str, queued_for: float) -> bool:
+        """
+        True once a job has waited at least `queue_failover_after` seconds and a
+        healthy alternative provider typically starts jobs sooner than that.
+        """
+        if queued_for < self.queue_failover_after:
+            return False
+        provider, _ = self.parse_job_id(job_id)
+        alternatives = [
+            self.stats[name].queue_time for name in self.providers
+            if name != provider.name and self.stats[name].error_rate < 0.5
+        ]
+        return bool(alternatives) and min(alternatives) < queued_for
+
+    async def cancel(self, job_id: str) -> bool:
+        provider, task_id = self.parse_job_id(job_id)
+        self.forget(job_id)
+        if not provider.supports_cancel:
+            return False
+        return await provider.cancel_task(task_id)
+
+    def forget(self, job_id: str, outcome: str = None):
+        """
+        Stops tracking a job that was abandoned without reaching a terminal state,
+        optionally counting it under `outcome` (e.g. "timeout").
+        """
+        if outcome and job_id in self._submitted_at:
+            provider, _ = self.parse_job_id(job_id)
+            RENDER_OUTCOMES.labels(provider.name, "primary", outcome).inc()
+        self._submitted_at.pop(job_id, None)
+        self._started.discard(job_id)
+
+
+def providers_from_env(names: str = None) -> list:
+    """
+    Builds the provider list from `names`, or VIDEO_PROVIDERS when omitted (comma
+    separated, default "pika"). The first entry is the default for bare job ids.
+    """
+    from ai_services.pika_client import PikaClient
+    from ai_services.runway_client import RunwayClient
+
+    available = {"pika": PikaClient, "runway": RunwayClient}
+    names = [n.strip() for n in (names or os.environ.get("VIDEO_PROVIDERS", "pika")).split(",") if n.strip()]
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        raise ValueError(f"Unknown video providers: {unknown}")
+    return [available[n]() for n in names]
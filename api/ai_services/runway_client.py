@@ -1,44 +1,95 @@
-# from runwayml import AsyncRunwayML
-# import logging
-# import config
-from ai_services.video_generator import VideoGenerator
+import asyncio
+import base64
+import logging
+import os
+
+import requests
+
+from ai_services.video_generator import VideoGenerator, ProviderError, QUEUED, STARTED, FINISHED, FAILED, CANCELED
+from monitoring.metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+_STATUS_MAP = {
+    "PENDING": QUEUED,
+    "THROTTLED": QUEUED,
+    "RUNNING": STARTED,
+    "SUCCEEDED": FINISHED,
+    "FAILED": FAILED,
+    "CANCELLED": CANCELED,
+}
 
-# logger = logging.getLogger(__name__)
 
 class RunwayClient(VideoGenerator):
     """
     RunwayML-specific implementation of AI-powered video generation.
     """
+    name = "runway"
+    cost_per_second = float(os.environ.get('RUNWAY_COST_PER_SECOND', 0.05))
+    supports_cancel = True
 
     def __init__(self):
-        self.client = ''
-        # self.client = AsyncRunwayML(api_key=config.RUNWAYML_API_KEY)
-
-    # async def create_video(self, image_data: str, prompt_text: str, duration: int = 5) -> str:
-    #     """
-    #     Sends a request to RunwayML to generate a video.
-    #     """
-    #     try:
-    #         response = await self.client.image_to_video.create(
-    #             model="gen3a_turbo",
-    #             prompt_image=image_data,
-    #             prompt_text=prompt_text,
-    #             duration=duration
-    #         )
-    #         task_id = response.id
-    #         logger.info(f"RunwayML task started: {task_id}")
-    #         return await self.poll_for_video(task_id)
-    #     except Exception as e:
-    #         logger.error(f"Error creating video with RunwayML: {e}")
-    #         return None
-    #
-    # async def get_task_status(self, task_id: str) -> dict:
-    #     """
-    #     Retrieves the status of a video generation task.
-    #     """
-    #     try:
-    #         task = await self.client.tasks.retrieve(id=task_id)
-    #         return task.to_dict()
-    #     except Exception as e:
-    #         logger.error(f"Error retrieving task {task_id}: {e}")
-    #         return {"status": "FAILED"}
+        self.api_key = os.environ.get('RUNWAYML_API_KEY')
+        self.base_url = os.environ.get('RUNWAY_BASE_URL', 'https://api.dev.runwayml.com/v1')
+        self.model = os.environ.get('RUNWAY_MODEL', 'gen3a_turbo')
+        self.session = requests.Session()
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "X-Runway-Version": "2024-11-06",
+            "Content-Type": "application/json",
+        }
+
+    @instrumented("runway", "submit")
+    def image_to_video(self, image_bytes: bytes, prompt_text: str, duration: int) -> dict:
+        payload = {
+            "model": self.model,
+            "promptImage": "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode("ascii"),
+            "promptText": prompt_text[:1000],
+            # Runway only renders 5 or 10 second clips.
+            "duration": 10 if duration > 5 else 5,
+            "ratio": "1280:768",
+        }
+        response = self.session.post(f"{self.base_url}/image_to_video", json=payload, headers=self._headers(), timeout=30)
+        if response.status_code >= 400:
+            raise ProviderError(self.name, f"submit failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    @instrumented("runway", "poll")
+    def retrieve_task(self, task_id: str) -> dict:
+        response = self.session.get(f"{self.base_url}/tasks/{task_id}", headers=self._headers(), timeout=10)
+        if response.status_code >= 400:
+            raise ProviderError(self.name, f"status failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    @instrumented("runway", "cancel")
+    def delete_task(self, task_id: str) -> bool:
+        response = self.session.delete(f"{self.base_url}/tasks/{task_id}", headers=self._headers(), timeout=10)
+        return response.status_code < 400
+
+    async def create_video(self, image_bytes: bytes, prompt_text: str, negative_prompt: str = "",
+                           duration: int = 5, resolution: str = "720p") -> str:
+        # Runway has no negative prompt or resolution parameter; both are ignored.
+        result = await asyncio.to_thread(self.image_to_video, image_bytes, prompt_text, duration)
+        task_id = result.get("id")
+        if not task_id:
+            raise ProviderError(self.name, f"no task id in response: {result}")
+        logger.info(f"RunwayML task started: {task_id}")
+        return task_id
+
+    async def get_task_status(self, task_id: str) -> dict:
+        task = await asyncio.to_thread(self.retrieve_task, task_id)
+        output = task.get("output") or []
+        return {
+            "status": _STATUS_MAP.get(task.get("status"), QUEUED),
+            "progress": int((task.get("progress") or 0) * 100),
+            "url": output[0] if output else "",
+        }
+
+    async def cancel_task(self, task_id: str) -> bool:
+        try:
+            return await asyncio.to_thread(self.delete_task, task_id)
+        except Exception as e:
+            logger.error(f"Error cancelling task {task_id}: {e}")
+            return False
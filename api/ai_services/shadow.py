@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+from ai_services.router import RenderRequest, RENDER_SUBMIT_LATENCY, RENDER_TIME_TO_FINISH, RENDER_OUTCOMES, providers_from_env
+from ai_services.video_generator import VideoGenerator, TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowMirror:
+    """
+    Mirrors a sampled fraction of real renders to a secondary provider so it can be
+    compared with the live one on real traffic. Shadow jobs are fire-and-forget:
+    they are never delivered to users and never charged, and they only feed the
+    render metrics under role="shadow".
+    """
+
+    def __init__(self, provider: VideoGenerator, fraction: float, max_in_flight: int = 10,
+                 poll_interval: float = 2.0, timeout: float = 600.0):
+        self.provider = provider
+        self.fraction = fraction
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._tasks = set()
+
+    def maybe_mirror(self, request: RenderRequest) -> bool:
+        """Schedules a shadow copy of `request` if it is sampled. Never raises."""
+        if random.random() >= self.fraction:
+            return False
+        if len(self._tasks) >= self.max_in_flight:
+            # Shadow load must never grow without bound; drop the sample instead.
+            RENDER_OUTCOMES.labels(self.provider.name, "shadow", "skipped").inc()
+            return False
+        task = asyncio.create_task(self._run(request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, request: RenderRequest):
+        name = self.provider.name
+        submitted_at = time.monotonic()
+        try:
+            task_id = await self.provider.create_video(
+                request.image_bytes, request.prompt_text, request.negative_prompt,
+                request.duration, request.resolution,
+            )
+        except Exception as e:
+            logger.info("Shadow submit to %s failed: %s", name, e)
+            RENDER_OUTCOMES.labels(name, "shadow", "rejected").inc()
+            return
+        RENDER_SUBMIT_LATENCY.labels(name, "shadow").observe(time.monotonic() - submitted_at)
+
+        outcome = "timeout"
+        try:
+            while time.monotonic() - submitted_at < self.timeout:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    status = await self.provider.get_task_status(task_id)
+                except Exception as e:
+                    logger.info("Shadow poll of %s task %s failed: %s", name, task_id, e)
+                    outcome = "failed"
+                    break
+                if status.get("status") in TERMINAL_STATUSES:
+                    outcome = status["status"]
+                    RENDER_TIME_TO_FINISH.labels(name, "shadow").observe(time.monotonic() - submitted_at)
+                    break
+            if outcome == "timeout" and self.provider.supports_cancel:
+                await self.provider.cancel_task(task_id)
+        finally:
+            RENDER_OUTCOMES.labels(name, "shadow", outcome).inc()
+
+    async def stop(self):
+        """Cancels outstanding shadow jobs; they carry no user-visible state."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def shadow_from_env():
+    """
+    Returns a ShadowMirror when SHADOW_PROVIDER is set (e.g. "runway"), otherwise None.
+    SHADOW_FRACTION is the share of renders mirrored (default 0.05).
+    """
+    name = os.environ.get("SHADOW_PROVIDER")
+    if not name:
+        return None
+    fraction = float(os.environ.get("SHADOW_FRACTION", 0.05))
+    provider = providers_from_env(name)[0]
+    logger.info("Mirroring %.1f%% of renders to %s", fraction * 100, name)
+    return ShadowMirror(provider, fraction)
@@ -4,32 +4,67 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Normalized task states every provider maps its own statuses onto.
+QUEUED = "queued"
+STARTED = "started"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELED = "canceled"
+TERMINAL_STATUSES = (FINISHED, FAILED, CANCELED)
+
+
+class ProviderError(Exception):
+    """Raised when a provider rejects or fails a request."""
+
+    def __init__(self, provider: str, message: str):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+
+
 class VideoGenerator(ABC):
     """
     Abstract base class for AI-powered video generation services.
-    Any AI video provider (e.g., RunwayML, Stable Diffusion) should inherit from this.
+    Any AI video provider (e.g., Pika, RunwayML) should inherit from this.
     """
 
+    # Short identifier used in job ids, metrics labels and logs.
+    name = "base"
+    # Approximate list price in USD per second of output video; used for routing.
+    cost_per_second = 0.0
+    # Whether cancel_task actually stops the job upstream.
+    supports_cancel = False
+
     @abstractmethod
-    async def create_video(self, image_data: str, prompt_text: str, duration: int = 5) -> str:
+    async def create_video(self, image_bytes: bytes, prompt_text: str, negative_prompt: str = "",
+                           duration: int = 5, resolution: str = "720p") -> str:
         """
-        Generates a video from an image and text prompt.
-        :param image_data: Base64-encoded image
+        Submits a video generation job from an image and text prompt.
+        :param image_bytes: Raw image bytes (JPEG or PNG)
         :param prompt_text: Description for AI to generate video
+        :param negative_prompt: What the video should avoid
         :param duration: Video duration in seconds (default: 5)
-        :return: URL of the generated video or None if failed
+        :param resolution: Output resolution, e.g. "720p"
+        :return: The provider's task id
+        :raises ProviderError: If the provider did not accept the job
         """
         pass
 
     @abstractmethod
     async def get_task_status(self, task_id: str) -> dict:
         """
-        Polls the video generation task and retrieves its status.
+        Retrieves the status of a video generation task.
         :param task_id: The ID of the AI task
-        :return: A dictionary containing the task status and output URL if completed
+        :return: {"status": one of the normalized states, "progress": 0-100, "url": output URL or ""}
         """
         pass
 
+    async def cancel_task(self, task_id: str) -> bool:
+        """
+        Cancels a task upstream if the provider supports it.
+        :return: True if the provider accepted the cancellation
+        """
+        return False
+
     async def poll_for_video(self, task_id: str) -> str:
         """
         Polls for the video generation task to complete.
@@ -41,9 +76,9 @@ class VideoGenerator(ABC):
                 task = await self.get_task_status(task_id)
                 status = task.get("status")
 
-                if status == "SUCCEEDED":
-                    return task.get("output")[0] if task.get("output") else None
-                elif status in ["FAILED", "CANCELED"]:
+                if status == FINISHED:
+                    return task.get("url") or None
+                elif status in [FAILED, CANCELED]:
                     logger.error(f"Video generation failed for task {task_id}")
                     return None
 
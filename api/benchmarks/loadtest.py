@@ -0,0 +1,386 @@
+"""
+Offline end-to-end load test for api/main.py.
+
+Boots the Telegram, Pika and Radom stand-ins (benchmarks/stubs.py) and the real
+FastAPI app under uvicorn, seeds groups into the Firestore emulator, then drives
+/webhook, /generateVideo, /getVideoStatus and /radomWebhook at a fixed open-loop
+rate. Reports throughput, latency percentiles per endpoint, event-loop lag and
+whether the credit ledger adds up once all renders have settled.
+
+Run from the api/ directory with a Firestore emulator running:
+
+    gcloud emulators firestore start --host-port=127.0.0.1:8085 &
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8085 python -m benchmarks.loadtest --rate 50 --duration 60
+
+or against a throwaway SQLite database, with no emulator at all:
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python -m benchmarks.loadtest --rate 50 --duration 60
+
+Use --target to drive an instance you started yourself (stubs and seeding are still handled),
+or --workers N to start the API the way production does, through server.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import payloads
+from benchmarks.report import format_table, histogram_quantile, parse_gauge, parse_histogram_buckets, summarize
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_BOT_TOKEN = "123456789:BENCHMARK-token-for-local-stubs-only"
+BENCH_SECRET_TOKEN = "benchmark-secret"
+BENCH_RADOM_WEBHOOK_KEY = "benchmark-radom-key"
+VIDEO_CREDITS = 100
+ADMIN_USER_ID = 5000000001
+
+DEFAULT_MIX = "webhook_generate=2,webhook_chatter=6,mini_generate=1,mini_status=6,radom_payment=1"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class Services:
+    """Starts and stops the stub process and, unless a target is given, the API under test."""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.telegram_url = f"http://127.0.0.1:{args.telegram_port}"
+        self.pika_url = f"http://127.0.0.1:{args.pika_port}"
+        self.radom_url = f"http://127.0.0.1:{args.radom_port}"
+        self.api_url = args.target or f"http://127.0.0.1:{args.api_port}"
+
+    def api_env(self) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "TELEGRAM_BOT_TOKEN": BENCH_BOT_TOKEN,
+            "TELEGRAM_SECRET_TOKEN": BENCH_SECRET_TOKEN,
+            "TELEGRAM_API_BASE_URL": self.telegram_url,
+            "PIKA_BASE_URL": self.pika_url,
+            "RADOM_API_URL": self.radom_url,
+            "RADOM_TEST_WEBHOOK_KEY": BENCH_RADOM_WEBHOOK_KEY,
+        })
+        return env
+
+    def start(self):
+        a = self.args
+        self.processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.stubs",
+            "--telegram-port", str(a.telegram_port), "--pika-port", str(a.pika_port), "--radom-port", str(a.radom_port),
+            "--telegram-latency", str(a.telegram_latency), "--pika-latency", str(a.pika_latency),
+            "--pika-queue-time", str(a.pika_queue_time), "--pika-render-time", str(a.pika_render_time),
+            "--pika-fail-rate", str(a.pika_fail_rate), "--pika-submit-error-rate", str(a.pika_submit_error_rate),
+        ], cwd=API_DIR))
+        if a.target:
+            return
+        if a.workers:
+            # The production entry point, with its worker count, shared cache and merged /metrics.
+            env = self.api_env()
+            env.update({"HOST": "127.0.0.1", "PORT": str(a.api_port), "WEB_CONCURRENCY": str(a.workers),
+                        "LOG_LEVEL": "warning"})
+            self.processes.append(subprocess.Popen([sys.executable, "server.py"], cwd=API_DIR, env=env))
+        else:
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(a.api_port),
+                 "--log-level", "warning", *a.uvicorn_args],
+                cwd=API_DIR, env=self.api_env(),
+            ))
+
+    async def wait_ready(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        urls = [f"{self.telegram_url}/_stats", f"{self.pika_url}/_stats", f"{self.radom_url}/_stats", f"{self.api_url}/"]
+        async with httpx.AsyncClient() as client:
+            for url in urls:
+                while True:
+                    try:
+                        if (await client.get(url)).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"{url} did not come up within {timeout}s")
+                    await asyncio.sleep(0.2)
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class Ledger:
+    """Seeds groups into the Firestore emulator (or SQLite) and checks credits once the run settles."""
+
+    def __init__(self, group_count: int, initial_credits: int):
+        from storage.base import storage_from_env
+
+        self.sqlite = os.environ.get("STORAGE_BACKEND", "firestore").lower() == "sqlite"
+        if not self.sqlite and not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("FIRESTORE_EMULATOR_HOST must point at a Firestore emulator (or set STORAGE_BACKEND=sqlite);"
+                             " refusing to touch a real project.")
+        self.client = storage_from_env()
+        self.initial_credits = initial_credits
+        self.groups = [
+            {"doc_id": f"g_bench_{i:05d}", "group_id": -1001000000000 - i}
+            for i in range(group_count)
+        ]
+        self.purchased = 0
+
+    def _group_doc(self, group: dict) -> dict:
+        return {
+            "title": f"Coin {abs(group['group_id'])}",
+            "type": "supergroup",
+            "group_id": group["group_id"],
+            "creator_id": ADMIN_USER_ID,
+            "creator_username": "groupadmin",
+            "creator_full_name": "Admin",
+            "credits": self.initial_credits,
+        }
+
+    def seed(self):
+        if self.sqlite:
+            self.client.put_groups({group["doc_id"]: self._group_doc(group) for group in self.groups})
+            return
+        batch = self.client.db.batch()
+        for i, group in enumerate(self.groups):
+            batch.set(self.client.group_collection.document(group["doc_id"]), self._group_doc(group))
+            if i % 400 == 399:
+                batch.commit()
+                batch = self.client.db.batch()
+        batch.commit()
+
+    def actual_total(self) -> int:
+        if self.sqlite:
+            return sum(getattr(self.client.get_group_by_id(g["doc_id"]), "credits", 0) for g in self.groups)
+        refs = [self.client.group_collection.document(g["doc_id"]) for g in self.groups]
+        return sum((snap.to_dict() or {}).get("credits", 0) for snap in self.client.db.get_all(refs))
+
+    def expected_total(self, pika_stats: dict) -> int:
+        charged = pika_stats.get("submitted", 0) * VIDEO_CREDITS
+        refunded = pika_stats.get("failed", 0) * VIDEO_CREDITS
+        return self.initial_credits * len(self.groups) - charged + refunded + self.purchased
+
+
+class LoadTest:
+    def __init__(self, services: Services, ledger: Ledger, rate: float, duration: float, mix: dict):
+        self.services = services
+        self.ledger = ledger
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.outstanding_videos = []
+        self.client = None
+
+    async def _request(self, name: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, self.services.api_url + path, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies[name].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[name] += 1
+        return response
+
+    def _group(self) -> dict:
+        return random.choice(self.ledger.groups)
+
+    async def webhook_generate(self):
+        group = self._group()
+        update = payloads.generate_video_update(group["group_id"], random.randint(10 ** 8, 10 ** 9))
+        await self._request("webhook:generate", "POST", "/webhook", json=update,
+                            headers={"X-Telegram-Bot-Api-Secret-Token": BENCH_SECRET_TOKEN})
+
+    async def webhook_chatter(self):
+        group = self._group()
+        update = payloads.text_message_update(group["group_id"], random.randint(10 ** 8, 10 ** 9))
+        await self._request("webhook:chatter", "POST", "/webhook", json=update,
+                            headers={"X-Telegram-Bot-Api-Secret-Token": BENCH_SECRET_TOKEN})
+
+    async def mini_generate(self):
+        group = self._group()
+        init_data = payloads.sign_init_data(BENCH_BOT_TOKEN, random.randint(10 ** 8, 10 ** 9))
+        response = await self._request(
+            "generateVideo", "POST", "/generateVideo",
+            data={"prompt_text": "to the moon", "doc_id": group["doc_id"]},
+            files={"image": ("image.jpg", b"\xff\xd8" + bytes(4096) + b"\xff\xd9", "image/jpeg")},
+            headers={"X-TG-INIT-DATA": init_data},
+        )
+        if response is not None and response.status_code == 200:
+            self.outstanding_videos.append((response.json()["video_id"], group["doc_id"]))
+
+    async def mini_status(self, video=None):
+        if video is None:
+            if not self.outstanding_videos:
+                return
+            video = random.choice(self.outstanding_videos)
+        video_id, doc_id = video
+        init_data = payloads.sign_init_data(BENCH_BOT_TOKEN, random.randint(10 ** 8, 10 ** 9))
+        response = await self._request(
+            "getVideoStatus", "GET", "/getVideoStatus",
+            params={"video_id": video_id, "doc_id": doc_id}, headers={"X-TG-INIT-DATA": init_data},
+        )
+        if response is not None and response.status_code == 200:
+            if response.json().get("status") in ("finished", "failed", "canceled") and video in self.outstanding_videos:
+                self.outstanding_videos.remove(video)
+
+    async def radom_payment(self):
+        group = self._group()
+        event = payloads.managed_payment_event(group["group_id"], 1000)
+        tx_hash = event["eventData"]["managedPayment"]["transactions"][0]["transactionHash"]
+        headers = {"radom-verification-key": BENCH_RADOM_WEBHOOK_KEY}
+        await self._request("radomWebhook:payment", "POST", "/radomWebhook", json=event, headers=headers)
+        response = await self._request("radomWebhook:confirm", "POST", "/radomWebhook",
+                                       json=payloads.payment_confirmed_event(tx_hash), headers=headers)
+        if response is not None and response.status_code == 200:
+            self.ledger.purchased += 1000
+
+    async def scrape_metrics(self) -> str:
+        try:
+            return (await self.client.get(self.services.api_url + "/metrics")).text
+        except httpx.HTTPError:
+            return ""
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=200)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            self.client = client
+            metrics_before = await self.scrape_metrics()
+
+            names = list(self.mix)
+            weights = [self.mix[n] for n in names]
+            loop = asyncio.get_running_loop()
+            tasks = set()
+            total = int(self.rate * self.duration)
+            started = loop.time()
+            for i in range(total):
+                delay = started + i / self.rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(getattr(self, random.choices(names, weights)[0])())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+            elapsed = loop.time() - started
+            metrics_after = await self.scrape_metrics()
+
+            settle = await self.settle()
+            return {"elapsed": elapsed, "metrics_before": metrics_before, "metrics_after": metrics_after, **settle}
+
+    async def settle(self, timeout: float = 600.0) -> dict:
+        """Polls remaining mini-app renders and waits until no render is in flight."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for video in list(self.outstanding_videos):
+                await self.mini_status(video)
+            pika_stats = (await self.client.get(self.services.pika_url + "/_stats")).json()
+            in_flight = parse_gauge(await self.scrape_metrics(), "pumpreels_renders_in_flight")
+            if pika_stats.get("pending", 0) == 0 and in_flight == 0 and not self.outstanding_videos:
+                break
+            await asyncio.sleep(1.0)
+        telegram_stats = (await self.client.get(self.services.telegram_url + "/_stats")).json()
+        return {"pika_stats": pika_stats, "telegram_stats": telegram_stats}
+
+
+def summary_rows(load_test: LoadTest, elapsed: float) -> dict:
+    rows = {}
+    for name, latencies in sorted(load_test.latencies.items()):
+        rows[name] = summarize(latencies, elapsed)
+        rows[name]["errors"] = load_test.errors.get(name, 0)
+    all_latencies = [v for values in load_test.latencies.values() for v in values]
+    rows["TOTAL"] = summarize(all_latencies, elapsed)
+    rows["TOTAL"]["errors"] = sum(load_test.errors.values())
+    return rows
+
+
+def loop_lag_quantiles(result: dict, quantiles=(0.50, 0.95, 0.99)) -> list:
+    """Event-loop lag bucket upper bounds over the run, across every worker; empty if not scraped."""
+    before = parse_histogram_buckets(result["metrics_before"], "pumpreels_event_loop_lag_seconds")
+    after = parse_histogram_buckets(result["metrics_after"], "pumpreels_event_loop_lag_seconds")
+    return [histogram_quantile(before, after, q) for q in quantiles] if after else []
+
+
+def report(load_test: LoadTest, result: dict) -> bool:
+    rows = summary_rows(load_test, result["elapsed"])
+    print(format_table(rows, columns=("count", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")))
+
+    lag = loop_lag_quantiles(result)
+    if lag:
+        print("\nevent-loop lag (bucket upper bound): p50<={:.3f}s p95<={:.3f}s p99<={:.3f}s".format(*lag))
+
+    print("\npika:", json.dumps(result["pika_stats"]))
+    print("telegram:", json.dumps(result["telegram_stats"]))
+
+    expected = load_test.ledger.expected_total(result["pika_stats"])
+    actual = load_test.ledger.actual_total()
+    ok = expected == actual
+    print(f"\ncredit ledger: expected {expected}, actual {actual} -> {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+
+def build_parser(description: str = __doc__) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second across all endpoints")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operation mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--initial-credits", type=int, default=1000000)
+    parser.add_argument("--target", help="Base URL of an already running API; skips starting uvicorn")
+    parser.add_argument("--api-port", type=int, default=8090)
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--pika-port", type=int, default=8082)
+    parser.add_argument("--radom-port", type=int, default=8083)
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--pika-latency", type=float, default=0.05)
+    parser.add_argument("--pika-queue-time", type=float, default=5.0)
+    parser.add_argument("--pika-render-time", type=float, default=10.0)
+    parser.add_argument("--pika-fail-rate", type=float, default=0.05)
+    parser.add_argument("--pika-submit-error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, help="Start the API through server.py with this many workers")
+    parser.add_argument("--uvicorn-args", nargs=argparse.REMAINDER, default=[], help="Extra arguments passed to uvicorn")
+    return parser
+
+
+def run(args):
+    """Seeds the ledger, starts the services and runs one load test; returns (load_test, result)."""
+    ledger = Ledger(args.groups, args.initial_credits)
+    ledger.seed()
+
+    services = Services(args)
+    services.start()
+    try:
+        asyncio.run(services.wait_ready())
+        load_test = LoadTest(services, ledger, args.rate, args.duration, parse_mix(args.mix))
+        result = asyncio.run(load_test.run())
+    finally:
+        services.stop()
+    return load_test, result
+
+
+def main():
+    load_test, result = run(build_parser().parse_args())
+    ok = report(load_test, result)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
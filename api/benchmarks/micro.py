@@ -0,0 +1,220 @@
+"""
+Microbenchmarks for functions that run on every request.
+
+    python -m benchmarks.micro                 # run and compare against baselines.json
+    python -m benchmarks.micro --save          # record new baselines
+    python -m benchmarks.micro -k init_data    # run a subset
+
+Each benchmark is timed over several rounds of an auto-calibrated loop and the
+fastest round's per-call time (the least noisy estimate) is compared with the
+stored baseline. A fixed pure-Python calibration workload is timed alongside,
+and baselines are scaled by how fast this machine runs it relative to the
+machine that recorded them, so the same baseline file works on a laptop and in
+CI. Exits non-zero on any regression beyond the threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks import payloads
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 0.25
+BENCH_BOT_TOKEN = "123456789:BENCHMARK-token-for-local-stubs-only"
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, threshold: float = None):
+    """
+    Registers a benchmark. The decorated function performs setup and returns the
+    zero-argument callable that is timed.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, threshold)
+        return setup
+    return decorator
+
+
+def _calibration():
+    total = 0
+    for i in range(2000):
+        total += i * i % 7
+    return total
+
+
+@benchmark("calibration")
+def bench_calibration():
+    return _calibration
+
+
+@benchmark("verify_init_data")
+def bench_verify_init_data():
+    from webapp.auth import verify_init_data
+
+    init_data = payloads.sign_init_data(BENCH_BOT_TOKEN, 424242)
+    return lambda: verify_init_data(init_data, BENCH_BOT_TOKEN)
+
+
+@benchmark("verify_init_data_bad_hash")
+def bench_verify_init_data_bad_hash():
+    from webapp.auth import verify_init_data
+
+    init_data = payloads.sign_init_data(BENCH_BOT_TOKEN, 424242)[:-4] + "0000"
+    return lambda: verify_init_data(init_data, BENCH_BOT_TOKEN)
+
+
+def _bot():
+    from telegram import Bot
+
+    return Bot(BENCH_BOT_TOKEN)
+
+
+@benchmark("update_de_json_generate_video")
+def bench_update_de_json_generate_video():
+    from telegram import Update
+
+    bot, update = _bot(), payloads.generate_video_update(-1001234567890, 424242)
+    return lambda: Update.de_json(update, bot)
+
+
+@benchmark("update_de_json_chatter")
+def bench_update_de_json_chatter():
+    from telegram import Update
+
+    bot, update = _bot(), payloads.text_message_update(-1001234567890, 424242)
+    return lambda: Update.de_json(update, bot)
+
+
+@benchmark("update_de_json_bot_added")
+def bench_update_de_json_bot_added():
+    from telegram import Update
+
+    bot, update = _bot(), payloads.bot_added_update(-1001234567890, 424242)
+    return lambda: Update.de_json(update, bot)
+
+
+# Sub-microsecond benchmarks are dominated by loop overhead and jitter; allow more slack.
+@benchmark("handle_new_group_update_chatter", threshold=0.5)
+def bench_handle_new_group_update_chatter():
+    # The check main.handle_new_group_update runs on every /webhook before PTB sees it.
+    from telegram_bot.updates import bot_added_chat
+
+    update = payloads.text_message_update(-1001234567890, 424242)
+    return lambda: bot_added_chat(update, "pumpreelsbot")
+
+
+@benchmark("handle_new_group_update_bot_added", threshold=0.5)
+def bench_handle_new_group_update_bot_added():
+    from telegram_bot.updates import bot_added_chat
+
+    update = payloads.bot_added_update(-1001234567890, 424242)
+    return lambda: bot_added_chat(update, "pumpreelsbot")
+
+
+@benchmark("create_transaction_parse")
+def bench_create_transaction_parse():
+    from storage.firestore_client import parse_managed_payment
+
+    event = payloads.managed_payment_event(-1001234567890, 5000)
+    return lambda: parse_managed_payment(event)
+
+
+@benchmark("mini_app_caption")
+def bench_mini_app_caption():
+    from telegram_bot.messages import build_mini_app_caption
+
+    return lambda: build_mini_app_caption("PEPE (Official) - $PEPE", 24900, "g_3f1c2a9d8e7b4c6a")
+
+
+@benchmark("buy_credits_text")
+def bench_buy_credits_text():
+    from telegram_bot.messages import build_buy_credits_text
+
+    return lambda: build_buy_credits_text("PEPE (Official) - $PEPE. To the moon!")
+
+
+def measure(func, rounds: int = 7, target_seconds: float = 0.1) -> dict:
+    """Median and min seconds per call over `rounds` rounds of an auto-sized loop."""
+    func()  # warm up caches and lazy imports
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target_seconds / 5:
+            break
+        loops *= 4
+    loops = max(1, int(loops * target_seconds / elapsed))
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return {"median_ns": statistics.median(samples) * 1e9, "min_ns": min(samples) * 1e9, "loops": loops}
+
+
+def load_baselines() -> dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--save", action="store_true", help=f"Write results to {os.path.basename(BASELINES_PATH)}")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown relative to baseline (0.25 = 25%%)")
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if n == "calibration" or not args.pattern or args.pattern in n]
+    results = {}
+    for name in names:
+        setup, _ = BENCHMARKS[name]
+        results[name] = measure(setup(), rounds=args.rounds)
+
+    if args.save:
+        baselines = load_baselines()
+        baselines.update({n: {"min_ns": round(r["min_ns"], 1)} for n, r in results.items()})
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {BASELINES_PATH}")
+
+    baselines = load_baselines()
+    scale = 1.0
+    if "calibration" in baselines:
+        scale = results["calibration"]["min_ns"] / baselines["calibration"]["min_ns"]
+
+    regressions = []
+    print(f"{'benchmark':<36}{'best':>12}{'baseline':>12}{'change':>10}")
+    for name, result in results.items():
+        line = f"{name:<36}{result['min_ns'] / 1000:>10.2f}us"
+        baseline = baselines.get(name)
+        if baseline and name != "calibration":
+            expected = baseline["min_ns"] * scale
+            change = result["min_ns"] / expected - 1
+            threshold = BENCHMARKS[name][1] or args.threshold
+            line += f"{expected / 1000:>10.2f}us{change:>+10.1%}"
+            if change > threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    print(f"\nmachine speed vs baseline: {scale:.2f}x time")
+
+    if regressions and not args.save:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Builders for request payloads shaped like real Telegram and Radom traffic.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import time
+import uuid
+from urllib.parse import quote
+
+_update_ids = itertools.count(100000)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}", "language_code": "en"}
+
+
+def generate_video_update(chat_id: int, user_id: int, prompt: str = "to the moon with lasers") -> dict:
+    """A photo message captioned `/generate_video <prompt>` posted in a supergroup."""
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "from": _user(user_id),
+            "chat": {"id": chat_id, "title": f"Coin {abs(chat_id)}", "type": "supergroup"},
+            "date": int(time.time()),
+            "photo": [
+                {"file_id": f"small_{uuid.uuid4().hex}", "file_unique_id": "s" + uuid.uuid4().hex[:12], "file_size": 1200, "width": 90, "height": 90},
+                {"file_id": f"large_{uuid.uuid4().hex}", "file_unique_id": "l" + uuid.uuid4().hex[:12], "file_size": 98000, "width": 1280, "height": 1280},
+            ],
+            "caption": f"/generate_video {prompt}",
+            "caption_entities": [{"offset": 0, "length": 15, "type": "bot_command"}],
+        },
+    }
+
+
+def text_message_update(chat_id: int, user_id: int, text: str = "gm frens, wen moon?") -> dict:
+    """Ordinary group chatter the bot has to parse and ignore."""
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "from": _user(user_id),
+            "chat": {"id": chat_id, "title": f"Coin {abs(chat_id)}", "type": "supergroup"},
+            "date": int(time.time()),
+            "text": text,
+        },
+    }
+
+
+def bot_added_update(chat_id: int, user_id: int, bot_username: str = "pumpreelsbot") -> dict:
+    """The service message Telegram sends when the bot is added to a group."""
+    bot = {"id": 7000000001, "is_bot": True, "first_name": "PumpReels", "username": bot_username}
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "from": _user(user_id),
+            "chat": {"id": chat_id, "title": f"Coin {abs(chat_id)}", "type": "supergroup"},
+            "date": int(time.time()),
+            "new_chat_participant": bot,
+            "new_chat_member": bot,
+            "new_chat_members": [bot],
+        },
+    }
+
+
+def managed_payment_event(chat_id: int, credits: int, transaction_hash: str = None, checkout_session_id: str = None) -> dict:
+    """Radom `managedPayment` webhook for a checkout created by `create_checkout_session`."""
+    return {
+        "eventType": "managedPayment",
+        "eventData": {
+            "managedPayment": {
+                "transactions": [{
+                    "transactionHash": transaction_hash or uuid.uuid4().hex,
+                    "network": "Solana",
+                    "ticker": "SOL",
+                    "amount": "0.0634",
+                    "senderAddresses": [{"address": "8Fq3" + uuid.uuid4().hex[:28]}],
+                }],
+                "paymentSummary": {"grossAmount": "9.50", "netAmount": "9.40", "networkFeeAmount": "0.10"},
+            }
+        },
+        "radomData": {
+            "checkoutSession": {
+                "checkoutSessionId": checkout_session_id or str(uuid.uuid4()),
+                "metadata": [
+                    {"key": "telegram_group_id", "value": str(chat_id)},
+                    {"key": "credits_str", "value": str(credits)},
+                ],
+            }
+        },
+    }
+
+
+def payment_confirmed_event(transaction_hash: str) -> dict:
+    return {
+        "eventType": "paymentTransactionConfirmed",
+        "eventData": {"paymentTransactionConfirmed": {"transactionHash": transaction_hash}},
+    }
+
+
+def sign_init_data(bot_token: str, user_id: int, chat_type: str = "supergroup") -> str:
+    """Builds Telegram WebApp initData signed the same way Telegram signs it."""
+    fields = {
+        "query_id": "AAH" + uuid.uuid4().hex[:20],
+        "user": json.dumps(_user(user_id), separators=(",", ":")),
+        "chat_type": chat_type,
+        "chat_instance": "-4526473920118350000",
+        "auth_date": str(int(time.time())),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return "&".join(f"{k}={quote(v, safe='')}" for k, v in fields.items())
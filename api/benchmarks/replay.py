@@ -0,0 +1,104 @@
+"""
+Replays webhook traffic captured with CAPTURE_FILE against a local instance.
+
+Inter-arrival times from the capture are preserved and divided by --speed,
+so a burst during a coin launch arrives as a burst again:
+
+    python -m benchmarks.replay capture.jsonl.gz --target http://127.0.0.1:8090 --speed 10
+    python -m benchmarks.replay capture.jsonl.gz --speed max
+
+Start the target with benchmarks/stubs.py behind it (see benchmarks/loadtest.py)
+so replayed renders never reach real Telegram, Pika or Radom.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.loadtest import BENCH_RADOM_WEBHOOK_KEY, BENCH_SECRET_TOKEN
+from benchmarks.report import format_table, summarize
+from monitoring.capture import read_capture
+
+
+async def replay(records, target: str, speed: float, secret: str, radom_key: str, concurrency: int):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lateness = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(client, record):
+        path = record["path"]
+        if path == "/webhook":
+            headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+        else:
+            headers = {"radom-verification-key": radom_key}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(target + path, json=record["body"], headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[path].append(time.perf_counter() - start)
+            if not ok:
+                errors[path] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        loop = asyncio.get_running_loop()
+        tasks = []
+        first_t = None
+        started = loop.time()
+        for record in records:
+            if first_t is None:
+                first_t = record["t"]
+            if speed != float("inf"):
+                due = started + (record["t"] - first_t) / speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lateness.append(-delay)
+            tasks.append(asyncio.create_task(send(client, record)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+
+    return latencies, errors, lateness, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="File written by the bot with CAPTURE_FILE set")
+    parser.add_argument("--target", default="http://127.0.0.1:8090")
+    parser.add_argument("--speed", default="1", help="Time compression factor, e.g. 1, 10, or 'max'")
+    parser.add_argument("--secret", default=BENCH_SECRET_TOKEN, help="X-Telegram-Bot-Api-Secret-Token of the target")
+    parser.add_argument("--radom-key", default=BENCH_RADOM_WEBHOOK_KEY, help="Radom webhook verification key of the target")
+    parser.add_argument("--concurrency", type=int, default=500, help="Maximum requests in flight")
+    parser.add_argument("--only", choices=("/webhook", "/radomWebhook"), help="Replay a single endpoint")
+    args = parser.parse_args()
+
+    speed = float("inf") if args.speed == "max" else float(args.speed)
+    records = [r for r in read_capture(args.capture) if not args.only or r["path"] == args.only]
+    if not records:
+        raise SystemExit("Capture is empty.")
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"Replaying {len(records)} requests captured over {span:.1f}s at {args.speed}x")
+
+    latencies, errors, lateness, elapsed = asyncio.run(
+        replay(records, args.target.rstrip("/"), speed, args.secret, args.radom_key, args.concurrency)
+    )
+
+    rows = {}
+    for path, values in sorted(latencies.items()):
+        rows[path] = summarize(values, elapsed)
+        rows[path]["errors"] = errors.get(path, 0)
+    print(format_table(rows, columns=("count", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")))
+    if lateness:
+        print(f"\n{len(lateness)} requests were sent late; worst by {max(lateness) * 1000:.1f} ms "
+              f"(replayer could not keep up with --speed {args.speed}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import math
+import re
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] * 1000) if values else float("nan"),
+    }
+
+
+def format_table(rows: dict, columns=("count", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")) -> str:
+    header = f"{'':<22}" + "".join(f"{c:>16}" for c in columns)
+    lines = [header]
+    for name, row in rows.items():
+        cells = []
+        for c in columns:
+            value = row.get(c, "")
+            cells.append(f"{value:>16.2f}" if isinstance(value, float) else f"{value!s:>16}")
+        lines.append(f"{name:<22}" + "".join(cells))
+    return "\n".join(lines)
+
+
+_BUCKET_LINE = re.compile(r'^(?P<name>[a-zA-Z_:][\w:]*)_bucket\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+
+
+def parse_histogram_buckets(metrics_text: str, name: str) -> dict:
+    """
+    Returns {le: cumulative_count} for an unlabelled (or single-series) histogram
+    from a Prometheus text exposition.
+    """
+    buckets = {}
+    for line in metrics_text.splitlines():
+        match = _BUCKET_LINE.match(line)
+        if not match or match.group("name") != name:
+            continue
+        le = re.search(r'le="([^"]+)"', match.group("labels")).group(1)
+        bound = float("inf") if le == "+Inf" else float(le)
+        buckets[bound] = buckets.get(bound, 0) + float(match.group("value"))
+    return buckets
+
+
+def histogram_quantile(before: dict, after: dict, q: float) -> float:
+    """
+    Upper bound of the bucket holding quantile q (0..1) of the observations
+    recorded between two scrapes of the same histogram.
+    """
+    bounds = sorted(after)
+    deltas = [after[b] - before.get(b, 0) for b in bounds]
+    total = deltas[-1] if deltas else 0
+    if total <= 0:
+        return 0.0
+    target = q * total
+    for bound, cumulative in zip(bounds, deltas):
+        if cumulative >= target:
+            return bound
+    return bounds[-1]
+
+
+def parse_gauge(metrics_text: str, name: str) -> float:
+    """Sum of every series of a gauge, e.g. one per worker behind server.py."""
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{"):
+            total += float(line.rsplit(None, 1)[1])
+    return total
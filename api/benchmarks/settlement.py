@@ -0,0 +1,106 @@
+"""
+Duplicate-delivery storm for Radom payment settlement.
+
+Records --payments managedPayment transactions through FirestoreClient, then
+fires --duplicates concurrent paymentTransactionConfirmed deliveries for each of
+them from a thread pool, the way Radom retries look when the API is slow. Reports
+latency and throughput of confirm_transaction_by_tx_hash and checks every
+payment was credited exactly once.
+
+Run from the api/ directory against a Firestore emulator:
+
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8085 python -m benchmarks.settlement --payments 200 --duplicates 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import payloads
+from benchmarks.report import format_table, summarize
+
+PLAN_CREDITS = 1000
+
+
+def seed_groups(client, count: int) -> list:
+    run_id = uuid.uuid4().hex[:8]
+    groups = []
+    batch = client.db.batch()
+    for i in range(count):
+        group = {"doc_id": f"g_settle_{run_id}_{i:04d}", "group_id": -1002000000000 - random.randrange(10 ** 9)}
+        batch.set(client.group_collection.document(group["doc_id"]), {
+            "title": f"Settlement {i}",
+            "type": "supergroup",
+            "group_id": group["group_id"],
+            "credits": 0,
+        })
+        groups.append(group)
+    batch.commit()
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=100)
+    parser.add_argument("--duplicates", type=int, default=5, help="Confirmation deliveries per payment")
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST must point at a Firestore emulator; refusing to touch a real project.")
+    from storage.firestore_client import FirestoreClient
+
+    client = FirestoreClient()
+    groups = seed_groups(client, args.groups)
+
+    hashes = []
+    expected = Counter()
+    for i in range(args.payments):
+        group = groups[i % len(groups)]
+        event = payloads.managed_payment_event(group["group_id"], PLAN_CREDITS)
+        client.create_transaction(event)
+        # A redelivered managedPayment must not create a second pending transaction.
+        client.create_transaction(event)
+        hashes.append(event["eventData"]["managedPayment"]["transactions"][0]["transactionHash"])
+        expected[group["doc_id"]] += PLAN_CREDITS
+
+    deliveries = [h for h in hashes for _ in range(args.duplicates)]
+    random.shuffle(deliveries)
+    latencies, outcomes = [], Counter()
+
+    def confirm(transaction_hash):
+        start = time.perf_counter()
+        try:
+            result = client.confirm_transaction_by_tx_hash(transaction_hash)
+            outcome = "already_confirmed" if result == "already_confirmed" else ("confirmed" if result else "not_found")
+        except Exception as e:
+            outcome = f"error:{type(e).__name__}"
+        return time.perf_counter() - start, outcome
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for latency, outcome in pool.map(confirm, deliveries):
+            latencies.append(latency)
+            outcomes[outcome] += 1
+    elapsed = time.perf_counter() - start
+
+    print(format_table({"confirm": summarize(latencies, elapsed)}))
+    print("\noutcomes:", dict(outcomes))
+
+    refs = [client.group_collection.document(g["doc_id"]) for g in groups]
+    actual = {snap.id: (snap.to_dict() or {}).get("credits", 0) for snap in client.db.get_all(refs)}
+    mismatched = {doc_id: (expected[doc_id], actual.get(doc_id)) for doc_id in expected if expected[doc_id] != actual.get(doc_id)}
+    ok = not mismatched and outcomes["confirmed"] == len(hashes)
+    print(f"\ncredited exactly once: {'OK' if ok else 'FAILED'}")
+    for doc_id, (want, got) in mismatched.items():
+        print(f"  {doc_id}: expected {want}, got {got}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
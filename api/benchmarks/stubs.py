@@ -0,0 +1,216 @@
+"""
+Local stand-ins for the external services the bot talks to.
+
+Runs a Telegram Bot API stub, a Pika stand-in and a Radom stub in one process:
+
+    python -m benchmarks.stubs --telegram-port 8081 --pika-port 8082 --radom-port 8083 \
+        --pika-queue-time 5 --pika-render-time 10 --pika-fail-rate 0.05
+
+Point the bot at them with TELEGRAM_API_BASE_URL, PIKA_BASE_URL and RADOM_API_URL.
+Each stub exposes GET /_stats with call counts so a load test can check its work.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+BOT_USER = {"id": 7000000001, "is_bot": True, "first_name": "PumpReels", "username": "pumpreelsbot"}
+ADMIN_USER = {"id": 5000000001, "is_bot": False, "first_name": "Admin", "username": "groupadmin"}
+
+# JPEG-framed filler; the bot only forwards the bytes to Pika.
+_JPEG_BYTES = b"\xff\xd8\xff\xe0" + bytes(2048) + b"\xff\xd9"
+
+
+def create_telegram_app(latency: float = 0.0) -> FastAPI:
+    """
+    Bot API stub. Every method returns a plausible `result` so PTB can parse it.
+    """
+    app = FastAPI()
+    calls = Counter()
+    message_ids = iter(range(1, 10 ** 9))
+
+    def _message(chat_id, **extra):
+        message = {
+            "message_id": next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "supergroup" if int(chat_id) < 0 else "private"},
+            "from": BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    async def _params(request: Request) -> dict:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            return await request.json()
+        form = await request.form()
+        return dict(form)
+
+    @app.post("/bot{token}/{method}")
+    async def bot_method(token: str, method: str, request: Request):
+        calls[method] += 1
+        params = await _params(request)
+        if latency:
+            await asyncio.sleep(latency)
+
+        chat_id = params.get("chat_id", 0)
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "getFile":
+            file_id = params.get("file_id", "file")
+            result = {"file_id": file_id, "file_unique_id": file_id[:16], "file_size": len(_JPEG_BYTES), "file_path": f"photos/{file_id}.jpg"}
+        elif method == "getChatAdministrators":
+            result = [{"status": "creator", "user": ADMIN_USER, "is_anonymous": False}]
+        elif method == "getChatMember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "Member"}}
+        elif method in ("deleteMessage", "setWebhook", "deleteWebhook", "answerCallbackQuery"):
+            result = True
+        elif method == "sendAnimation":
+            result = _message(chat_id, caption=params.get("caption", ""), animation={
+                "file_id": "anim", "file_unique_id": "anim", "width": 1, "height": 1, "duration": 1,
+            })
+        elif method == "sendVideo":
+            result = _message(chat_id, caption=params.get("caption", ""), video={
+                "file_id": "video", "file_unique_id": "video", "width": 1, "height": 1, "duration": 5,
+            })
+        elif method == "editMessageCaption":
+            result = _message(chat_id, caption=params.get("caption", ""))
+        else:
+            result = _message(chat_id or 1, text=params.get("text", ""))
+        return {"ok": True, "result": result}
+
+    @app.get("/file/bot{token}/{file_path:path}")
+    async def download_file(token: str, file_path: str):
+        calls["download_file"] += 1
+        return Response(content=_JPEG_BYTES, media_type="image/jpeg")
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(calls)
+
+    return app
+
+
+class _PikaJob:
+    __slots__ = ("video_id", "submitted_at", "fails", "terminal_polled")
+
+    def __init__(self, fails: bool):
+        self.video_id = uuid.uuid4().hex
+        self.submitted_at = time.monotonic()
+        self.fails = fails
+        self.terminal_polled = False
+
+
+def create_pika_app(queue_time: float = 5.0, render_time: float = 10.0, fail_rate: float = 0.0,
+                    submit_error_rate: float = 0.0, latency: float = 0.0) -> FastAPI:
+    """
+    Pika stand-in. Jobs sit in `queued` for `queue_time` seconds, report `started`
+    with linear progress for `render_time` seconds, then finish or fail.
+    """
+    app = FastAPI()
+    jobs = {}
+    counts = Counter()
+
+    @app.post("/generate/2.2/i2v")
+    async def submit(request: Request):
+        await request.form()
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < submit_error_rate:
+            counts["submit_errors"] += 1
+            return Response(status_code=503, content='{"error": "overloaded"}', media_type="application/json")
+        job = _PikaJob(fails=random.random() < fail_rate)
+        jobs[job.video_id] = job
+        counts["submitted"] += 1
+        return {"video_id": job.video_id}
+
+    @app.get("/videos/{video_id}")
+    async def status(video_id: str):
+        counts["polls"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        job = jobs.get(video_id)
+        if job is None:
+            return Response(status_code=404, content='{"error": "not found"}', media_type="application/json")
+
+        elapsed = time.monotonic() - job.submitted_at
+        if elapsed < queue_time:
+            return {"id": video_id, "status": "queued", "progress": 0}
+        if elapsed < queue_time + render_time:
+            progress = int(100 * (elapsed - queue_time) / render_time) if render_time else 100
+            return {"id": video_id, "status": "started", "progress": progress}
+
+        if not job.terminal_polled:
+            job.terminal_polled = True
+            counts["failed" if job.fails else "finished"] += 1
+        if job.fails:
+            return {"id": video_id, "status": "failed", "progress": 0}
+        return {"id": video_id, "status": "finished", "progress": 100, "url": f"https://cdn.example.invalid/{video_id}.mp4"}
+
+    @app.get("/_stats")
+    async def stats():
+        pending = sum(1 for job in jobs.values() if not job.terminal_polled)
+        return {**counts, "pending": pending}
+
+    return app
+
+
+def create_radom_app(latency: float = 0.0) -> FastAPI:
+    """Radom stub that hands out checkout sessions."""
+    app = FastAPI()
+    counts = Counter()
+
+    @app.post("/checkout_session")
+    async def checkout_session(request: Request):
+        await request.json()
+        counts["checkout_session"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        session_id = str(uuid.uuid4())
+        return {"checkoutSessionId": session_id, "checkoutSessionUrl": f"https://pay.example.invalid/{session_id}"}
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(counts)
+
+    return app
+
+
+async def serve(apps_and_ports, host: str = "127.0.0.1"):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+        for app, port in apps_and_ports
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--pika-port", type=int, default=8082)
+    parser.add_argument("--radom-port", type=int, default=8083)
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Seconds added to each Bot API call")
+    parser.add_argument("--pika-latency", type=float, default=0.05, help="Seconds added to each Pika call")
+    parser.add_argument("--pika-queue-time", type=float, default=5.0)
+    parser.add_argument("--pika-render-time", type=float, default=10.0)
+    parser.add_argument("--pika-fail-rate", type=float, default=0.0, help="Fraction of jobs that end in 'failed'")
+    parser.add_argument("--pika-submit-error-rate", type=float, default=0.0, help="Fraction of submits answered with 503")
+    parser.add_argument("--radom-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    asyncio.run(serve([
+        (create_telegram_app(args.telegram_latency), args.telegram_port),
+        (create_pika_app(args.pika_queue_time, args.pika_render_time, args.pika_fail_rate,
+                         args.pika_submit_error_rate, args.pika_latency), args.pika_port),
+        (create_radom_app(args.radom_latency), args.radom_port),
+    ], host=args.host))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+One uvicorn worker against N, under the same offline load test.
+
+Runs benchmarks/loadtest.py once per worker count, each time starting the API
+through server.py (so the runs use the production setup: per-worker clients,
+the shared cache and merged /metrics), and prints the totals side by side.
+Worker counts default to 1 and what server.py would pick on this machine.
+
+Run from the api/ directory against a throwaway SQLite database (shared by the
+workers) or a Firestore emulator, at a rate high enough to load one worker:
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python -m benchmarks.workers --rate 300 --duration 30
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python -m benchmarks.workers --counts 1 2 4 --rate 300
+
+Every other loadtest option (--mix, stub latencies, ports) applies to each run.
+"""
+import sys
+
+from benchmarks.loadtest import build_parser, loop_lag_quantiles, run, summary_rows
+from benchmarks.report import format_table
+
+COLUMNS = ("count", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "loop_lag_p99_ms", "ledger")
+
+
+def default_counts() -> list:
+    import server
+
+    workers = server.worker_count(server.cpu_limit(), server.memory_limit(), 384 * 1024 * 1024)
+    return sorted({1, workers})
+
+
+def main():
+    parser = build_parser(__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", help="Worker counts to compare (default: 1 and the derived count)")
+    args = parser.parse_args()
+    if args.target:
+        parser.error("--target cannot be combined with a worker comparison")
+
+    rows = {}
+    all_ok = True
+    for workers in args.counts or default_counts():
+        print(f"running with {workers} worker(s)...", flush=True)
+        args.workers = workers
+        load_test, result = run(args)
+        row = summary_rows(load_test, result["elapsed"])["TOTAL"]
+        lag = loop_lag_quantiles(result, (0.99,))
+        row["loop_lag_p99_ms"] = lag[0] * 1000 if lag else float("nan")
+        expected = load_test.ledger.expected_total(result["pika_stats"])
+        ok = expected == load_test.ledger.actual_total()
+        row["ledger"] = "OK" if ok else "MISMATCH"
+        all_ok = all_ok and ok
+        rows[f"{workers} worker(s)"] = row
+
+    print()
+    print(format_table(rows, columns=COLUMNS))
+    baseline = next(iter(rows.values()))
+    for name, row in list(rows.items())[1:]:
+        if baseline["throughput_rps"] and baseline["p99_ms"]:
+            print(f"{name}: {row['throughput_rps'] / baseline['throughput_rps']:.2f}x throughput,"
+                  f" {row['p99_ms'] / baseline['p99_ms']:.2f}x p99 latency of the first run")
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
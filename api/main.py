@@ -1,23 +1,53 @@
 import os
-import io
 import time
 import json
 import asyncio
-import aiofiles
 import logging
 import uvicorn
-import base64
-import requests
 import hmac
-import hashlib
-from urllib.parse import unquote
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, Header, Depends, UploadFile, File, Form, Query, HTTPException, status
+from fastapi import FastAPI, Request, Header, Depends, UploadFile, File, Form, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from storage.base import storage_from_env
 from storage.firestore_client import FirestoreClient
+from storage.models import Group, Render
+from storage.cache import TTLCache
+from storage.group_cache import CachedGroups
+from storage.shared_cache import cache_for, shared_cache_from_env
 from storage.gcs_client import GCSClient
-from ai_services.pika_client import PikaClient
-from telegram import Update, KeyboardButton, InlineKeyboardButton, WebAppInfo, InlineKeyboardMarkup, ForceReply, ReplyKeyboardMarkup
+from payments.radom_client import RadomClient
+from storage.render_handoff import RenderHandoff
+from storage.webhook_inbox import WebhookInbox, InboxProcessor, event_id_for
+from ai_services.circuit_breaker import backoff_delay
+from ai_services.render_tasks import RenderSupervisor
+from ai_services.router import VideoRouter, RenderRequest, AllProvidersFailed, providers_from_env
+from ai_services.shadow import shadow_from_env
+from ai_services.video_generator import QUEUED, STARTED, FINISHED, FAILED, CANCELED
+from monitoring.metrics import (
+    REGISTRY,
+    CONTENT_TYPE,
+    RENDERS_IN_FLIGHT,
+    RENDER_QUEUE_DEPTH,
+    POLL_LOOPS_ACTIVE,
+    RENDERS_DRAINED,
+)
+from monitoring.call_accounting import account_calls, set_handler
+from monitoring.capture import recorder_from_env
+from monitoring.loop_lag import monitor_loop_lag, watchdog_from_env
+from monitoring.structured_logging import configure_logging
+from monitoring.telegram_request import InstrumentedHTTPXRequest
+from monitoring.worker_metrics import worker_metrics_from_env
+from monitoring.tracing import configure_tracing_from_env, start_span, start_trace, traced
+from telegram_bot.bot_worker import BotWorkerUnavailable, bot_worker_from_env
+from telegram_bot.broadcast import send_mini_app_card
+from telegram_bot.keyboards import build_group_picker
+from telegram_bot.membership import ChatMembershipCache
+from telegram_bot.messages import MINI_APP_URL, build_buy_credits_text, build_mini_app_caption
+from telegram_bot.updates import bot_added_chat, update_kind
+from telegram_bot.user_state import UserStateStore
+from webapp.auth import verify_init_data
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ChatType
 from telegram.error import BadRequest
 from telegram.ext import (
@@ -31,15 +61,31 @@ from telegram.ext import (
 )
 
 # Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+configure_logging()
 logger = logging.getLogger(__name__)
+configure_tracing_from_env()
+webhook_recorder = recorder_from_env()
+# The clients below hold gRPC channels and connection pools that do not survive a fork,
+# so this module has to be imported by the process that serves it (see server.py).
+IMPORTED_IN_PID = os.getpid()
 
 VIDEO_CREDITS = 100
-
-RADOM_TEST_KEY = os.environ.get('RADOM_TEST_KEY')
+VIDEO_PROVIDERS_UNAVAILABLE = "⚠️ Video generation is temporarily unavailable. No credits were used, please try again in a few minutes."
+VIDEO_SERVICE_RESTARTING = "♻️ PumpReels is restarting. No credits were used, please send your video again in a minute."
+# Seconds a shutdown waits for in-flight renders before parking them for another replica;
+# keep it below the platform's termination grace period.
+DRAIN_TIMEOUT_SECONDS = float(os.environ.get("DRAIN_TIMEOUT_SECONDS", 20))
+# Extra seconds a render already sending its result gets before it is refunded instead;
+# the drain timeout plus this must also fit in the grace period.
+DELIVERY_GRACE_SECONDS = float(os.environ.get("DELIVERY_GRACE_SECONDS", 5))
+# Consecutive failed polls before a render gives up on its job and fails over.
+POLL_ERROR_LIMIT = int(os.environ.get("POLL_ERROR_LIMIT", 5))
+
+# Radom sends it in the radom-verification-key header of every webhook; unset rejects them all.
 RADOM_TEST_WEBHOOK_KEY = os.environ.get('RADOM_TEST_WEBHOOK_KEY')
+# Radom inbox event this service queues itself once a payment settles, so the purchase
+# card is retried on its own.
+PURCHASE_NOTIFICATION = "purchaseNotification"
 
 # TESTING
 #     "100":  "6cdaa60f-4e45-48b9-bff8-2b06ed51873a",
@@ -54,49 +100,88 @@ CREDIT_PLANS = {
 
 CURRENCY = "USD"
 SELECT_GROUP_FOR_CREDITS = range(1)
+GROUP_PAGE_SIZE = 8
+CREDITS_CONVERSATION_TIMEOUT = 600
+GROUP_LIST_FIELDS = ["title", "group_id", "credits"]
 
 # "https://pay.radom.com/pay/342b688b-c051-4820-ba9f-26c648cddde3"
 # "https://pay.radom.com/pay/fd243359-b3a6-4c7e-a082-6cbab298328b"
 # "https://pay.radom.com/pay/22084efe-2acc-46dc-aa83-255e40ec550c"
 # "https://pay.radom.com/pay/176362cb-e739-47d3-9232-c025b5d859fc"
 
-firestore_client = FirestoreClient()
+storage_client = storage_from_env()
+# The webhook inbox and render hand-off live in Firestore, shared by every replica. With a
+# single-node backend (SQLite) Radom events are applied inline and renders are not handed off.
+shared_db = storage_client.db if isinstance(storage_client, FirestoreClient) else None
+
+# One cache tier for every uvicorn worker on the host when SHARED_CACHE_PATH is set, else per process.
+shared_cache = shared_cache_from_env()
+# Group lookups go through the cache; credit changes made here drop the group's record.
+storage_client = CachedGroups(
+    storage_client,
+    records=cache_for(shared_cache, "group", float(os.environ.get("GROUP_CACHE_SECONDS", 30))),
+    doc_ids=cache_for(shared_cache, "group_doc_id", 3600),
+)
 
 gcs_client = GCSClient(bucket_name="pumpreels_files")
-pika_client = PikaClient()
+# Checkout sessions are shared too, so a session paid through one worker is dropped for all of them.
+radom_client = RadomClient(
+    sessions=cache_for(shared_cache, "checkout", 3600),
+    session_keys=cache_for(shared_cache, "checkout_key", 3600),
+)
+# With several workers, Telegram updates are all handled by one of them: the state below,
+# PTB's conversations and the render supervisor are per process (see telegram_bot.bot_worker).
+bot_worker = bot_worker_from_env()
+# user id -> the /credits group listing pages fetched so far
+creator_groups_cache = TTLCache(ttl=60)
+# Per-user bot state (group picked in /credits, picker message id), dropped after an hour idle
+user_states = UserStateStore(idle_ttl=int(os.environ.get("USER_STATE_IDLE_SECONDS", 3600)))
+video_router = VideoRouter(providers_from_env())
+shadow_mirror = shadow_from_env()
+loop_watchdog = watchdog_from_env()
+# Set when server.py runs several workers; /metrics then reports all of them.
+worker_metrics = worker_metrics_from_env()
+render_handoff = RenderHandoff(shared_db) if shared_db else None
+render_supervisor = RenderSupervisor(max_concurrent=int(os.environ.get("MAX_CONCURRENT_RENDERS", 50)))
+# Set once shutdown starts; no new renders are charged after that.
+draining = False
 
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 TELEGRAM_SECRET_TOKEN = os.environ.get("TELEGRAM_SECRET_TOKEN")
+# Guards the /admin endpoints; they are disabled when unset.
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN")
+# Point at a local Bot API server or stub (e.g. benchmarks/stubs.py) instead of api.telegram.org
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
 if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN not set!")
     exit(1)
 
+# doc_id -> Telegram group id, for authorizing mini-app calls without a Firestore read each time
+group_chat_ids = cache_for(shared_cache, "chat_id", 3600)
+# mini-app render job id -> doc_id of the group charged for it
+render_charges = cache_for(shared_cache, "render_charge", 3600)
+# asset URL -> Telegram file_id, so the animation is uploaded once rather than fetched per message
+asset_file_ids = cache_for(shared_cache, "asset", 24 * 3600)
+RENDERING_ANIMATION_URL = "https://pumpreels-mini-app.netlify.app/rendering.gif"
+
 # Create the Telegram Application (PTB v20+)
-application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+application = (
+    Application.builder()
+    .token(TELEGRAM_BOT_TOKEN)
+    .base_url(f"{TELEGRAM_API_BASE_URL}/bot")
+    .base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+    .request(InstrumentedHTTPXRequest())
+    .build()
+)
+membership_cache = ChatMembershipCache(
+    application.bot,
+    members=cache_for(shared_cache, "member", 600, 100000),
+    admin_changes=cache_for(shared_cache, "admin_change", 600, 100000),
+)
 
 
 def _verify_init_data(init_data: str) -> dict:
-    vals = {k: unquote(v) for k, v in [s.split('=', 1) for s in init_data.split('&')]}
-    their_hash = vals.pop("hash", None)
-    if not their_hash:
-        return None
-
-    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(vals.items()))
-
-    secret_key = hmac.new("WebAppData".encode(), TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).digest()
-    our_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-
-    if not hmac.compare_digest(our_hash, their_hash):
-        return None
-
-    if "user" in vals:
-        try:
-            vals["user"] = json.loads(vals["user"])
-        except Exception as e:
-            logger.error('Error getting user: {e}'.format(e))
-            return None
-
-    return vals
+    return verify_init_data(init_data, TELEGRAM_BOT_TOKEN)
 
 
 async def require_telegram(init_data: str = Header(..., alias="X-TG-INIT-DATA")):
@@ -107,6 +192,73 @@ async def require_telegram(init_data: str = Header(..., alias="X-TG-INIT-DATA"))
     return data
 
 
+async def require_admin(token: str = Header(None, alias="X-Admin-Token")):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not token or not hmac.compare_digest(token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+async def require_radom(key: str = Header(None, alias="radom-verification-key")):
+    """Rejects webhooks that do not carry Radom's verification key, before anything is stored."""
+    if not RADOM_TEST_WEBHOOK_KEY:
+        logger.error("RADOM_TEST_WEBHOOK_KEY is not set; rejecting Radom webhook")
+    if not RADOM_TEST_WEBHOOK_KEY or not key or not hmac.compare_digest(key, RADOM_TEST_WEBHOOK_KEY):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Radom verification key")
+
+
+async def require_group_member(chat_id: int, tg_data: dict):
+    """
+    Rejects mini-app calls from users who are not in the group they act on.
+    Answered from membership_cache, so repeat calls cost no Bot API request.
+    """
+    user_id = tg_data.get("user", {}).get("id")
+    if not user_id or not await membership_cache.is_member(int(chat_id), int(user_id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not a member of this group")
+
+
+def group_chat_id(doc_id: str) -> int:
+    """Telegram chat id for a group document; it never changes, so it is cached after the first read."""
+    chat_id = group_chat_ids.get(doc_id)
+    if chat_id is None:
+        group_data = storage_client.get_group_by_id(doc_id)
+        if not group_data:
+            raise HTTPException(status_code=404, detail="Group not found")
+        chat_id = group_data.group_id
+        group_chat_ids.set(doc_id, chat_id)
+    return chat_id
+
+
+def render_charged_to(job_id: str, doc_id: str) -> bool:
+    """True if the group `doc_id` paid for the mini-app render `job_id`; charges never change, so they are cached."""
+    charged_doc_id = render_charges.get(job_id)
+    if charged_doc_id is None:
+        charged_doc_id = storage_client.render_charge(job_id)
+        if charged_doc_id is None:
+            return False
+        render_charges.set(job_id, charged_doc_id)
+    return charged_doc_id == doc_id
+
+
+async def send_asset_animation(send, url: str, **kwargs):
+    """
+    Sends an animation by the file_id Telegram gave it last time, so the URL is not
+    fetched again. Falls back to the URL (and caches the new file_id) on the first
+    send or when the cached file_id is rejected.
+    """
+    file_id = asset_file_ids.get(url)
+    if file_id:
+        try:
+            return await send(animation=file_id, **kwargs)
+        except BadRequest as e:
+            logger.warning("Cached file_id for %s was rejected: %s", url, e)
+            asset_file_ids.pop(url)
+    message = await send(animation=url, **kwargs)
+    if message.animation:
+        asset_file_ids.set(url, message.animation.file_id)
+    return message
+
+
 async def get_chat_administrators(chat_id: int) -> list:
     """
     Fetches the list of chat administrators for the given chat.
@@ -118,7 +270,7 @@ async def get_chat_administrators(chat_id: int) -> list:
       List of User objects (admins).
     """
     try:
-        admins = await application.bot.get_chat_administrators(chat_id)
+        admins = await membership_cache.get_admins(chat_id)
         return admins
     except Exception as e:
         logger.error(f"Failed to get chat administrators for chat {chat_id}: {e}")
@@ -135,16 +287,9 @@ async def dm_admin_to_buy_credits(admin_user_id: int, group_title: str, group_ch
       group_chat_id (int): Telegram chat ID of the group.
     """
     try:
-        safe_title = group_title.replace('-', '\\-').replace('(', '\\(').replace(')', '\\)').replace('.', '\\.').replace('!', '\\!')
-
         await application.bot.send_message(
             chat_id=admin_user_id,
-            text=(
-                f"👋 Thanks for adding me to *{safe_title}*\\!\n\n"
-                f"Before I can start working in the group, you\\'ll need to activate me by purchasing credits 💰\\.\n\n"
-                f"👇 Tap below to top up and pump your coin with PumpReels\\:\n\n"
-                f"You can always use /credits to purchase more credits later\\."
-            ),
+            text=build_buy_credits_text(group_title),
             parse_mode="MarkdownV2",
             reply_markup=InlineKeyboardMarkup(
                 [[InlineKeyboardButton("💳 Buy Credits", callback_data="credits")]]
@@ -162,28 +307,9 @@ async def handle_new_group_update(update_json):
     Parameters:
       update_json (dict): The update payload from Telegram.
     """
-    message = update_json.get('message')
-    logger.info(message)
-    if not message:
-        return  # No message, nothing to do
-
-    new_chat_participant = message.get('new_chat_participant')
-    if not new_chat_participant:
-        return  # No new participant data
-
-    # Check if the new participant is a bot
-    is_bot = new_chat_participant.get('is_bot', False)
-    if not is_bot:
-        return  # Not a bot; no action needed
-
-    # Check if this is our bot (PumpReelsBot)
-    username = new_chat_participant.get('username')
     # MARK: CHANGE THIS to PumpReelsBot
-    if username == 'pumpreelsbot':
-        group = message.get('chat')
-        # Add the group to Firestore using your client
-
-        # After confirming it's pumpreelsbot:
+    group = bot_added_chat(update_json, 'pumpreelsbot')
+    if group:
         group_chat_id = group.get('id')
         group_title = group.get('title')
 
@@ -200,36 +326,86 @@ async def handle_new_group_update(update_json):
                 creator_full_name = admin.user.full_name
                 await dm_admin_to_buy_credits(creator_user_id, group_title, group_chat_id)
                 break
-        doc_id = firestore_client.create_group(data=group, creator_user_id=creator_user_id, creator_username=creator_username, creator_full_name=creator_full_name)
+        doc_id = storage_client.create_group(data=group, creator_user_id=creator_user_id, creator_username=creator_username, creator_full_name=creator_full_name)
+        creator_groups_cache.pop(creator_user_id)
         logger.info(f"Group added to Firestore: {doc_id}")
-    else:
-        logger.info("New bot added is not pumpreelsbot. No action taken.")
 
 
-async def get_video_url(video_id: str, group_data: dict, message_id: int, user_identifier: str) -> str:
-    chat_id = group_data.get('group_id')
-    doc_id = group_data.get('doc_id')
+@traced()
+async def get_video_url(job_id: str, render_request: RenderRequest, group_data: Group, message_id: int, user_identifier: str) -> str:
+    """
+    Polls a routed job until it finishes. When the job fails upstream, or sits in a
+    provider's queue while another provider would start it sooner, the same request
+    is resubmitted elsewhere. A failed poll is retried with backoff; the job is only
+    abandoned after POLL_ERROR_LIMIT failures in a row or once its provider's circuit
+    opens. Credits are never touched here.
+
+    :raises AllProvidersFailed: Once every provider has failed the render, or when
+        a render resumed without its request fails
+    """
+    chat_id = group_data.group_id
     start_time = time.monotonic()
     max_wait_seconds = 300  # 5 minutes
-    while time.monotonic() - start_time < max_wait_seconds:
-        try:
-            # Fetch current status info
-            video = pika_client.check_video_status(video_id=video_id)
-            logger.info(video)
-            status = video.get('status', 'queued')
+    submitted_at = start_time
+    tried = set()
+    queued = False
+    poll_errors = 0
+
+    async def failover(reason: str, running: bool) -> str:
+        provider, _ = video_router.parse_job_id(job_id)
+        tried.add(provider.name)
+        if render_request is None:
+            # Resumed from a hand-off: the image is gone, so there is nothing to resubmit.
+            raise AllProvidersFailed(f"job {job_id} on {provider.name} {reason}")
+        if running:
+            # Stop the abandoned job where the provider allows it; otherwise just stop tracking it.
+            if not await video_router.cancel(job_id):
+                video_router.forget(job_id)
+        logger.warning("Job %s on %s %s; failing over", job_id, provider.name, reason)
+        new_job_id = await video_router.submit(render_request, exclude=tried)
+        render_supervisor.current().job_id = new_job_id
+        return new_job_id
+
+    POLL_LOOPS_ACTIVE.inc()
+    try:
+        while time.monotonic() - start_time < max_wait_seconds:
+            try:
+                video = await video_router.get_status(job_id)
+            except AllProvidersFailed:
+                raise
+            except Exception as e:
+                poll_errors += 1
+                provider, _ = video_router.parse_job_id(job_id)
+                if poll_errors < POLL_ERROR_LIMIT and video_router.breakers[provider.name].available():
+                    # Usually a blip; the job itself is most likely still fine upstream.
+                    logger.warning("Error retrieving task %s (%s in a row): %s", job_id, poll_errors, e)
+                    await asyncio.sleep(1.0 + backoff_delay(poll_errors))
+                    continue
+                logger.error("Error retrieving task %s: %s", job_id, e)
+                poll_errors = 0
+                job_id = await failover("could not be polled", running=True)
+                submitted_at = time.monotonic()
+                continue
+            poll_errors = 0
+
+            status = video.get('status', QUEUED)
             progress = video.get('progress', 0)
-            url = video.get('url', '')
-
-            logger.info("Pika Video Status: %s", status)
-            logger.info("Pika Video URL: %s", url)
-
-            # Handle different statuses
-            if status in ['queued', 'pending']:
-                # Not started yet, just keep polling
-                logger.info("Task is in '%s' state. Waiting for it to start...", status)
-
-            elif status == 'started':
-                logger.info("Task {} with {}% progress".format(status, progress))
+            # One line per poll per render adds up; keep a sample for debugging stuck jobs.
+            logger.info("Job %s is %s (%s%%)", job_id, status, progress, extra={"sample_rate": 0.02})
+
+            if status == QUEUED:
+                if not queued:
+                    queued = True
+                    RENDER_QUEUE_DEPTH.inc()
+                if video_router.queued_too_long(job_id, time.monotonic() - submitted_at):
+                    job_id = await failover("is stuck in queue", running=True)
+                    submitted_at = time.monotonic()
+                    continue
+
+            elif status == STARTED:
+                if queued:
+                    queued = False
+                    RENDER_QUEUE_DEPTH.dec()
 
                 try:
                     await application.bot.edit_message_caption(
@@ -245,92 +421,153 @@ async def get_video_url(video_id: str, group_data: dict, message_id: int, user_i
                     else:
                         raise e
 
-            elif status == 'finished':
-                logger.info(video)
+            elif status == FINISHED:
                 url = video.get('url', '')
                 # All done, return URL if found
-                if url and len(url) > 0:
+                if url:
                     return url
-                else:
-                    logger.error("Video succeeded but no output found: %s", video)
-                    return None
-
-            elif status in ['failed', 'canceled']:
-                try:
-                    firestore_client.add_credits(doc_id, VIDEO_CREDITS)
-                    logger.info(f"Refunded {VIDEO_CREDITS} credit to group %s", group_id)
-                except Exception as e:
-                    logger.error("Failed to refund credit to %s: %s", group_id, e)
+                logger.error("Video %s succeeded but no output found: %s", job_id, video)
                 return None
 
+            elif status in (FAILED, CANCELED):
+                job_id = await failover(f"ended as {status}", running=False)
+                submitted_at = time.monotonic()
+                continue
+
             else:
                 # Handle unexpected status values with a log
                 logger.info("Task status is '%s'. Waiting...", status)
 
-        except Exception as e:
-            logger.error("Error retrieving task: %s", e)
-            return None
+            # Sleep briefly before polling again
+            await asyncio.sleep(1.0)
 
-        # Sleep briefly before polling again
-        await asyncio.sleep(1.0)
+        video_router.forget(job_id, outcome="timeout")
+        logger.error("Timed out waiting for job %s", job_id)
+        return None
+    finally:
+        POLL_LOOPS_ACTIVE.dec()
+        if queued:
+            RENDER_QUEUE_DEPTH.dec()
 
 # ------------------
 # Helper function to process the video generation.
 # This function downloads the image, encodes it, calls the runway API,
 # deletes temporary files and bot messages, and sends the final video.
 # ------------------
-async def process_video(update: Update, context: ContextTypes.DEFAULT_TYPE, prompt_text: str, group_data: dict):
+@traced()
+async def process_video(update: Update, context: ContextTypes.DEFAULT_TYPE, file_id: str, prompt_text: str, group_data: Group):
     chat_id = update.effective_chat.id
     user_identifier = update.message.from_user.username or update.message.from_user.first_name
 
+    if draining:
+        await update.message.reply_text(VIDEO_SERVICE_RESTARTING)
+        return ConversationHandler.END
+
+    # Every provider's circuit is open: reject before charging or showing the queue animation.
+    if not video_router.available():
+        await update.message.reply_text(VIDEO_PROVIDERS_UNAVAILABLE)
+        return ConversationHandler.END
+
     # MARK: DECREMENT CREDITS
     try:
-        doc_id = group_data.get('doc_id')
-        firestore_client.decrement_credits(doc_id, VIDEO_CREDITS)
+        doc_id = group_data.doc_id
+        storage_client.decrement_credits(doc_id, VIDEO_CREDITS)
     except ValueError as e:
         await update.message.reply_text(
             f"⚠️ Your group ran out of credits!"
             f"The admin needs to buy more credits to continue the pump 🚀"
         )
         return ConversationHandler.END
+    render = render_supervisor.current()
+    render.charged = True
+    render.set_stage("charged")
 
-    processing_msg = await application.bot.send_animation(
+    RENDERS_IN_FLIGHT.inc()
+    try:
+        await _render_and_deliver(update, context, file_id, prompt_text, group_data, chat_id, user_identifier)
+    finally:
+        RENDERS_IN_FLIGHT.dec()
+
+
+async def _render_and_deliver(update: Update, context: ContextTypes.DEFAULT_TYPE, file_id: str, prompt_text: str, group_data: Group, chat_id: int, user_identifier: str):
+    processing_msg = await send_asset_animation(
+        application.bot.send_animation,
+        RENDERING_ANIMATION_URL,
         chat_id=chat_id,
-        animation="https://pumpreels-mini-app.netlify.app/rendering.gif",
         caption=f"@{user_identifier} video is in queue..."
     )
 
     msg_chat_id = processing_msg.chat.id
     msg_id = processing_msg.message_id
-
-    file_id = context.user_data.get("file_id")
-    file_obj = await application.bot.get_file(file_id)
-    file_bytes = await file_obj.download_as_bytearray()
-
-    image_io = io.BytesIO(file_bytes)
-    image_io.name = "image.jpg"
+    render = render_supervisor.current()
+    render.message_id = msg_id
 
     video_url = None
     try:
-        pika_result = pika_client.generate_video(
-            image_file="image.jpg",
-            image_bytes=image_io,
+        render.set_stage("downloading")
+        with start_span("download_image"):
+            file_obj = await application.bot.get_file(file_id)
+            file_bytes = await file_obj.download_as_bytearray()
+
+        render_request = RenderRequest(
+            image_bytes=bytes(file_bytes),
             prompt_text=prompt_text,
             negative_prompt='blurry, low quality, distorted, warped, deformed, color shifted, miscolored, incomplete subject, missing subject, cropped subject',
             duration=5,
             resolution='720p'
         )
-        video_id = pika_result.get('video_id', '')
-        logger.info("Video started with id: %s", video_id)
-        video_url = await get_video_url(video_id, group_data, msg_id, user_identifier)
+
+        render.set_stage("submitting")
+        job_id = await video_router.submit(render_request)
+        render.job_id = job_id
+        logger.info("Video started with id: %s", job_id)
+        if shadow_mirror:
+            shadow_mirror.maybe_mirror(render_request)
+        render.set_stage("rendering")
+        video_url = await get_video_url(job_id, render_request, group_data, msg_id, user_identifier)
+    except AllProvidersFailed as e:
+        logger.error("Every video provider failed: %s", e)
     except Exception as e:
         logger.error("Error generating video: %s", e)
 
+    if not video_url:
+        # The user is told it failed (every provider, a timeout or an unexpected error), so refund;
+        # charged once in process_video, so once however many providers were tried.
+        refund_supervised_render(render)
+    await _deliver_render(chat_id, msg_id, user_identifier, prompt_text, video_url)
+
+
+def refund_render(doc_id: str, job_id: str = None):
+    """Returns a render's credits; with a job id, at most once across every refund path."""
     try:
-        await application.bot.delete_message(chat_id=chat_id, message_id=processing_msg.message_id)
-        logger.info("Deleted processing message: %s", processing_msg.message_id)
+        if job_id:
+            if not storage_client.refund_render_once(doc_id, job_id, VIDEO_CREDITS):
+                return
+        else:
+            storage_client.add_credits(doc_id, VIDEO_CREDITS)
+        logger.info(f"Refunded {VIDEO_CREDITS} credits to group %s", doc_id)
     except Exception as e:
-        logger.error("Failed to delete processing message (%s): %s", processing_msg.message_id, e)
+        logger.error("Failed to refund credits to %s: %s", doc_id, e)
+
+
+def refund_supervised_render(render):
+    """
+    Refunds a supervised render if it is still charged, keyed on its job when it has
+    one, and marks it uncharged so a later cancel or shutdown drain skips it.
+    """
+    if not render.charged:
+        return
+    refund_render(render.doc_id, render.job_id)
+    render.charged = False
+
+
+async def _deliver_render(chat_id: int, processing_msg_id: int, user_identifier: str, prompt_text: str, video_url: str):
+    render_supervisor.current().set_stage("delivering")
+    try:
+        await application.bot.delete_message(chat_id=chat_id, message_id=processing_msg_id)
+        logger.info("Deleted processing message: %s", processing_msg_id)
+    except Exception as e:
+        logger.error("Failed to delete processing message (%s): %s", processing_msg_id, e)
 
     # Send the final video or an error message.
     if video_url:
@@ -339,6 +576,130 @@ async def process_video(update: Update, context: ContextTypes.DEFAULT_TYPE, prom
     else:
         await application.bot.send_message(chat_id=chat_id, text="Sorry, an error occurred while processing your video.")
 
+
+# ------------------
+# Render tracking, shutdown drain and hand-off
+# ------------------
+async def cancel_render(render) -> bool:
+    """
+    Stops a supervised render for good: ends its local poll loop, cancels the provider
+    job where the provider supports it (otherwise the job just stops being tracked),
+    refunds the group if it was charged and removes the progress message.
+    Returns False once the render is delivering or already finished.
+    """
+    if render.stage == "delivering" or not render.task.cancel():
+        return False
+    await asyncio.gather(render.task, return_exceptions=True)
+    logger.info("Cancelled render %s (job %s)", render.task_id, render.job_id)
+
+    if render.job_id:
+        try:
+            if not await video_router.cancel(render.job_id):
+                logger.info("Provider cannot cancel %s; it will finish upstream unused", render.job_id)
+        except Exception as e:
+            logger.warning("Failed to cancel %s upstream: %s", render.job_id, e)
+    refund_supervised_render(render)
+    if render.message_id:
+        try:
+            await application.bot.delete_message(chat_id=render.chat_id, message_id=render.message_id)
+        except Exception as e:
+            logger.warning("Failed to delete processing message (%s): %s", render.message_id, e)
+    return True
+
+
+async def _resume_render(checkpoint: Render):
+    parked_job_id = checkpoint.job_id
+    render_supervisor.current().set_stage("rendering")
+    group_data = Group(doc_id=checkpoint.doc_id, group_id=checkpoint.chat_id)
+    logger.info("Resuming handed-off render %s", parked_job_id)
+    RENDERS_DRAINED.labels("resumed").inc()
+    RENDERS_IN_FLIGHT.inc()
+    try:
+        video_url = None
+        try:
+            video_url = await get_video_url(parked_job_id, None, group_data, checkpoint.message_id, checkpoint.user_identifier)
+        except AllProvidersFailed as e:
+            logger.error("Resumed render %s failed: %s", parked_job_id, e)
+        except Exception as e:
+            logger.error("Error resuming render %s: %s", parked_job_id, e)
+        if not video_url:
+            # Keyed on the job: a render reclaimed after its lease ran out may get here twice.
+            refund_supervised_render(render_supervisor.current())
+        await _deliver_render(checkpoint.chat_id, checkpoint.message_id, checkpoint.user_identifier,
+                              checkpoint.prompt_text, video_url)
+        await asyncio.to_thread(render_handoff.complete, parked_job_id)
+    finally:
+        RENDERS_IN_FLIGHT.dec()
+
+
+async def resume_handed_off_renders(interval: float = 30.0):
+    """Picks up renders parked by replicas that shut down, including ones parked after this replica started."""
+    while not draining:
+        if bot_worker and not bot_worker.active:
+            # Resumed renders go to the supervisor that /cancel and /cancelVideo look in.
+            await asyncio.sleep(interval)
+            continue
+        try:
+            for doc_id in await asyncio.to_thread(render_handoff.parked):
+                checkpoint = await asyncio.to_thread(render_handoff.claim, doc_id)
+                if checkpoint:
+                    render_supervisor.spawn(_resume_render(checkpoint), charged=True, **checkpoint.to_dict())
+        except Exception as e:
+            logger.error("Failed to resume handed-off renders: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def drain_renders(timeout: float = DRAIN_TIMEOUT_SECONDS):
+    """
+    Stops charging new renders and gives in-flight ones `timeout` seconds to finish
+    and deliver. Renders still polling after that are parked for another replica to
+    resume and deliver; renders charged but not yet submitted are refunded, as are
+    all unfinished renders when there is no hand-off store (single-node storage).
+    Renders already delivering get DELIVERY_GRACE_SECONDS more and are then refunded,
+    never parked, since their result may already be in the chat. Users whose render
+    was still waiting for a slot are told to send it again.
+    """
+    global draining
+    draining = True
+    renders = render_supervisor.renders()
+    if not renders:
+        return
+    logger.info("Draining %d in-flight renders", len(renders))
+    done, pending = await asyncio.wait([render.task for render in renders], timeout=timeout)
+    delivering = [render.task for render in renders if render.task in pending and render.stage == "delivering"]
+    if delivering:
+        delivered, _ = await asyncio.wait(delivering, timeout=DELIVERY_GRACE_SECONDS)
+        done |= delivered
+        pending -= delivered
+    RENDERS_DRAINED.labels("finished").inc(len(done))
+
+    unfinished = [render for render in renders if render.task in pending]
+    for render in unfinished:
+        render.task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    for render in unfinished:
+        try:
+            if render.stage == "delivering":
+                # Renders whose failure was already refunded are no longer charged and are skipped.
+                refund_supervised_render(render)
+                RENDERS_DRAINED.labels("refunded").inc()
+                logger.warning("Render %s was still delivering at shutdown", render.job_id)
+            elif render_handoff and render.job_id and render.message_id:
+                await asyncio.to_thread(render_handoff.park, render.checkpoint())
+                RENDERS_DRAINED.labels("handed_off").inc()
+                logger.info("Handed off render %s", render.job_id)
+            elif render.charged:
+                refund_supervised_render(render)
+                RENDERS_DRAINED.labels("refunded").inc()
+                await application.bot.send_message(chat_id=render.chat_id, text=VIDEO_SERVICE_RESTARTING)
+            elif render.chat_id:
+                # Never charged (e.g. still waiting for a slot); the request itself is lost.
+                RENDERS_DRAINED.labels("cancelled").inc()
+                await application.bot.send_message(chat_id=render.chat_id, text=VIDEO_SERVICE_RESTARTING)
+        except Exception as e:
+            logger.error("Could not hand off or refund render %s: %s", render.task_id, e)
+
 # ------------------
 # Telegram Handlers (Async)
 # ------------------
@@ -385,11 +746,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
-async def show_credits_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, group_data: dict) -> int:
+async def show_credits_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, group_data: Group) -> int:
     message = update.message or update.callback_query.message
 
-    credits = group_data.get('credits', 0)
-    group_title = group_data.get('title', 'your group')
+    credits = group_data.credits
+    group_title = group_data.title or 'your group'
 
     credit_info = f"""🚀 *PumpReels Video Credit System – {group_title}*
 
@@ -419,7 +780,7 @@ async def show_credits_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode="Markdown"
     )
-    context.user_data['credit_info_msg_id'] = credit_info_msg.message_id
+    user_states.get(update.effective_user.id).credit_info_msg_id = credit_info_msg.message_id
     return ConversationHandler.END
 
 
@@ -439,8 +800,8 @@ async def credits(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
         return ConversationHandler.END
 
-    # 🧠 Get all groups this user manages
-    groups = firestore_client.get_groups_by_creator(user.id)
+    # 🧠 Get the first page of groups this user manages
+    page, groups, has_next = load_creator_groups_page(user.id, 0)
     if not groups:
         await message.reply_text(
             "❌ You’re not an admin of any PumpReels groups.",
@@ -449,21 +810,58 @@ async def credits(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return ConversationHandler.END
 
     # ✅ If one group, skip selection
-    if len(groups) == 1:
-        logger.info(groups)
-        context.user_data['selected_group_id'] = groups[0]['group_id']
-        return await show_credits_menu(update, context, groups[0])
+    if len(groups) == 1 and not has_next:
+        user_states.get(user.id).selected_group_id = groups[0].group_id
+        group_data = storage_client.get_group_by_id(groups[0].doc_id)
+        return await show_credits_menu(update, context, group_data or groups[0])
 
     # 🎯 If multiple groups, prompt user to pick one
-    keyboard = [
-        [InlineKeyboardButton(group["title"], callback_data=f"select_chat_{group['group_id']}")]
-        for group in groups
-    ]
     select_group_msg = await message.reply_text(
         "🪙 Which group would you like to buy credits for?",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=build_group_picker(groups, page, has_next)
     )
-    context.user_data['select_group_msg_id'] = select_group_msg.message_id
+    user_states.get(user.id).select_group_msg_id = select_group_msg.message_id
+    return SELECT_GROUP_FOR_CREDITS
+
+
+def load_creator_groups_page(user_id: int, page: int):
+    """
+    One page of the groups a user created, as (page, groups, has_next).
+
+    Only the fields the picker shows are read, pages are fetched lazily with a
+    document-id cursor, and everything fetched is cached per user until the TTL
+    runs out or the user adds the bot to another group.
+    """
+    listing = creator_groups_cache.get(user_id)
+    if listing is None:
+        listing = {"cursors": [None], "pages": {}}
+    if page >= len(listing["cursors"]):
+        # No cursor for that page (e.g. the cache expired): start from the beginning.
+        page = 0
+
+    cached = listing["pages"].get(page)
+    if cached is None:
+        groups = storage_client.get_groups_by_creator(
+            user_id, fields=GROUP_LIST_FIELDS, limit=GROUP_PAGE_SIZE + 1, start_after=listing["cursors"][page]
+        )
+        has_next = len(groups) > GROUP_PAGE_SIZE
+        groups = groups[:GROUP_PAGE_SIZE]
+        if has_next and len(listing["cursors"]) == page + 1:
+            listing["cursors"].append(groups[-1].doc_id)
+        cached = listing["pages"][page] = (groups, has_next)
+        creator_groups_cache.set(user_id, listing)
+    return (page,) + cached
+
+
+async def handle_groups_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    page, groups, has_next = load_creator_groups_page(update.effective_user.id, int(query.data.replace("groups_page_", "")))
+    try:
+        await query.edit_message_reply_markup(reply_markup=build_group_picker(groups, page, has_next))
+    except BadRequest as e:
+        if "Message is not modified" not in str(e):
+            raise e
     return SELECT_GROUP_FOR_CREDITS
 
 
@@ -471,6 +869,7 @@ async def pumpreels(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await send_open_mini_app_card(update, context)
 
 
+@traced()
 async def generate_video_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Allows user to create a video by sending `/generate_video my text here` as the caption
@@ -486,12 +885,12 @@ async def generate_video_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("Use this command in a group chat!")
         return ConversationHandler.END
 
-    group_data = firestore_client.get_group(chat_id)
+    group_data = storage_client.get_group(chat_id)
     if group_data is None:
         await update.message.reply_text("Your group is not registered. Please contact PumpReels for help.")
         return ConversationHandler.END
 
-    credits = group_data.get('credits', 0)
+    credits = group_data.credits
     if credits == 0 or credits < VIDEO_CREDITS:
         await update.message.reply_text(
             f"⚠️ Your group has {credits} credits left.\n"
@@ -524,64 +923,42 @@ async def generate_video_command(update: Update, context: ContextTypes.DEFAULT_T
 
     photo = update.message.photo[-1]
     file_id = photo.file_id
-    context.user_data["file_id"] = file_id
 
-    asyncio.create_task(process_video(update, context, prompt_text, group_data))
+    user = update.effective_user
+    render_supervisor.spawn(
+        process_video(update, context, file_id, prompt_text, group_data),
+        chat_id=chat_id,
+        doc_id=group_data.doc_id,
+        user_id=user.id,
+        user_identifier=user.username or user.first_name,
+        prompt_text=prompt_text,
+    )
 
     return ConversationHandler.END
-    # await process_video(update, context, prompt_text, group_data)
+    # await process_video(update, context, file_id, prompt_text, group_data)
 
 
 async def send_group_mini_app_card(group_id: str):
-    group_data = firestore_client.get_group(group_id)
+    group_data = await asyncio.to_thread(storage_client.get_group, int(group_id))
     if not group_data:
         return
-    doc_id = group_data.get('doc_id')
-
-    caption = (
-        f"{group_data.get('title')} has {group_data.get('credits')} credits remaining\n"
-        f"Generate your AI Video with our Mini App\\\n"
-        f"📱 [Open Mini App](https://t.me/pumpreelsbot/pumpreelsapp?startapp={doc_id})\n\n"
-        f"OR ENTER\n"
-        f"\\/generate\\_video \\[your prompt\\] and attach an image to create your AI video instantly\\\n\n"
-        f"Powered by \\@PumpReelsBot"
-    )
-
-    keyboard = [
-        [InlineKeyboardButton(text="📱Open Mini App", url=f"https://t.me/pumpreelsbot/pumpreelsapp?startapp={doc_id}")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await application.bot.send_animation(
-        chat_id=int(group_id),
-        animation="https://pumpreels-mini-app.netlify.app/rendering.gif",
-        caption=caption,
-        parse_mode="MarkdownV2",
-        reply_markup=reply_markup
-    )
+    await send_mini_app_card(application.bot, group_data)
 
 
 async def send_open_mini_app_card(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    group_data = firestore_client.get_group(chat_id)
-    doc_id = group_data.get('doc_id')
-    caption = (
-        f"{group_data.get('title')} has {group_data.get('credits')} credits remaining\n"
-        f"Generate your AI Video with our Mini App\\\n"
-        f"📱 [Open Mini App](https://t.me/pumpreelsbot/pumpreelsapp?startapp={doc_id})\n\n"
-        f"OR ENTER\n"
-        f"\\/generate\\_video \\[your prompt\\] and attach an image to create your AI video instantly\\\n\n"
-        f"Powered by \\@PumpReelsBot"
-    )
-
+    group_data = storage_client.get_group(chat_id)
+    doc_id = group_data.doc_id
+    caption = build_mini_app_caption(group_data.title, group_data.credits, doc_id)
 
     keyboard = [
-        [InlineKeyboardButton(text="📱Open Mini App", url=f"https://t.me/pumpreelsbot/pumpreelsapp?startapp={doc_id}")]
+        [InlineKeyboardButton(text="📱Open Mini App", url=MINI_APP_URL.format(doc_id=doc_id))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_animation(
-        animation="https://pumpreels-mini-app.netlify.app/rendering.gif",
+    await send_asset_animation(
+        update.message.reply_animation,
+        RENDERING_ANIMATION_URL,
         caption=caption,
         parse_mode="MarkdownV2",
         reply_markup=reply_markup
@@ -592,7 +969,7 @@ async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
 
-    select_group_msg_id = context.user_data.get("select_group_msg_id")
+    select_group_msg_id = user_states.get(update.effective_user.id).select_group_msg_id
     if select_group_msg_id:
         try:
             await query.message.delete()
@@ -600,24 +977,22 @@ async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_T
             logger.warning(f"Could not delete group selection message: {e}")
 
     data = query.data
-    logging.info(' --- TESTING --- ')
-    logging.info(f'data received: {data}')
     if not data.startswith("select_chat_"):
         return ConversationHandler.END
 
     group_id = data.replace("select_chat_", "")
-    group_data = firestore_client.get_group_by_id(group_id)
+    group_data = storage_client.get_group(int(group_id))
     if not group_data:
         await query.message.reply_text("❌ Group not found or deleted.")
         return ConversationHandler.END
 
-    context.user_data['selected_group_id'] = group_id
+    user_states.get(update.effective_user.id).selected_group_id = group_id
     return await show_credits_menu(update, context, group_data)
 
 
 async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = update.message.web_app_data.data
-    logger.info(f"Received data from web app: {data}")
+    logger.info("Received data from web app (%d bytes)", len(data))
 
     try:
         payload = json.loads(data)
@@ -638,8 +1013,21 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if update.message:
-        await update.message.reply_text("Video cancelled.")
+    """Cancels the caller's newest in-flight render in this chat."""
+    if not update.message:
+        return ConversationHandler.END
+
+    render = render_supervisor.find(user_id=update.effective_user.id, chat_id=update.effective_chat.id)
+    if render is None:
+        await update.message.reply_text("You have no video in progress here.")
+        return ConversationHandler.END
+    # Read before cancelling: the refund marks the render uncharged.
+    charged = render.charged
+    if await cancel_render(render):
+        refunded = f" {VIDEO_CREDITS} credits were returned to the group." if charged else ""
+        await update.message.reply_text(f"🛑 Video cancelled.{refunded}")
+    else:
+        await update.message.reply_text("Your video is already on its way.")
     return ConversationHandler.END
 
 
@@ -647,7 +1035,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cq = update.callback_query
     await cq.answer()
     credits_str = cq.data
-    group_id = context.user_data.get('selected_group_id')
+    group_id = user_states.get(update.effective_user.id).selected_group_id
 
     if not group_id:
         await cq.message.reply_text("❌Command timed out. Please restart the /credits flow.")
@@ -655,7 +1043,7 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Build the Radom checkout
     try:
-        checkout_url = create_checkout_session(
+        checkout_url = await radom_client.get_checkout_url(
             CREDIT_PLANS[credits_str],
             group_id,
             credits_str
@@ -674,56 +1062,6 @@ async def pay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-def create_checkout_session(product_id: str, chat_id: int, credits_str: str) -> str:
-    """
-    Returns a checkoutSessionUrl with telegram_group_id metadata.
-    """
-    payload = {
-        "lineItems":  [{"productId": product_id}],
-        "currency":   "USD",
-        "gateway": {
-                "managed": {
-                    "methods": [
-                        # MARK: CHANGE THESE TO PROD NETWORKS
-                        {"network": "Bitcoin"},
-                        {"network": "Solana"},
-                        {"network": "Ethereum"},
-                        # {"network": "Base"},
-                        # {"network": "Fiat"},
-                    ]
-                }
-            },
-        "successUrl": "https://t.me/pumpreelsbot?start=payment_success",
-        "cancelUrl": "https://t.me/pumpreelsbot?start=payment_cancelled",
-        "metadata": [
-            {
-                "key": "telegram_group_id",
-                "value": str(chat_id)
-            },
-            {
-                "key": "credits_str",
-                "value": credits_str
-            }
-        ],
-        "expiresAt": 9999999999,
-    }
-    logger.info(payload)
-    logger.info("PAYLOAD")
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"{RADOM_TEST_KEY}",
-    }
-    r = requests.post(
-        "https://api.radom.com/checkout_session",
-        json=payload, headers=headers, timeout=10
-    )
-    logger.info("Radom status %s", r.status_code)
-    logger.info("Radom body   %s", r.text)
-    r.raise_for_status()
-    return r.json()["checkoutSessionUrl"]
-
-
 credits_conversation_handler = ConversationHandler(
     entry_points=[
         CommandHandler("credits", credits),
@@ -731,17 +1069,24 @@ credits_conversation_handler = ConversationHandler(
     ],
     states={
         SELECT_GROUP_FOR_CREDITS: [
-            CallbackQueryHandler(handle_group_selection, pattern=r"^select_chat_-?\d+")
+            CallbackQueryHandler(handle_group_selection, pattern=r"^select_chat_-?\d+"),
+            CallbackQueryHandler(handle_groups_page, pattern=r"^groups_page_\d+$"),
         ]
     },
     fallbacks=[],
+    # Abandoned pickers are dropped instead of being kept per user forever (needs the job-queue extra).
+    conversation_timeout=CREDITS_CONVERSATION_TIMEOUT,
 )
 application.add_handler(credits_conversation_handler)
 
 
+# Commands named in per-handler call accounting; anything else counts as "other_command".
+BOT_COMMANDS = ("start", "pumpreels", "generate_video", "cancel", "credits")
+
 application.add_handler(CommandHandler("start", start))
 application.add_handler(CommandHandler("pumpreels", pumpreels))
 application.add_handler(CommandHandler("generate_video", generate_video_command))
+application.add_handler(CommandHandler("cancel", cancel))
 generate_video_handler = MessageHandler(
     filters.PHOTO & filters.CaptionRegex(r"^/generate_video\b"),
     generate_video_command
@@ -757,15 +1102,103 @@ application.add_handler(CallbackQueryHandler(
 application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_web_app_data))
 
 
+async def process_telegram_update(update_json: dict):
+    set_handler("telegram:" + update_kind(update_json, BOT_COMMANDS))
+    membership_cache.apply_update(update_json)
+    await handle_new_group_update(update_json)
+
+    update = Update.de_json(update_json, application.bot)
+    await application.process_update(update)
+
+
+async def cancel_telegram_render(chat_id: int, job_id: str = None, user_id: int = None):
+    """Cancels a supervised render (see cancel_render); None when there is none."""
+    render = render_supervisor.find(chat_id=chat_id, job_id=job_id, user_id=user_id)
+    if render is None:
+        return None
+    charged = render.charged
+    return {"job_id": render.job_id, "cancelled": await cancel_render(render), "charged": charged}
+
+
+async def describe_renders():
+    return {
+        "draining": draining,
+        "max_concurrent": render_supervisor.max_concurrent,
+        "renders": [render.describe() for render in render_supervisor.renders()],
+    }
+
+
+async def cancel_render_by_task_id(task_id: int) -> bool:
+    render = render_supervisor.get(task_id)
+    return render is not None and await cancel_render(render)
+
+
+# What bot_worker serves: everything that touches the bot's per-process state.
+BOT_OPERATIONS = {
+    "update": process_telegram_update,
+    "cancel_render": cancel_telegram_render,
+    "describe_renders": describe_renders,
+    "cancel_render_by_task_id": cancel_render_by_task_id,
+}
+
+
+async def on_bot_worker(operation: str, **payload):
+    """Runs one of BOT_OPERATIONS in the worker that handles Telegram updates (this one unless several run)."""
+    if bot_worker is None:
+        return await BOT_OPERATIONS[operation](**payload)
+    try:
+        return await bot_worker.call(operation, **payload)
+    except BotWorkerUnavailable as e:
+        logger.warning("%s", e)
+        raise HTTPException(status_code=503, detail="The bot is restarting, try again shortly.")
+
+
 # ------------------
 # FastAPI App with Lifespan Event Handlers
 # ------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if os.getpid() != IMPORTED_IN_PID:
+        raise RuntimeError(
+            "main was imported in process %s and forked into %s; its Firestore and Telegram clients are not "
+            "fork-safe. Start workers with `python server.py` (or uvicorn --workers), which import main in each "
+            "worker, not with a preloading server." % (IMPORTED_IN_PID, os.getpid())
+        )
     logger.info("Initializing Telegram Application...")
     await application.initialize()
+    # Starts the job queue, which expires idle conversations.
+    await application.start()
     logger.info("Telegram Application initialized.")
+    loop_lag_task = asyncio.create_task(monitor_loop_lag(watchdog=loop_watchdog))
+    background = []
+    if radom_inbox_processor:
+        background.append(asyncio.create_task(radom_inbox_processor.run()))
+    if render_handoff:
+        background.append(asyncio.create_task(resume_handed_off_renders()))
+    if worker_metrics:
+        background.append(asyncio.create_task(worker_metrics.run()))
+    if bot_worker:
+        background.append(asyncio.create_task(bot_worker.run(BOT_OPERATIONS)))
     yield
+    # uvicorn has stopped accepting requests (SIGTERM); finish or hand off renders
+    # while the bot and storage are still usable.
+    for task in background:
+        task.cancel()
+    if bot_worker:
+        await asyncio.gather(*background, return_exceptions=True)
+        bot_worker.stop()
+    if worker_metrics:
+        worker_metrics.remove()
+    await drain_renders()
+    if radom_inbox_processor:
+        await radom_inbox_processor.stop()
+    await radom_client.aclose()
+    loop_lag_task.cancel()
+    if shadow_mirror:
+        await shadow_mirror.stop()
+    # Waits for queued updates and closes the bot's connection pool after in-flight sends.
+    await application.stop()
+    await application.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -781,6 +1214,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Each webhook update or mini-app call starts its own trace and call ledger.
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    with start_trace(f"{request.method} {request.url.path}") as span, account_calls(None) as calls:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+        if calls.handler is None:
+            # The route template, so path parameters don't multiply label values.
+            route = request.scope.get("route")
+            calls.handler = route.path if route else "unmatched"
+        return response
+
+
 # MARK: GET RID OF THIS EVENTUALLY
 # logger.info(update_json)
 # logger.info('\n==========\n')
@@ -792,51 +1240,98 @@ async def telegram_webhook(request: Request):
         raise HTTPException(status_code=403, detail="Invalid secret token")
 
     update_json = await request.json()
-    await handle_new_group_update(update_json)
-
-    update = Update.de_json(update_json, application.bot)
-    await application.process_update(update)
+    if webhook_recorder:
+        webhook_recorder.record("/webhook", update_json)
+    # A failure (e.g. 503 while the bot worker restarts) makes Telegram redeliver the update.
+    await on_bot_worker("update", update_json=update_json)
     return {"ok": True}
 
 
-@app.post("/radomWebhook")
+@app.post("/radomWebhook", dependencies=[Depends(require_radom)])
 async def radom_webhook(request: Request):
+    """
+    Persists the raw event to the inbox and acks straight away; radom_inbox_processor
+    does the actual work with retries, so a slow or failing Firestore call neither
+    delays the ack nor loses the event.
+    """
     radom_data = await request.json()
-    logger.info(f"Received Radom Webhook: {radom_data}")
+    if webhook_recorder:
+        webhook_recorder.record("/radomWebhook", radom_data)
+    if radom_data.get("eventType") == PURCHASE_NOTIFICATION:
+        # Only queued by this service after a settlement, never accepted from outside.
+        raise HTTPException(status_code=400, detail="Unsupported event type")
+    event_id = event_id_for(radom_data)
+    logger.info("Received Radom webhook %s (%s)", radom_data.get("eventType"), event_id)
+
+    if radom_inbox is None:
+        # No inbox on single-node storage: apply the event now and have Radom redeliver on failure.
+        try:
+            await handle_radom_event(radom_data)
+        except Exception as e:
+            logger.warning("Radom webhook %s failed: %s", event_id, e)
+            raise HTTPException(status_code=500, detail="Event not applied")
+        return {"ok": True}
 
+    if await asyncio.to_thread(radom_inbox.put, event_id, radom_data):
+        radom_inbox_processor.notify()
+    return {"ok": True}
+
+
+async def notify_purchase(group_id: str, transaction_hash: str):
+    """
+    Queues the purchase card for a settled payment as its own inbox event, so a
+    Telegram failure is retried without settling again. The event id is derived
+    from the transaction hash, so queueing it twice sends one card.
+    """
+    if radom_inbox is None:
+        try:
+            await send_group_mini_app_card(group_id)
+        except Exception as e:
+            # Already settled; a redelivered confirmation would not send it either.
+            logger.error("Failed to notify group %s of its purchase: %s", group_id, e)
+        return
+    event = {"eventType": PURCHASE_NOTIFICATION, "groupId": group_id, "transactionHash": transaction_hash}
+    if await asyncio.to_thread(radom_inbox.put, f"purchase_notification_{transaction_hash}", event):
+        radom_inbox_processor.notify()
+
+
+async def handle_radom_event(radom_data: dict):
+    """Applies one Radom event. Raises to have the inbox retry it; every step is idempotent."""
     event_type = radom_data.get("eventType")
 
     if event_type == "managedPayment":
-        try:
-            firestore_client.create_transaction(radom_data)
+        # The session is paid; the next tap on that plan needs a fresh checkout.
+        radom_client.forget_session(radom_data.get("radomData", {}).get("checkoutSession", {}).get("checkoutSessionId"))
+        if await asyncio.to_thread(storage_client.create_transaction, radom_data):
             logger.info("✅ Transaction document created.")
-        except Exception as e:
-            logger.error(f"❌ Failed to create transaction: {e}")
+        else:
+            logger.info("⚠️ Duplicate managedPayment event ignored.")
     elif event_type == "paymentTransactionConfirmed":
-        try:
-            event_data = radom_data.get("eventData", {}).get("paymentTransactionConfirmed", {})
-            transaction_hash = event_data.get("transactionHash")
-            if not transaction_hash:
-                logger.warning("⚠️ No transactionHash found.")
-                return {"ok": False}
-
-            result = firestore_client.confirm_transaction_by_tx_hash(transaction_hash)
-
-            if isinstance(result, str) and result.startswith("-"):  # group_id is returned
-                await send_group_mini_app_card(result)
-                logger.info(f"✅ Confirmed and notified group {result}")
-            elif result == "already_confirmed":
-                logger.info(f"⚠️ Transaction {transaction_hash} was already confirmed.")
-            else:
-                logger.warning(f"❌ No transaction found for hash {transaction_hash}")
+        event_data = radom_data.get("eventData", {}).get("paymentTransactionConfirmed", {})
+        transaction_hash = event_data.get("transactionHash")
+        if not transaction_hash:
+            logger.warning("⚠️ No transactionHash found.")
+            return
 
-        except Exception as e:
-            logger.error(f"❌ Error in paymentTransactionConfirmed handler: {e}")
+        result = await asyncio.to_thread(storage_client.confirm_transaction_by_tx_hash, transaction_hash)
+
+        if isinstance(result, str) and result.startswith("-"):  # group_id is returned
+            logger.info(f"✅ Confirmed payment for group {result}")
+            await notify_purchase(result, transaction_hash)
+        elif result == "already_confirmed":
+            logger.info(f"⚠️ Transaction {transaction_hash} was already confirmed.")
+        else:
+            # The confirmation can overtake its managedPayment event; retry until it lands.
+            raise LookupError(f"No transaction found for hash {transaction_hash}")
+    elif event_type == PURCHASE_NOTIFICATION:
+        await send_group_mini_app_card(radom_data["groupId"])
+        logger.info("✅ Notified group %s of its purchase", radom_data["groupId"])
     else:
         logger.info(f"Unhandled Radom event type: {event_type}")
 
-    return {"ok": True}
 
+radom_inbox = WebhookInbox(shared_db, "radom") if shared_db else None
+radom_inbox_processor = InboxProcessor(radom_inbox, handle_radom_event) if radom_inbox else None
 
 # ENDPOINTS FOR MINI APP
 @app.post("/verifyUser")
@@ -870,8 +1365,12 @@ async def get_group(
     doc_id: str = Form(...),
     tg_data: dict = Depends(require_telegram)
 ):
-    group_data = firestore_client.get_group_by_id(doc_id)
-    return group_data
+    group_data = storage_client.get_group_by_id(doc_id)
+    if not group_data:
+        raise HTTPException(status_code=404, detail="Group not found")
+    group_chat_ids.set(doc_id, group_data.group_id)
+    await require_group_member(group_data.group_id, tg_data)
+    return group_data.to_dict()
 
 
 @app.post("/generateVideo")
@@ -883,54 +1382,78 @@ async def generate_video(
 ):
     """
     1) Receives an image + prompt text.
-    2) Calls PikaClient to start video generation.
+    2) Routes the video generation to the best available provider.
     3) Returns an immediate response with video_id, not the final video.
     """
 
-    try:
-        firestore_client.decrement_credits(doc_id, VIDEO_CREDITS)
-    except ValueError as e:
+    await require_group_member(group_chat_id(doc_id), tg_data)
+
+    if draining:
         return JSONResponse(
-            status_code=400,
-            content={"error": "insufficient_credits", "message": "Your group ran out of credits! The admin needs to buy more credits to continue the pump 🚀"}
+            status_code=503,
+            content={"error": "restarting", "message": VIDEO_SERVICE_RESTARTING}
         )
 
+    if not video_router.available():
+        return JSONResponse(
+            status_code=503,
+            content={"error": "providers_unavailable", "message": VIDEO_PROVIDERS_UNAVAILABLE}
+        )
+
+    # Validate everything before charging, so a bad request never costs credits.
+    user_prompt = prompt_text.strip()
+    if not user_prompt:
+        raise HTTPException(status_code=400, detail="No prompt_text was provided.")
+
     # Read the uploaded file into memory
     try:
         image_bytes = await image.read()
     except Exception as e:
         logger.error("Failed to read uploaded image: %s", e)
         raise HTTPException(status_code=400, detail="Could not read the image file.")
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="The image file is empty.")
 
-    # Optional: do any validation or modifications of prompt_text
-    user_prompt = prompt_text.strip()
-    if not user_prompt:
-        raise HTTPException(status_code=400, detail="No prompt_text was provided.")
+    try:
+        storage_client.decrement_credits(doc_id, VIDEO_CREDITS)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "insufficient_credits", "message": "Your group ran out of credits! The admin needs to buy more credits to continue the pump 🚀"}
+        )
 
     # Example negative prompt, resolution, etc.
     negative_prompt = "blurry, low quality, distorted, warped, deformed, color shifted"
     duration = 5
     resolution = "720p"
-    image_io = io.BytesIO(image_bytes)
-    image_io.name = "image.jpg"
+    render_request = RenderRequest(image_bytes, user_prompt, negative_prompt, duration, resolution)
 
-    # Call your PikaClient generate_video method
+    # The router fails over between providers on submission; credits were charged once above.
     try:
-        result = pika_client.generate_video(
-            image_file="image.jpg",
-            image_bytes=image_io,
-            prompt_text=user_prompt,
-            negative_prompt=negative_prompt,
-            duration=duration,
-            resolution=resolution
-        )
-    except Exception as e:
+        video_id = await video_router.submit(render_request)
+    except AllProvidersFailed as e:
         logger.error("Error calling generate_video: %s", e)
+        try:
+            storage_client.add_credits(doc_id, VIDEO_CREDITS)
+        except Exception as refund_error:
+            logger.error("Failed to refund credits to group %s: %s", doc_id, refund_error)
         raise HTTPException(status_code=500, detail="Failed to create the video.")
 
-    video_id = result.get("video_id")
-    if not video_id:
-        raise HTTPException(status_code=500, detail="No video_id returned from PikaClient.")
+    # Status polls and cancels refund only jobs recorded here, and only to the group that paid.
+    try:
+        storage_client.record_render_charge(doc_id, video_id)
+        render_charges.set(video_id, doc_id)
+    except Exception as e:
+        logger.error("Failed to record the charge for video %s: %s", video_id, e)
+        try:
+            await video_router.cancel(video_id)
+        except Exception as cancel_error:
+            logger.warning("Failed to cancel %s upstream: %s", video_id, cancel_error)
+        refund_render(doc_id, video_id)
+        raise HTTPException(status_code=500, detail="Failed to create the video.")
+
+    if shadow_mirror:
+        shadow_mirror.maybe_mirror(render_request)
 
     # Return an immediate JSON response with the new video_id
     return {
@@ -947,11 +1470,16 @@ async def get_video_status(
 ):
     """
     1) Takes a 'video_id' as a query param.
-    2) Checks with PikaClient for the current status, progress, or final URL.
+    2) Checks with the provider that owns it for the current status, progress, or final URL.
     3) Returns the info as JSON (including the final video URL if finished).
     """
+    await require_group_member(group_chat_id(doc_id), tg_data)
+    # Providers report ids they do not know as queued, so ownership is checked before asking them.
+    if not render_charged_to(video_id, doc_id):
+        raise HTTPException(status_code=404, detail="Video data not found for that video_id.")
+
     try:
-        video_data = pika_client.check_video_status(video_id=video_id)
+        video_data = await video_router.get_status(video_id)
     except Exception as e:
         logger.error("Error checking video status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to check video status.")
@@ -964,11 +1492,15 @@ async def get_video_status(
     url = video_data.get('url', '')
 
     if status in ["failed", "canceled"]:
+        # The client polls again after a failure; refund_render_once keeps that from refunding twice.
         try:
-            firestore_client.add_credits(doc_id, VIDEO_CREDITS)
-            logger.info("Refunded %s credits to group %s for failed video %s", VIDEO_CREDITS, doc_id, video_id)
+            if storage_client.refund_render_once(doc_id, video_id, VIDEO_CREDITS):
+                logger.info("Refunded %s credits to group %s for failed video %s", VIDEO_CREDITS, doc_id, video_id)
         except Exception as e:
             logger.error("Failed to refund credits to group %s: %s", doc_id, e)
+    elif status == FINISHED and storage_client.render_refunded(video_id):
+        # Cancelled and refunded, but the provider could not stop it; it is not delivered.
+        status, url = CANCELED, ''
 
     return {
         "video_id": video_id,
@@ -978,6 +1510,47 @@ async def get_video_status(
     }
 
 
+@app.post("/cancelVideo")
+async def cancel_video(
+    doc_id: str = Form(...),
+    video_id: str = Form(None),
+    tg_data: dict = Depends(require_telegram)
+):
+    """
+    Cancels a render and refunds its credits. Without a video_id, cancels the caller's
+    newest render started with /generate_video in that group.
+    """
+    chat_id = group_chat_id(doc_id)
+    await require_group_member(chat_id, tg_data)
+
+    user_id = tg_data.get("user", {}).get("id")
+    cancelled = await on_bot_worker(
+        "cancel_render", chat_id=chat_id, job_id=video_id, user_id=None if video_id else user_id
+    )
+    if cancelled:
+        if not cancelled["cancelled"]:
+            raise HTTPException(status_code=409, detail="The video is already being delivered.")
+        return {"video_id": cancelled["job_id"], "status": CANCELED, "refunded": cancelled["charged"]}
+    if not video_id or not render_charged_to(video_id, doc_id):
+        raise HTTPException(status_code=404, detail="No video in progress.")
+
+    # Started from the mini app: the client does the polling, so only the provider job is left.
+    try:
+        video_data = await video_router.get_status(video_id)
+    except Exception as e:
+        logger.error("Error checking video status: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to check video status.")
+    if video_data.get('status') == FINISHED:
+        raise HTTPException(status_code=409, detail="The video has already finished.")
+
+    try:
+        await video_router.cancel(video_id)
+    except Exception as e:
+        logger.warning("Failed to cancel %s upstream: %s", video_id, e)
+    refunded = storage_client.refund_render_once(doc_id, video_id, VIDEO_CREDITS)
+    return {"video_id": video_id, "status": CANCELED, "refunded": refunded}
+
+
 @app.post("/sendVideo")
 async def send_video(
     group_id: int = Form(...),
@@ -986,6 +1559,8 @@ async def send_video(
     prompt_text: str = Form(...),
     tg_data: dict = Depends(require_telegram)
 ):
+    await require_group_member(group_id, tg_data)
+
     try:
         await application.bot.send_video(
             chat_id=group_id,
@@ -997,6 +1572,26 @@ async def send_video(
         return {"status": "error", "detail": str(e)}
 
 
+@app.get("/admin/renders", dependencies=[Depends(require_admin)])
+async def list_renders():
+    """In-flight render tasks on this replica, oldest first."""
+    return await on_bot_worker("describe_renders")
+
+
+@app.post("/admin/renders/{task_id}/cancel", dependencies=[Depends(require_admin)])
+async def cancel_render_task(task_id: int):
+    if not await on_bot_worker("cancel_render_by_task_id", task_id=task_id):
+        raise HTTPException(status_code=404, detail="No such render in flight")
+    logger.warning("Render task %s cancelled by an admin", task_id)
+    return {"task_id": task_id, "cancelled": True}
+
+
+@app.get("/metrics")
+async def metrics():
+    content = worker_metrics.render() if worker_metrics else REGISTRY.render()
+    return Response(content=content, media_type=CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello, FastAPI Telegram bot!"}
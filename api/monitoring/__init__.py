@@ -0,0 +1,3 @@
+from .call_accounting import account_calls, record_call, set_handler
+from .metrics import REGISTRY, Counter, Gauge, Histogram, instrumented, track_dependency
+from .tracing import configure_tracing_from_env, start_span, start_trace, current_span, traced
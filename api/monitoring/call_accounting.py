@@ -0,0 +1,112 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from monitoring.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+HANDLER_CALLS = Counter(
+    "pumpreels_handler_calls_total",
+    "Billed or rate-limited calls by the handler that made them: Firestore reads, writes and "
+    "transactions, and Bot API calls by method. Calls made outside any handler count as \"background\".",
+    ("handler", "dependency", "operation"),
+)
+HANDLER_CALLS_PER_REQUEST = Histogram(
+    "pumpreels_handler_calls_per_request",
+    "Calls one handler invocation made to each dependency.",
+    ("handler", "dependency"),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64),
+)
+
+_current_ledger = ContextVar("pumpreels_call_ledger", default=None)
+
+
+class CallLedger:
+    """
+    Calls made on behalf of one handler invocation, by (dependency, operation).
+
+    The ledger object is shared with whatever the handler awaits or hands to
+    `asyncio.to_thread`, since both copy the context, so calls made there are
+    counted against the handler too.
+    """
+    __slots__ = ("handler", "counts")
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.counts = {}
+
+    def add(self, dependency: str, operation: str, n: int = 1):
+        key = (dependency, operation)
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def totals(self) -> dict:
+        totals = {}
+        for (dependency, _), n in self.counts.items():
+            totals[dependency] = totals.get(dependency, 0) + n
+        return totals
+
+    def as_dict(self) -> dict:
+        """{"firestore": {"read": 2, "write": 1}, "telegram": {"sendMessage": 1}}"""
+        calls = {}
+        for (dependency, operation), n in sorted(self.counts.items()):
+            calls.setdefault(dependency, {})[operation] = n
+        return calls
+
+    def publish(self):
+        self.handler = self.handler or "unknown"
+        for (dependency, operation), n in self.counts.items():
+            HANDLER_CALLS.labels(self.handler, dependency, operation).inc(n)
+        for dependency, total in self.totals().items():
+            HANDLER_CALLS_PER_REQUEST.labels(self.handler, dependency).observe(total)
+        if self.counts:
+            calls = self.as_dict()
+            logger.info(
+                "%s made %s", self.handler,
+                "; ".join(
+                    f"{dependency} {sum(ops.values())} ({', '.join(f'{op} {n}' for op, n in ops.items())})"
+                    for dependency, ops in calls.items()
+                ),
+                extra={"handler": self.handler, "calls": calls},
+            )
+
+
+def record_call(dependency: str, operation: str, n: int = 1):
+    """Counts `n` calls against the current handler, or against "background" outside of one."""
+    if n <= 0:
+        return
+    ledger = _current_ledger.get()
+    if ledger is None:
+        HANDLER_CALLS.labels("background", dependency, operation).inc(n)
+    else:
+        ledger.add(dependency, operation, n)
+
+
+def set_handler(handler: str):
+    """Renames the current ledger once the handler is known, e.g. the command inside a webhook update."""
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.handler = handler
+
+
+def current_ledger() -> CallLedger:
+    return _current_ledger.get()
+
+
+@contextmanager
+def account_calls(handler: str):
+    """
+    Counts calls made inside the block against `handler`; on exit they are
+    exported as metrics and logged as one line. Nested blocks start their own ledger.
+
+    Parameters:
+      handler (str): Low-cardinality handler name, e.g. "/getGroup" or "render", or None
+        to name it (through the yielded ledger or `set_handler`) before the block ends.
+    """
+    ledger = CallLedger(handler)
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+        ledger.publish()
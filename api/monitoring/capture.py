@@ -0,0 +1,139 @@
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keys whose values identify a person; replaced by a stable pseudonym when redacting.
+_PII_STRING_KEYS = {"first_name", "last_name", "username", "full_name", "phone_number", "address", "email"}
+_PII_ID_PARENTS = {"from", "user", "new_chat_participant", "new_chat_member", "left_chat_member", "sender_chat"}
+
+
+class PayloadRedactor:
+    """
+    Pseudonymizes user identity fields in webhook payloads. The same input always maps
+    to the same pseudonym within one process, so replayed traffic keeps its shape
+    (same user posting twice still looks like one user) without carrying real PII.
+    Chat ids are kept because replay needs them to address registered groups.
+    """
+
+    def __init__(self, key: bytes = None):
+        self.key = key or secrets.token_bytes(32)
+
+    def _digest(self, value) -> str:
+        return hmac.new(self.key, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def _pseudo_id(self, value: int) -> int:
+        return 10 ** 9 + int(self._digest(value), 16) % (10 ** 9)
+
+    def redact(self, value, parent_key: str = None):
+        if isinstance(value, dict):
+            if value.get("is_bot") is True:
+                # Bot accounts aren't personal data, and replay needs their usernames intact.
+                return value
+            redacted = {}
+            for k, v in value.items():
+                if k in _PII_STRING_KEYS and isinstance(v, str):
+                    redacted[k] = f"{k}_{self._digest(v)}"
+                elif k == "id" and parent_key in _PII_ID_PARENTS and isinstance(v, int) and v > 0:
+                    redacted[k] = self._pseudo_id(v)
+                else:
+                    redacted[k] = self.redact(v, k)
+            return redacted
+        if isinstance(value, list):
+            return [self.redact(v, parent_key) for v in value]
+        return value
+
+
+class WebhookRecorder:
+    """
+    Appends incoming webhook payloads to a compact JSON-lines file (gzip if the
+    path ends in .gz). Writes happen on a background thread; the request path
+    only enqueues.
+
+    Each line is {"t": <unix time>, "path": <endpoint>, "body": <payload>}.
+    """
+
+    def __init__(self, path: str, redact: bool = True):
+        self.path = path
+        self.redactor = PayloadRedactor() if redact else None
+        self._queue = queue.Queue(maxsize=50000)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="webhook-recorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, path: str, body: dict):
+        try:
+            self._queue.put_nowait((time.time(), path, body))
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, "at", encoding="utf-8")
+        return open(self.path, "a", encoding="utf-8")
+
+    def _run(self):
+        with self._open() as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                lines = []
+                while item is not None:
+                    t, path, body = item
+                    if self.redactor is not None:
+                        body = self.redactor.redact(body)
+                    lines.append(json.dumps({"t": round(t, 6), "path": path, "body": body}, separators=(",", ":"), ensure_ascii=False))
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                if item is None:
+                    break
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def recorder_from_env():
+    """
+    Returns a WebhookRecorder when CAPTURE_FILE is set, otherwise None.
+    CAPTURE_REDACT=0 keeps payloads verbatim (only for traffic you are allowed to store).
+    """
+    path = os.environ.get("CAPTURE_FILE")
+    if not path:
+        return None
+    redact = os.environ.get("CAPTURE_REDACT", "1") != "0"
+    logger.info("Capturing webhook traffic to %s (redacted=%s)", path, redact)
+    return WebhookRecorder(path, redact=redact)
+
+
+def read_capture(path: str):
+    """Yields captured records in order, stopping cleanly at a truncated tail."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except EOFError:
+            return
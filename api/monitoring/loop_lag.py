@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from monitoring.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    "pumpreels_event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task, sampled continuously.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_LAG_QUANTILE = Gauge(
+    "pumpreels_event_loop_lag_quantile_seconds",
+    "Event loop lag percentiles over the last minute of samples.",
+    ("quantile",),
+)
+EVENT_LOOP_STALLS = Counter(
+    "pumpreels_event_loop_stalls_total",
+    "Times the loop was blocked past the watchdog threshold, by the code that was running.",
+    ("site",),
+)
+EVENT_LOOP_STALL_SECONDS = Counter(
+    "pumpreels_event_loop_stall_seconds_total",
+    "Time the loop spent blocked past the watchdog threshold, by the code that was running.",
+    ("site",),
+)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_DIRS = (os.path.join(_APP_ROOT, "monitoring"),)
+
+
+def _blocking_site(stack) -> str:
+    """
+    Names a captured stack by its innermost application frame and the library
+    call it was stuck in, e.g. "storage/firestore_client.py:88 get_group -> ssl.py:read".
+    """
+    innermost = stack[-1]
+    site = f"{os.path.basename(innermost.filename)}:{innermost.name}"
+    for frame in reversed(stack):
+        if frame.filename.startswith(_APP_ROOT) and not frame.filename.startswith(_SKIP_DIRS):
+            app_frame = f"{os.path.relpath(frame.filename, _APP_ROOT)}:{frame.lineno} {frame.name}"
+            return app_frame if frame is innermost else f"{app_frame} -> {site}"
+    return site
+
+
+class LoopWatchdog:
+    """
+    Catches whatever is blocking the event loop while it is still running.
+
+    The loop side (`monitor_loop_lag`) only stamps a heartbeat each tick. A
+    daemon thread checks the heartbeat every threshold/2 seconds; when it is
+    overdue by more than `threshold` it grabs the loop thread's stack once for
+    that stall, and the stall's full length is charged to that site when the
+    loop comes back. Between stalls the thread does nothing but compare two floats.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.1, max_sites: int = 20,
+                 report_every: float = 60.0, window: int = 600):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_sites = max_sites
+        self.report_every = report_every
+        self.samples = deque(maxlen=window)
+        self.sites = {}
+        self._heartbeat = time.perf_counter()
+        self._pending = None
+        self._captured_for = None
+        self._logged_at = {}
+        self._stalls_reported = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._loop_thread_id = None
+        for q in (0.5, 0.9, 0.99, 1.0):
+            EVENT_LOOP_LAG_QUANTILE.labels(str(q)).set_function(lambda q=q: self.quantile(q))
+
+    def start(self):
+        """Starts the watchdog thread for the loop running in the calling thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def beat(self, lag: float):
+        """Called from the loop after each tick with how late that tick was."""
+        self._heartbeat = time.perf_counter()
+        self.samples.append(lag)
+        if self._pending is None:
+            return
+        with self._lock:
+            site, self._pending = self._pending, None
+            count, total, worst = self.sites.get(site, (0, 0.0, 0.0))
+            self.sites[site] = (count + 1, total + lag, max(worst, lag))
+        EVENT_LOOP_STALLS.labels(site).inc()
+        EVENT_LOOP_STALL_SECONDS.labels(site).inc(lag)
+
+    def quantile(self, q: float) -> float:
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def worst(self, n: int = 5) -> list:
+        """The sites that blocked the loop longest in total: (site, stalls, total seconds, worst seconds)."""
+        with self._lock:
+            sites = list(self.sites.items())
+        ranked = sorted(sites, key=lambda item: item[1][1], reverse=True)
+        return [(site,) + stats for site, stats in ranked[:n]]
+
+    def _watch(self):
+        next_report = time.monotonic() + self.report_every
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.perf_counter() - heartbeat - self.interval
+            if overdue > self.threshold and self._captured_for != heartbeat:
+                self._captured_for = heartbeat
+                self._capture(overdue)
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.report_every
+                self._report()
+
+    def _capture(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=40)
+        del frame
+        site = _blocking_site(stack)
+        if site not in self.sites and len(self.sites) >= self.max_sites:
+            site = "other"
+        with self._lock:
+            self._pending = site
+        now = time.monotonic()
+        # Full stacks once per site per report interval; the metrics carry the counts.
+        if now - self._logged_at.get(site, float("-inf")) >= self.report_every:
+            self._logged_at[site] = now
+            logger.warning("Event loop blocked for %.0f ms so far in %s\n%s",
+                           overdue * 1000, site, "".join(traceback.format_list(stack)))
+
+    def _report(self):
+        with self._lock:
+            stalls = sum(count for count, _, _ in self.sites.values())
+        # Only report when something new blocked the loop since the last report.
+        if stalls == self._stalls_reported:
+            return
+        self._stalls_reported = stalls
+        worst = self.worst()
+        logger.warning(
+            "Event loop lag p50 %.1f ms, p99 %.1f ms, max %.1f ms; worst blocking sites: %s",
+            self.quantile(0.5) * 1000, self.quantile(0.99) * 1000, self.quantile(1.0) * 1000,
+            "; ".join(f"{site} ({count}x, {total:.2f}s total, {max_s * 1000:.0f} ms max)"
+                      for site, count, total, max_s in worst),
+        )
+
+
+def watchdog_from_env():
+    """LOOP_LAG_THRESHOLD_MS (default 100) arms the watchdog; 0 turns it off."""
+    threshold_ms = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", 100))
+    if threshold_ms <= 0:
+        return None
+    return LoopWatchdog(threshold=threshold_ms / 1000)
+
+
+async def monitor_loop_lag(interval: float = 0.1, watchdog: LoopWatchdog = None):
+    """
+    Sleeps for `interval` in a loop and records how much later than requested
+    it was resumed. Anything blocking the loop shows up here directly.
+    """
+    lag = EVENT_LOOP_LAG.labels()
+    if watchdog:
+        watchdog.interval = interval
+        watchdog.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            late = max(0.0, time.perf_counter() - start - interval)
+            lag.observe(late)
+            if watchdog:
+                watchdog.beat(late)
+    finally:
+        if watchdog:
+            watchdog.stop()
@@ -0,0 +1,351 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+from monitoring.tracing import start_child_span
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """
+    Base class for a labelled metric family.
+
+    Children are created once per distinct label tuple and cached, so callers on the
+    hot path should resolve `labels(...)` once and keep the child around.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def _default(self):
+        # Unlabelled metrics proxy straight to their single child.
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.collect())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def collect(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """Evaluate `function()` at scrape time instead of holding a stored value."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            return float(self.function())
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def collect(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def collect(self):
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float("inf"),), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Returns every registered metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ------------------
+# Dependency instrumentation
+# ------------------
+DEPENDENCY_LATENCY = Histogram(
+    "pumpreels_dependency_latency_seconds",
+    "Latency of calls to external dependencies.",
+    ("dependency", "method", "outcome"),
+)
+DEPENDENCY_ERRORS = Counter(
+    "pumpreels_dependency_errors_total",
+    "Failed calls to external dependencies.",
+    ("dependency", "method"),
+)
+
+RENDERS_IN_FLIGHT = Gauge(
+    "pumpreels_renders_in_flight",
+    "Renders that have been charged and not yet delivered or failed.",
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    "pumpreels_render_queue_depth",
+    "Renders submitted to a provider that have not started rendering yet.",
+)
+POLL_LOOPS_ACTIVE = Gauge(
+    "pumpreels_poll_loops_active",
+    "Provider status poll loops currently running.",
+)
+RENDERS_DRAINED = Counter(
+    "pumpreels_renders_drained_total",
+    "Renders caught by a shutdown drain, by outcome (finished, handed_off, refunded, cancelled, resumed).",
+    ("outcome",),
+)
+
+
+class _DependencyTimer:
+    __slots__ = ("_ok", "_error", "_errors", "_start", "_failed", "_span_name", "_span")
+
+    def __init__(self, ok, error, errors, span_name):
+        self._ok = ok
+        self._error = error
+        self._errors = errors
+        self._start = 0.0
+        self._failed = False
+        self._span_name = span_name
+        self._span = None
+
+    def __enter__(self):
+        # Only adds a span when a trace is already active, e.g. inside a render.
+        self._span = start_child_span(self._span_name).__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        if self._failed and exc is None:
+            self._span.record_error("failed")
+        self._span.__exit__(exc_type, exc, tb)
+        if exc_type is None and not self._failed:
+            self._ok.observe(elapsed)
+        else:
+            self._error.observe(elapsed)
+            self._errors.inc()
+        return False
+
+    def fail(self):
+        """Mark a call that returned normally (e.g. an HTTP error status) as failed."""
+        self._failed = True
+
+    def set_attribute(self, key: str, value):
+        self._span.set_attribute(key, value)
+
+
+class _DependencyLabels:
+    __slots__ = ("ok", "error", "errors", "span_name")
+
+    def __init__(self, dependency: str, method: str):
+        self.span_name = f"{dependency}.{method}"
+        self.ok = DEPENDENCY_LATENCY.labels(dependency, method, "ok")
+        self.error = DEPENDENCY_LATENCY.labels(dependency, method, "error")
+        self.errors = DEPENDENCY_ERRORS.labels(dependency, method)
+
+    def timer(self):
+        return _DependencyTimer(self.ok, self.error, self.errors, self.span_name)
+
+
+_dependency_labels = {}
+
+
+def _labels_for(dependency: str, method: str) -> _DependencyLabels:
+    key = (dependency, method)
+    labels = _dependency_labels.get(key)
+    if labels is None:
+        labels = _dependency_labels.setdefault(key, _DependencyLabels(dependency, method))
+    return labels
+
+
+def track_dependency(dependency: str, method: str):
+    """
+    Context manager that records latency and errors for one call to an external dependency.
+
+    Parameters:
+      dependency (str): Low-cardinality dependency name, e.g. "pika" or "firestore".
+      method (str): Low-cardinality operation name, e.g. "submit" or "get_group".
+    """
+    return _labels_for(dependency, method).timer()
+
+
+def instrumented(dependency: str, method: str = None):
+    """
+    Decorator version of `track_dependency` for sync and async callables.
+    Labels are resolved once at decoration time so each call only pays for a timer.
+    """
+    def decorator(func):
+        labels = _labels_for(dependency, method or func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with labels.timer():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with labels.timer():
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
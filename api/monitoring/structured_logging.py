@@ -0,0 +1,202 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+from monitoring.metrics import Counter
+
+LOG_RECORDS_DROPPED = Counter(
+    "pumpreels_log_records_dropped_total",
+    "Log records not written, by reason (sampled, rate_limited, queue_full).",
+    ("reason",),
+)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Environment variables whose values must never reach the logs.
+_SECRET_ENV_VARS = (
+    "TELEGRAM_BOT_TOKEN", "TELEGRAM_SECRET_TOKEN", "PIKA_API_KEY", "RUNWAYML_API_KEY",
+    "RADOM_TEST_KEY", "RADOM_TEST_WEBHOOK_KEY", "ADMIN_API_TOKEN",
+)
+_SECRET_PATTERNS = (
+    # Telegram bot tokens, e.g. inside Bot API URLs
+    (re.compile(r"\b\d{6,12}:[A-Za-z0-9_-]{30,}\b"), "[secret]"),
+    (re.compile(r"(?i)\b(bearer|basic)\s+[A-Za-z0-9._~+/=-]{8,}"), r"\1 [secret]"),
+    (re.compile(r"(?i)(api[_-]?key|authorization|secret|token)([\"']?\s*[:=]\s*[\"']?)[^\s\"',}]+"), r"\1\2[secret]"),
+)
+_PII_PATTERNS = (
+    re.compile(r"(?i)([\"'](?:first_name|last_name|full_name|username|phone_number|email|sender_address|address)[\"']\s*:\s*)"
+               r"(?:[\"'][^\"']*[\"']|-?\d+)"),
+    re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"),
+)
+
+
+class Redactor:
+    """Masks secrets (known env values and common token shapes) and obvious PII in rendered messages."""
+
+    def __init__(self):
+        self.secrets = sorted(
+            (v for v in (os.environ.get(name) for name in _SECRET_ENV_VARS) if v and len(v) >= 6),
+            key=len, reverse=True,
+        )
+
+    def __call__(self, text: str) -> str:
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, "[secret]")
+        for pattern, replacement in _SECRET_PATTERNS:
+            text = pattern.sub(replacement, text)
+        text = _PII_PATTERNS[0].sub(r'\1"[redacted]"', text)
+        text = _PII_PATTERNS[1].sub("[email]", text)
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps logging cost flat under load. Runs in the calling thread before a record
+    is queued, so dropped records cost almost nothing.
+
+    - `extra={"sample_rate": 0.05}` keeps that fraction of a record type.
+    - Below WARNING, each message template is limited to `burst` records per
+      `interval` seconds; the next record let through reports how many were
+      suppressed. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, burst: int = 50, interval: float = 10.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            LOG_RECORDS_DROPPED.labels("sampled").inc()
+            return False
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+        LOG_RECORDS_DROPPED.labels("rate_limited").inc()
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; runs on the listener thread."""
+
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample_rate"}
+
+    def __init__(self, redactor: Redactor):
+        super().__init__()
+        self.redact = redactor
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": self.redact(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = self.redact(record.exc_text)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RedactingTextFormatter(logging.Formatter):
+    def __init__(self, redactor: Redactor):
+        super().__init__(TEXT_FORMAT)
+        self.redact = redactor
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" (+{record.suppressed} similar suppressed)"
+        return self.redact(text)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the writer falls behind, records are dropped and counted."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+
+_listener = None
+
+
+def configure_logging():
+    """
+    Routes all logging through a bounded queue to a background writer thread.
+
+    LOG_FORMAT=json (default) or text, LOG_LEVEL (default INFO), LOG_RATE_LIMIT
+    records per message template per 10 s (default 50).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    redactor = Redactor()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMAT", "json") == "text":
+        stream_handler.setFormatter(RedactingTextFormatter(redactor))
+    else:
+        stream_handler.setFormatter(JsonFormatter(redactor))
+
+    queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=10000))
+    queue_handler.addFilter(SamplingFilter(burst=int(os.environ.get("LOG_RATE_LIMIT", 50))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    # httpx logs every request line at INFO, Bot API URLs (and the token in them) included.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # uvicorn installs its own synchronous stream handlers; send its records through the queue too.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flushes queued records; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
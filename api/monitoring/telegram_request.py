@@ -0,0 +1,28 @@
+from telegram.request import HTTPXRequest
+
+from monitoring.call_accounting import record_call
+from monitoring.metrics import track_dependency
+
+
+def _bot_method(url: str) -> str:
+    # File downloads go to /file/bot<token>/<path>; everything else ends in the API method.
+    if "/file/bot" in url:
+        return "download_file"
+    return url.rsplit("/", 1)[-1]
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest that records latency and errors for every Bot API call,
+    labelled by API method (sendVideo, getFile, ...), and counts it against the
+    handler that made it.
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        bot_method = _bot_method(url)
+        record_call("telegram", bot_method)
+        with track_dependency("telegram", bot_method) as timer:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            if code >= 400:
+                timer.fail()
+            return code, payload
@@ -0,0 +1,291 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("pumpreels_current_span", default=None)
+
+
+class Span:
+    """
+    A single timed operation within a trace. Spans are created through `start_span`
+    and exported when they end; they carry no reference to their children.
+    """
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = str(error) or type(error).__name__
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+    # Spans are used as context managers so the current-span var is always restored.
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.error is None:
+            self.record_error(exc)
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        _tracer.export(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    def export(self, spans: list):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a local JSON-lines file, one span per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: list):
+        self._file.write("".join(json.dumps(s, separators=(",", ":"), default=str) + "\n" for s in spans))
+        self._file.flush()
+
+    def shutdown(self):
+        self._file.close()
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """
+    Posts spans to an OTLP/HTTP JSON endpoint (e.g. a local collector on :4318/v1/traces).
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "pumpreels-bot"):
+        import requests
+
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.session = requests.Session()
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def export(self, spans: list):
+        otlp_spans = []
+        for s in spans:
+            otlp_span = {
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "name": s["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(s["start_time_unix_nano"]),
+                "endTimeUnixNano": str(s["end_time_unix_nano"]),
+                "attributes": [self._attribute(k, v) for k, v in s["attributes"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+            }
+            if s["parent_span_id"]:
+                otlp_span["parentSpanId"] = s["parent_span_id"]
+            otlp_spans.append(otlp_span)
+
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "pumpreels"}, "spans": otlp_spans}],
+            }]
+        }
+        self.session.post(self.endpoint, json=body, timeout=5).raise_for_status()
+
+    def shutdown(self):
+        self.session.close()
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to a background thread for export,
+    so the event loop never blocks on file or network I/O.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.exporter = None
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self.dropped = 0
+
+    def configure(self, exporter: SpanExporter):
+        self.exporter = exporter
+        self.enabled = True
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < 512:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.error("Failed to export %s spans: %s", len(batch), e)
+
+    def shutdown(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+            self.exporter.shutdown()
+        self.enabled = False
+
+
+_tracer = Tracer()
+
+
+def configure_tracing_from_env():
+    """
+    Enables tracing based on TRACE_EXPORTER ("file", "otlp" or unset for disabled).
+    TRACE_FILE and TRACE_OTLP_ENDPOINT choose the destination.
+    """
+    exporter_name = os.environ.get("TRACE_EXPORTER", "").lower()
+    if exporter_name == "file":
+        path = os.environ.get("TRACE_FILE", "/tmp/pumpreels-traces.jsonl")
+        _tracer.configure(FileSpanExporter(path))
+        logger.info("Tracing enabled, writing spans to %s", path)
+    elif exporter_name == "otlp":
+        endpoint = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        _tracer.configure(OTLPHttpSpanExporter(endpoint))
+        logger.info("Tracing enabled, exporting spans to %s", endpoint)
+
+
+def tracing_enabled() -> bool:
+    return _tracer.enabled
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name: str, **attributes):
+    """
+    Starts a span as a child of the current span, or a new trace if there is none.
+    Returns a no-op span when tracing is disabled.
+    """
+    if not _tracer.enabled:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if parent is None:
+        return Span(name, secrets.token_hex(16), None, attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def start_trace(name: str, **attributes):
+    """Starts a span that is always the root of a new trace."""
+    if not _tracer.enabled:
+        return NOOP_SPAN
+    return Span(name, secrets.token_hex(16), None, attributes)
+
+
+def start_child_span(name: str, **attributes):
+    """
+    Starts a span only if a trace is already active. Used by dependency
+    instrumentation so background calls outside a request don't open new traces.
+    """
+    if not _tracer.enabled:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def traced(name: str = None):
+    """Decorator that runs an async function inside a span named after it."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return await func(*args, **kwargs)
+            with start_span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+
+from monitoring.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def _with_worker(sample: str, worker: str) -> str:
+    """Adds worker="<worker>" to one exposition sample line."""
+    space = sample.find(" ")
+    brace = sample.find("{")
+    if brace == -1 or brace > space:
+        return f'{sample[:space]}{{worker="{worker}"}}{sample[space:]}'
+    return f'{sample[:brace + 1]}worker="{worker}",{sample[brace + 1:]}'
+
+
+def merge_expositions(expositions: dict) -> str:
+    """
+    Merges Prometheus text expositions (worker -> text) into one, labelling every
+    sample with its worker and keeping each family's samples together under a
+    single HELP/TYPE header.
+    """
+    families = {}
+    for worker, text in expositions.items():
+        samples = None
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line.split(None, 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    headers, samples = families.setdefault(parts[2], ({}, []))
+                    headers.setdefault(parts[1], line)
+                continue
+            if samples is not None:
+                samples.append(_with_worker(line, worker))
+    lines = []
+    for headers, samples in families.values():
+        lines.extend(headers[kind] for kind in ("HELP", "TYPE") if kind in headers)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class WorkerMetrics:
+    """
+    /metrics for every worker process on the host, not just the one a scrape lands on.
+
+    Each worker keeps its own registry, so it writes that registry's exposition to
+    `<directory>/<pid>.prom` every `interval` seconds (and whenever it serves a
+    scrape). `render()` merges the files of all workers with a `worker` label.
+    Files not refreshed for three intervals belong to workers that died and are removed.
+    """
+
+    def __init__(self, directory: str, interval: float = 5.0, registry=REGISTRY):
+        self.directory = directory
+        self.interval = interval
+        self.registry = registry
+        self.worker = str(os.getpid())
+        self.path = os.path.join(directory, f"{self.worker}.prom")
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, text: str = None):
+        # Written aside and renamed so other workers never read half a file.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.registry.render() if text is None else text)
+        os.replace(tmp_path, self.path)
+
+    async def run(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning("Could not write worker metrics to %s: %s", self.path, e)
+            await asyncio.sleep(self.interval)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def render(self) -> str:
+        own = self.registry.render()
+        self.write(own)
+        expositions = {self.worker: own}
+        stale_before = time.time() - 3 * self.interval
+        for name in sorted(os.listdir(self.directory)):
+            worker, ext = os.path.splitext(name)
+            if ext != ".prom" or worker == self.worker:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < stale_before:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    expositions[worker] = f.read()
+            except FileNotFoundError:
+                continue
+        return merge_expositions(expositions)
+
+
+def worker_metrics_from_env():
+    """
+    METRICS_DIR (e.g. /dev/shm/pumpreels-metrics, set by server.py when it runs
+    several workers) makes /metrics report every worker on the host.
+    """
+    directory = os.environ.get("METRICS_DIR")
+    if not directory:
+        return None
+    return WorkerMetrics(directory, interval=float(os.environ.get("METRICS_WRITE_SECONDS", 5)))
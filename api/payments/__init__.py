@@ -0,0 +1 @@
+from .radom_client import RadomClient
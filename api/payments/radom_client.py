@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+from monitoring.metrics import Counter, instrumented
+from storage.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_CACHE = Counter(
+    "pumpreels_checkout_session_cache_total",
+    "Checkout session lookups served from cache (hit) or by creating a session (miss).",
+    ("result",),
+)
+
+
+class RadomClient:
+    """
+    Async Radom API client on a pooled keep-alive connection.
+
+    Checkout sessions are cached per (group, product) until shortly before they
+    expire, so repeated taps on the same plan button return the same URL instead
+    of creating a new session each time. Concurrent taps share one request.
+
+    `sessions` ("chat_id:product_id" -> (session id, URL)) and `session_keys`
+    (session id -> "chat_id:product_id") default to caches private to this
+    process. Pass views of the shared cache so a session paid through one worker
+    is dropped for all of them.
+    """
+
+    def __init__(self, sessions=None, session_keys=None):
+        self.api_key = os.environ.get('RADOM_TEST_KEY')
+        self.base_url = os.environ.get('RADOM_API_URL', 'https://api.radom.com')
+        self.session_ttl = int(os.environ.get('RADOM_CHECKOUT_TTL_SECONDS', 3600))
+        # Stop handing out a URL this long before Radom expires it, so it is still payable when opened.
+        self.reuse_margin = 300
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        )
+        self.sessions = sessions if sessions is not None else TTLCache(self.session_ttl)
+        self.session_keys = session_keys if session_keys is not None else TTLCache(self.session_ttl)
+        self._inflight = {}
+
+    async def get_checkout_url(self, product_id: str, chat_id: int, credits_str: str) -> str:
+        """Returns an unexpired checkout URL for this group and product, creating one if needed."""
+        key = f"{chat_id}:{product_id}"
+        cached = self.sessions.get(key)
+        if cached:
+            CHECKOUT_CACHE.labels("hit").inc()
+            return cached[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            CHECKOUT_CACHE.labels("miss").inc()
+            inflight = asyncio.ensure_future(self._create_and_cache(key, product_id, chat_id, credits_str))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(inflight)
+
+    async def _create_and_cache(self, key, product_id: str, chat_id: int, credits_str: str) -> str:
+        expires_at = int(time.time()) + self.session_ttl
+        session = await self.create_checkout_session(product_id, chat_id, credits_str, expires_at)
+        session_id, url = session["checkoutSessionId"], session["checkoutSessionUrl"]
+        reusable_for = expires_at - self.reuse_margin - time.time()
+        self.session_keys.set(session_id, key, ttl=reusable_for)
+        self.sessions.set(key, (session_id, url), ttl=reusable_for)
+        return url
+
+    def forget_session(self, checkout_session_id: str):
+        """Drops a session from the cache once it has been paid."""
+        if not checkout_session_id:
+            return
+        key = self.session_keys.pop(checkout_session_id)
+        cached = self.sessions.get(key) if key else None
+        # A newer session may have replaced it under the same key; that one is still unpaid.
+        if cached and cached[0] == checkout_session_id:
+            self.sessions.pop(key)
+
+    @instrumented("radom", "create_checkout_session")
+    async def create_checkout_session(self, product_id: str, chat_id: int, credits_str: str, expires_at: int) -> dict:
+        """
+        Creates a checkout session with telegram_group_id metadata.
+        Returns Radom's response, including checkoutSessionId and checkoutSessionUrl.
+        """
+        payload = {
+            "lineItems":  [{"productId": product_id}],
+            "currency":   "USD",
+            "gateway": {
+                    "managed": {
+                        "methods": [
+                            # MARK: CHANGE THESE TO PROD NETWORKS
+                            {"network": "Bitcoin"},
+                            {"network": "Solana"},
+                            {"network": "Ethereum"},
+                            # {"network": "Base"},
+                            # {"network": "Fiat"},
+                        ]
+                    }
+                },
+            "successUrl": "https://t.me/pumpreelsbot?start=payment_success",
+            "cancelUrl": "https://t.me/pumpreelsbot?start=payment_cancelled",
+            "metadata": [
+                {
+                    "key": "telegram_group_id",
+                    "value": str(chat_id)
+                },
+                {
+                    "key": "credits_str",
+                    "value": credits_str
+                }
+            ],
+            "expiresAt": expires_at,
+        }
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"{self.api_key}",
+        }
+        r = await self.client.post("/checkout_session", json=payload, headers=headers)
+        if r.status_code >= 400:
+            logger.error("Radom checkout_session failed with %s: %s", r.status_code, r.text[:500])
+        r.raise_for_status()
+        return r.json()
+
+    async def aclose(self):
+        await self.client.aclose()
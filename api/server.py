@@ -0,0 +1,151 @@
+"""
+Production entry point for the API: `python server.py`.
+
+Runs main:app under uvicorn with one worker process per CPU the container may
+use, capped by how many workers fit in its memory limit, on uvloop and
+httptools when they are installed.
+
+With several workers this process only supervises and never imports main
+(with one, it serves the app itself). uvicorn starts each worker
+as a fresh interpreter (multiprocessing "spawn", not fork) that imports main
+itself, so the Firestore and GCS clients, whose gRPC channels do not survive a
+fork, and the Telegram Application are created inside each worker. main refuses
+to start in a process it was not imported in, which catches pre-forking servers
+such as `gunicorn --preload`.
+
+Environment:
+  HOST, PORT             Listen address (default 0.0.0.0:5000).
+  WEB_CONCURRENCY        Worker count; derived from CPU and memory limits when unset.
+  WORKER_MEMORY_MB       Memory budget per worker for that derivation (default 384).
+  KEEP_ALIVE_SECONDS     Idle keep-alive timeout (default 75). Keep it above the idle
+                         timeout of the load balancer in front, or the balancer will
+                         reuse connections the server has already closed.
+  LOG_LEVEL              uvicorn log level (default info).
+
+With more than one worker, SHARED_CACHE_PATH and METRICS_DIR default to files
+under /dev/shm, so workers share group records and /metrics covers all of them,
+and BOT_SOCKET_PATH makes one worker handle every Telegram update, since the
+bot's conversations and renders live in that process (telegram_bot.bot_worker).
+"""
+import glob
+import importlib.util
+import logging
+import os
+import tempfile
+
+import uvicorn
+
+logger = logging.getLogger("server")
+
+# Interpreter, gRPC channels and the supervisor itself, on top of the workers.
+BASE_MEMORY_BYTES = 64 * 1024 * 1024
+# cgroup v1 reports "no limit" as a page-rounded LONG_MAX.
+UNLIMITED_MEMORY_BYTES = 1 << 60
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cpu_limit() -> float:
+    """CPUs this container may use: its cgroup CPU quota, else the CPUs it may run on."""
+    try:
+        quota, period = _read("/sys/fs/cgroup/cpu.max").split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(_read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"))
+        if quota > 0:
+            return quota / int(_read("/sys/fs/cgroup/cpu/cpu.cfs_period_us"))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_limit():
+    """The container's cgroup memory limit in bytes, or None when it has none."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = _read(path)
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            continue
+        return limit if limit < UNLIMITED_MEMORY_BYTES else None
+    return None
+
+
+def worker_count(cpus: float, memory, worker_memory: int) -> int:
+    """
+    One worker per whole CPU (the app is I/O bound, so more would only contend
+    for the quota), no more than fit in `memory`, and always at least one.
+    """
+    workers = max(1, int(cpus))
+    if memory is not None:
+        workers = min(workers, (memory - BASE_MEMORY_BYTES) // worker_memory)
+    return max(1, workers)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _shared_dir() -> str:
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def prepare_workers(workers: int):
+    """
+    Points the workers at one shared cache and metrics directory, and clears what
+    a previous server left there: entries may have a layout the new code does not
+    read, and metrics of workers that no longer exist.
+    """
+    if workers > 1:
+        os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(_shared_dir(), "pumpreels-cache"))
+        os.environ.setdefault("METRICS_DIR", os.path.join(_shared_dir(), "pumpreels-metrics"))
+        os.environ.setdefault("BOT_SOCKET_PATH", os.path.join(_shared_dir(), "pumpreels-bot.sock"))
+    cache_path = os.environ.get("SHARED_CACHE_PATH")
+    if cache_path and os.path.exists(cache_path):
+        os.remove(cache_path)
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, "*.prom*")):
+            os.remove(path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    cpus, memory = cpu_limit(), memory_limit()
+    worker_memory = int(os.environ.get("WORKER_MEMORY_MB", 384)) * 1024 * 1024
+    workers = int(os.environ.get("WEB_CONCURRENCY") or worker_count(cpus, memory, worker_memory))
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    prepare_workers(workers)
+    logger.info(
+        "Starting %d worker(s) on %s/%s (CPU limit %.2f, memory limit %s)",
+        workers, loop, http, cpus, f"{memory // (1024 * 1024)} MiB" if memory else "none",
+    )
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", 5000)),
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=int(os.environ.get("KEEP_ALIVE_SECONDS", 75)),
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,7 @@
+from .base import StorageBackend, storage_from_env
+from .models import Group, Render, Transaction
 from .firestore_client import FirestoreClient
+from .sqlite_client import SQLiteClient
 from .gcs_client import GCSClient
+from .group_cache import CachedGroups
+from .shared_cache import SharedCache, shared_cache_from_env
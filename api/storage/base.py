@@ -0,0 +1,122 @@
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from storage.models import Group
+
+
+class StorageBackend(ABC):
+    """
+    Persistence for groups, credits, payment transactions and render charges and refunds.
+
+    Groups are returned as `Group` records with their doc_id. Listings that take
+    `fields` only fill in those fields; the rest keep their defaults.
+    """
+
+    # Groups
+
+    @abstractmethod
+    def create_group(self, data, creator_user_id, creator_username, creator_full_name) -> str:
+        """Registers a Telegram chat (`data` has id, title and type) with 0 credits; returns the new doc_id."""
+
+    @abstractmethod
+    def get_group_by_id(self, doc_id) -> Optional[Group]:
+        """The group stored under doc_id, or None."""
+
+    @abstractmethod
+    def get_group(self, group_id) -> Optional[Group]:
+        """The group for a Telegram chat id, or None."""
+
+    @abstractmethod
+    def get_groups_by_creator(self, creator_id, fields=None, limit=None, start_after=None) -> List[Group]:
+        """
+        Groups created by a user.
+
+        Args:
+          fields: Only fetch these fields, e.g. ["title", "group_id", "credits"].
+          limit: Page size; pages are ordered by doc_id.
+          start_after: doc_id of the last group on the previous page.
+        """
+
+    @abstractmethod
+    def get_groups_page(self, fields=None, limit=100, start_after=None) -> List[Group]:
+        """One page of all groups ordered by doc_id."""
+
+    @abstractmethod
+    def count_groups(self) -> int:
+        pass
+
+    @abstractmethod
+    def mark_group_unreachable(self, doc_id, reason):
+        """Flags a group whose chat blocked or removed the bot so broadcasts skip it."""
+
+    # Credits
+
+    @abstractmethod
+    def add_credits(self, doc_id, amount):
+        pass
+
+    @abstractmethod
+    def decrement_credits(self, doc_id, amount):
+        """
+        Atomically takes `amount` credits from a group.
+
+        Raises:
+          ValueError: If the group does not exist or has fewer than `amount` credits.
+        """
+
+    @abstractmethod
+    def refund_render_once(self, doc_id, job_id, amount) -> bool:
+        """
+        Returns a render's credits unless that job was already refunded; True if credits were returned.
+
+        Raises:
+          ValueError: If the group does not exist; the refund is not recorded.
+        """
+
+    @abstractmethod
+    def render_refunded(self, job_id) -> bool:
+        pass
+
+    @abstractmethod
+    def record_render_charge(self, doc_id, job_id):
+        """Remembers which group paid for a mini-app render; only that group may cancel it or be refunded for it."""
+
+    @abstractmethod
+    def render_charge(self, job_id) -> Optional[str]:
+        """doc_id of the group charged for `job_id`, or None if no charge was recorded."""
+
+    # Payment transactions
+
+    @abstractmethod
+    def create_transaction(self, data: dict) -> bool:
+        """
+        Records a pending transaction from Radom's managedPayment webhook payload.
+        Returns False if it was already recorded (duplicate delivery).
+        """
+
+    @abstractmethod
+    def confirm_transaction_by_tx_hash(self, transaction_hash: str):
+        """
+        Credits the group and marks the transaction confirmed, exactly once per hash.
+
+        Returns:
+          The telegram group id on first confirmation, "already_confirmed" on repeats,
+          or None if no transaction is known for the hash.
+        """
+
+
+def storage_from_env() -> StorageBackend:
+    """
+    STORAGE_BACKEND=firestore (default) or sqlite. The SQLite database lives at
+    SQLITE_PATH (default pumpreels.db) and suits single-node deployments, local
+    runs and benchmarks.
+    """
+    backend = os.environ.get("STORAGE_BACKEND", "firestore").lower()
+    if backend == "sqlite":
+        from storage.sqlite_client import SQLiteClient
+        return SQLiteClient(os.environ.get("SQLITE_PATH", "pumpreels.db"))
+    if backend == "firestore":
+        from storage.firestore_client import FirestoreClient
+        return FirestoreClient()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected 'firestore' or 'sqlite'")
@@ -1,105 +1,183 @@
 from firebase_admin import credentials, firestore, storage, initialize_app
+from google.api_core.exceptions import AlreadyExists, NotFound
 from pandas import Timestamp
 import firebase_admin
+import google.auth.credentials
+import os
 import uuid
 
-
-class FirestoreClient:
+from monitoring.call_accounting import record_call
+from monitoring.metrics import instrumented
+from storage.base import StorageBackend
+from storage.models import Group, Transaction
+
+
+class _EmulatorCredential(credentials.Base):
+    """Anonymous credential used when FIRESTORE_EMULATOR_HOST points at a local emulator."""
+
+    def get_credential(self):
+        return google.auth.credentials.AnonymousCredentials()
+
+
+def parse_managed_payment(data: dict) -> Transaction:
+    """Builds a pending transaction, keyed by checkout session id, from Radom's managedPayment webhook payload."""
+    checkout = data["radomData"]["checkoutSession"]
+    payment = data["eventData"]["managedPayment"]
+    tx = payment["transactions"][0]  # Assuming 1 transaction per payment
+
+    # Extract metadata
+    metadata = {item["key"]: item["value"] for item in checkout.get("metadata", [])}
+    payment_summary = payment["paymentSummary"]
+
+    return Transaction(
+        payment_id=checkout["checkoutSessionId"],
+        # Essential fields
+        group_id=metadata.get("telegram_group_id"),
+        credits=int(metadata.get("credits_str", 0)),
+        status="pending",
+        transaction_hash=tx.get("transactionHash"),
+        # Helpful additional fields
+        network=tx.get("network"),
+        ticker=tx.get("ticker"),
+        amount=tx.get("amount"),
+        usd_value=payment_summary.get("grossAmount"),
+        net_amount=payment_summary.get("netAmount"),
+        network_fee_amount=payment_summary.get("networkFeeAmount"),
+        sender_address=tx.get("senderAddresses", [{}])[0].get("address"),
+        created_at=Timestamp.now(),
+    )
+
+
+def _hash_index_entry(transaction: Transaction, group_doc_id):
+    """Everything confirmation needs, so settling reads only this one document."""
+    return {
+        "checkout_session_id": transaction.payment_id,
+        "group_id": transaction.group_id,
+        "group_doc_id": group_doc_id,
+        "credits": transaction.credits,
+        "status": transaction.status,
+    }
+
+
+class FirestoreClient(StorageBackend):
     def __init__(self):
         if not firebase_admin._apps:
-            cred = credentials.Certificate('/secrets/pumpreels/pumpreels_service_key.json')
-            initialize_app(cred)
+            if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+                project_id = os.environ.get('FIRESTORE_PROJECT_ID', 'pumpreels')
+                initialize_app(_EmulatorCredential(), {'projectId': project_id})
+            else:
+                cred = credentials.Certificate(os.environ.get('FIREBASE_CREDENTIALS', '/secrets/pumpreels/pumpreels_service_key.json'))
+                initialize_app(cred)
 
         self.db = firestore.client()
         self.group_collection = self.db.collection('groups')
         self.transaction_collection = self.db.collection('transactions')
+        # transaction_hash -> settlement entry, so confirmations are a key lookup instead of a query.
+        self.transaction_hash_index = self.db.collection('transaction_hashes')
+        # render job id -> refund marker, so a render is refunded at most once whichever path notices it
+        self.render_refunds = self.db.collection('render_refunds')
+        # render job id -> the group charged for it, for renders started from the mini app
+        self.render_charges = self.db.collection('render_charges')
 
 
+    @instrumented("firestore")
     def create_transaction(self, data: dict):
         """
-        Create a transaction document in Firestore based on Radom's managedPayment webhook payload.
+        Create a transaction document in Firestore based on Radom's managedPayment webhook payload,
+        together with its transaction_hash index entry. Both are written in one batch with create
+        semantics, so a redelivered event can never reset a confirmed transaction to pending.
+
+        Returns:
+          False if the transaction already existed (duplicate delivery), True otherwise.
         """
         try:
-            checkout = data["radomData"]["checkoutSession"]
-            payment = data["eventData"]["managedPayment"]
-            tx = payment["transactions"][0]  # Assuming 1 transaction per payment
-
-            # Extract metadata
-            metadata = {item["key"]: item["value"] for item in checkout.get("metadata", [])}
-            group_id = metadata.get("telegram_group_id")
-            credits = int(metadata.get("credits_str", 0))
-
-            doc_id = checkout["checkoutSessionId"]
-
-            # Essential fields
-            payment_id = doc_id
-            transaction_hash = tx.get("transactionHash")
-            status = "pending"
-            created_at = Timestamp.now()
-
-            # Helpful additional fields
-            network = tx.get("network")
-            ticker = tx.get("ticker")
-            amount = tx.get("amount")
-            sender_address = tx.get("senderAddresses", [{}])[0].get("address")
-
-            usd_value = payment["paymentSummary"].get("grossAmount")
-            net_amount = payment["paymentSummary"].get("netAmount")
-            network_fee_amount = payment["paymentSummary"].get("networkFeeAmount")
-
-            # Firestore document
-            transaction_doc = {
-                "group_id": group_id,
-                "credits": credits,
-                "status": status,
-                "transaction_hash": transaction_hash,
-                "network": network,
-                "ticker": ticker,
-                "amount": amount,
-                "usd_value": usd_value,
-                "net_amount": net_amount,
-                "network_fee_amount": network_fee_amount,
-                "sender_address": sender_address,
-                "created_at": created_at,
-                "confirmed_at": None
-            }
-
-            self.transaction_collection.document(payment_id).set(transaction_doc)
-
+            transaction = parse_managed_payment(data)
+            group = self.get_group(int(transaction.group_id)) if transaction.group_id else None
+
+            batch = self.db.batch()
+            batch.create(self.transaction_collection.document(transaction.payment_id), transaction.to_document())
+            if transaction.transaction_hash:
+                batch.create(
+                    self.transaction_hash_index.document(transaction.transaction_hash),
+                    _hash_index_entry(transaction, group.doc_id if group else None)
+                )
+            batch.commit()
+            record_call("firestore", "write", 2 if transaction.transaction_hash else 1)
+            return True
+
+        except AlreadyExists:
+            return False
         except Exception as e:
             print(f"Failed to create transaction: {e}")
             raise e
 
 
+    @instrumented("firestore")
     def confirm_transaction_by_tx_hash(self, transaction_hash: str):
         """
         Confirm a transaction based on its blockchain transaction hash.
-        Adds credits to the appropriate group and updates the transaction status.
-        """
-        docs = self.transaction_collection.where("transaction_hash", "==", transaction_hash).limit(1).stream()
+        Credits the group and marks the transaction confirmed in a single Firestore
+        transaction keyed on the hash index, so duplicate or concurrent confirmations
+        credit exactly once.
 
-        for doc in docs:
-            tx = doc.to_dict()
+        Returns:
+          The telegram group id on first confirmation, "already_confirmed" on repeats,
+          or None if no transaction is known for the hash.
+        """
+        index_ref = self.transaction_hash_index.document(transaction_hash)
 
-            if tx.get("status") == "confirmed":
+        @firestore.transactional
+        def settle(transaction):
+            record_call("firestore", "transaction")
+            snapshot = index_ref.get(transaction=transaction)
+            record_call("firestore", "read")
+            if not snapshot.exists:
+                return None
+            entry = snapshot.to_dict()
+            if entry.get("status") == "confirmed":
                 return "already_confirmed"
+            if not entry.get("group_doc_id"):
+                raise ValueError(f"No group found for transaction {entry.get('checkout_session_id')}")
 
-            group_id = tx.get("group_id")
-            credits = tx.get("credits")
-
-            # Add credits to the group
-            self.add_credits(group_id, credits)
-
-            # Mark as confirmed
-            doc.reference.update({
+            confirmed_at = Timestamp.now()
+            # Increment avoids reading (and contending on) the group document.
+            transaction.update(self.group_collection.document(entry["group_doc_id"]), {
+                "credits": firestore.Increment(entry.get("credits") or 0)
+            })
+            transaction.update(self.transaction_collection.document(entry["checkout_session_id"]), {
                 "status": "confirmed",
-                "confirmed_at": Timestamp.now()
+                "confirmed_at": confirmed_at
             })
+            transaction.update(index_ref, {"status": "confirmed", "confirmed_at": confirmed_at})
+            record_call("firestore", "write", 3)
+            return entry.get("group_id")
 
-            return group_id
-
-        return None
+        result = settle(self.db.transaction())
+        if result is None and self._backfill_hash_index(transaction_hash):
+            result = settle(self.db.transaction())
+        return result
 
+    def _backfill_hash_index(self, transaction_hash: str) -> bool:
+        """
+        Creates the index entry for a transaction recorded before the index existed.
+        Returns True if an entry exists afterwards.
+        """
+        docs = self.transaction_collection.where("transaction_hash", "==", transaction_hash).limit(1).stream()
+        record_call("firestore", "read")
+        for doc in docs:
+            transaction = Transaction.from_snapshot(doc)
+            group = self.get_group(int(transaction.group_id)) if transaction.group_id else None
+            try:
+                record_call("firestore", "write")
+                self.transaction_hash_index.document(transaction_hash).create(
+                    _hash_index_entry(transaction, group.doc_id if group else None)
+                )
+            except AlreadyExists:
+                pass
+            return True
+        return False
+
+    @instrumented("firestore")
     def create_group(self, data, creator_user_id, creator_username, creator_full_name):
         doc_id = "g_" + uuid.uuid4().hex
         group_id = int(data['id'])
@@ -115,43 +193,93 @@ class FirestoreClient:
             "credits": 0,
             "created_at": Timestamp.now()
         })
+        record_call("firestore", "write")
 
         return doc_ref.id
 
+    @instrumented("firestore")
     def get_group_by_id(self, doc_id):
         doc = self.group_collection.document(doc_id).get()
+        record_call("firestore", "read")
         if doc.exists:
-            return doc.to_dict()
+            return Group.from_snapshot(doc)
         else:
             return None
 
+    @instrumented("firestore")
     def get_group(self, group_id):
         query = self.group_collection.where('group_id', '==', group_id).limit(1).stream()
+        # A query is billed one read per document returned, and at least one.
+        record_call("firestore", "read")
 
         for doc in query:
-            data = doc.to_dict()
-            data['doc_id'] = doc.id
-            return data
+            return Group.from_snapshot(doc)
 
         return None
 
-    def get_groups_by_creator(self, creator_id):
+    @instrumented("firestore")
+    def get_groups_by_creator(self, creator_id, fields=None, limit=None, start_after=None):
+        """
+        Groups created by a user, each with its doc_id.
+
+        Args:
+          fields: Only fetch these fields (a projection), e.g. ["title", "group_id", "credits"].
+          limit: Page size; pages are ordered by document id.
+          start_after: doc_id of the last group on the previous page.
+        """
         query = self.group_collection.where("creator_id", "==", creator_id)
-        docs = query.stream()
-        results = []
+        if fields:
+            query = query.select(fields)
+        if limit:
+            query = query.order_by("__name__").limit(limit)
+            if start_after:
+                query = query.start_after({"__name__": start_after})
+        results = [Group.from_snapshot(doc) for doc in query.stream()]
+        record_call("firestore", "read", max(1, len(results)))
 
-        for doc in docs:
-            data = doc.to_dict()
-            results.append(data)
+        return results
 
+    @instrumented("firestore")
+    def get_groups_page(self, fields=None, limit=100, start_after=None):
+        """
+        One page of all groups ordered by document id, each with its doc_id.
+        Pass the last doc_id of the previous page as `start_after` to continue.
+        """
+        query = self.group_collection
+        if fields:
+            query = query.select(fields)
+        query = query.order_by("__name__").limit(limit)
+        if start_after:
+            query = query.start_after({"__name__": start_after})
+        results = [Group.from_snapshot(doc) for doc in query.stream()]
+        record_call("firestore", "read", max(1, len(results)))
         return results
 
+    @instrumented("firestore")
+    def count_groups(self) -> int:
+        result = self.group_collection.count().get()
+        # Aggregations are billed one read per 1000 index entries counted.
+        record_call("firestore", "read", max(1, -(-int(result[0][0].value) // 1000)))
+        return int(result[0][0].value)
+
+    @instrumented("firestore")
+    def mark_group_unreachable(self, doc_id, reason):
+        """Flags a group whose chat blocked or removed the bot so broadcasts skip it."""
+        self.group_collection.document(doc_id).update({
+            "bot_unreachable": reason,
+            "bot_unreachable_at": Timestamp.now()
+        })
+        record_call("firestore", "write")
+
+    @instrumented("firestore")
     def add_credits(self, doc_id, amount):
         doc_ref = self.group_collection.document(doc_id)
 
         @firestore.transactional
         def transaction_add(transaction):
+            record_call("firestore", "transaction")
             snapshot = doc_ref.get(transaction=transaction)
+            record_call("firestore", "read")
             if not snapshot.exists:
                 transaction.set(doc_ref, {
                     "credits": amount,
@@ -162,17 +290,69 @@ class FirestoreClient:
                 transaction.update(doc_ref, {
                     "credits": current_credits + amount
                 })
+            record_call("firestore", "write")
 
         transaction = self.db.transaction()
         transaction_add(transaction)
 
 
+    @instrumented("firestore")
+    def refund_render_once(self, doc_id, job_id, amount):
+        """
+        Returns a render's credits to its group unless that job was already refunded.
+        The marker and the credit increment commit together in one batch.
+
+        Returns:
+          True if credits were returned, False if the job had been refunded before.
+
+        Raises:
+          ValueError: If the group does not exist; nothing is recorded.
+        """
+        batch = self.db.batch()
+        batch.create(self.render_refunds.document(job_id.replace("/", "_")), {
+            "doc_id": doc_id,
+            "credits": amount,
+            "refunded_at": firestore.SERVER_TIMESTAMP
+        })
+        batch.update(self.group_collection.document(doc_id), {"credits": firestore.Increment(amount)})
+        try:
+            batch.commit()
+        except AlreadyExists:
+            return False
+        except NotFound:
+            raise ValueError("Group does not exist")
+        record_call("firestore", "write", 2)
+        return True
+
+    @instrumented("firestore")
+    def render_refunded(self, job_id):
+        exists = self.render_refunds.document(job_id.replace("/", "_")).get().exists
+        record_call("firestore", "read")
+        return exists
+
+    @instrumented("firestore")
+    def record_render_charge(self, doc_id, job_id):
+        self.render_charges.document(job_id.replace("/", "_")).set({
+            "doc_id": doc_id,
+            "charged_at": firestore.SERVER_TIMESTAMP
+        })
+        record_call("firestore", "write")
+
+    @instrumented("firestore")
+    def render_charge(self, job_id):
+        snapshot = self.render_charges.document(job_id.replace("/", "_")).get()
+        record_call("firestore", "read")
+        return snapshot.get("doc_id") if snapshot.exists else None
+
+    @instrumented("firestore")
     def decrement_credits(self, doc_id, amount):
         doc_ref = self.group_collection.document(doc_id)
 
         @firestore.transactional
         def transaction_decrement(transaction):
+            record_call("firestore", "transaction")
             snapshot = doc_ref.get(transaction=transaction)
+            record_call("firestore", "read")
             if not snapshot.exists:
                 raise ValueError("Group does not exist")
             current_credits = snapshot.get("credits") or 0
@@ -181,6 +361,7 @@ class FirestoreClient:
             transaction.update(doc_ref, {
                 "credits": current_credits - amount
             })
+            record_call("firestore", "write")
 
         transaction = self.db.transaction()
         transaction_decrement(transaction)
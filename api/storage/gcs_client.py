@@ -3,8 +3,14 @@ from google.cloud import storage
 class GCSClient:
     def __init__(self, bucket_name: str):
         self.bucket_name = bucket_name
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(bucket_name)
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        # Created on first use so processes that never touch GCS don't need credentials.
+        if self._bucket is None:
+            self._bucket = storage.Client().bucket(self.bucket_name)
+        return self._bucket
 
     def upload_file(self, file_bytes, destination_blob_name):
         blob = self.bucket.blob(destination_blob_name)
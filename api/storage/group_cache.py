@@ -0,0 +1,83 @@
+from storage.models import Group
+
+
+class CachedGroups:
+    """
+    Wraps a storage backend so group lookups are served from cache.
+
+    `records` maps doc_id to Group and `doc_ids` maps Telegram chat id to doc_id.
+    Both are usually views of the shared cache, so every worker reads the same
+    copy. Every credit change made through the wrapper drops that group's
+    record. Changes made by other replicas show up once the record expires.
+    Every other call goes straight to the backend.
+    """
+
+    def __init__(self, backend, records, doc_ids):
+        self.backend = backend
+        self.records = records
+        self.doc_ids = doc_ids
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _remember(self, group: Group):
+        self.records.set(group.doc_id, group)
+        if group.group_id is not None:
+            self.doc_ids.set(int(group.group_id), group.doc_id)
+
+    def invalidate(self, doc_id: str):
+        self.records.pop(doc_id)
+
+    def get_group_by_id(self, doc_id):
+        group = self.records.get(doc_id)
+        if group is None:
+            group = self.backend.get_group_by_id(doc_id)
+            if group:
+                self._remember(group)
+        return group
+
+    def get_group(self, group_id):
+        doc_id = self.doc_ids.get(int(group_id))
+        group = self.records.get(doc_id) if doc_id else None
+        if group is None:
+            group = self.backend.get_group(group_id)
+            if group:
+                self._remember(group)
+        return group
+
+    def create_group(self, data, creator_user_id, creator_username, creator_full_name):
+        doc_id = self.backend.create_group(data, creator_user_id, creator_username, creator_full_name)
+        self.doc_ids.pop(int(data['id']))
+        return doc_id
+
+    def mark_group_unreachable(self, doc_id, reason):
+        try:
+            return self.backend.mark_group_unreachable(doc_id, reason)
+        finally:
+            self.invalidate(doc_id)
+
+    def add_credits(self, doc_id, amount):
+        try:
+            return self.backend.add_credits(doc_id, amount)
+        finally:
+            self.invalidate(doc_id)
+
+    def decrement_credits(self, doc_id, amount):
+        try:
+            return self.backend.decrement_credits(doc_id, amount)
+        finally:
+            self.invalidate(doc_id)
+
+    def refund_render_once(self, doc_id, job_id, amount):
+        try:
+            return self.backend.refund_render_once(doc_id, job_id, amount)
+        finally:
+            self.invalidate(doc_id)
+
+    def confirm_transaction_by_tx_hash(self, transaction_hash: str):
+        result = self.backend.confirm_transaction_by_tx_hash(transaction_hash)
+        if isinstance(result, str) and result.lstrip("-").isdigit():
+            doc_id = self.doc_ids.get(int(result))
+            if doc_id:
+                self.invalidate(doc_id)
+        return result
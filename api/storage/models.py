@@ -0,0 +1,105 @@
+"""
+Typed records for the documents storage hands around: groups, payment
+transactions and render checkpoints.
+
+They are NamedTuples, so they are immutable, have no per-instance __dict__ and
+pickle as plain tuples. Fields a query did not project (see `fields=` on the
+group listings) keep their defaults. `to_dict()` serializes every declared
+field, None included, so documents and JSON keep a stable shape; pass `fields`
+to serialize only what a projection fetched.
+"""
+from typing import Any, NamedTuple, Optional
+
+
+def _as_dict(record: tuple, fields=None) -> dict:
+    if fields is None:
+        return dict(zip(record._fields, record))
+    return {name: getattr(record, name) for name in fields}
+
+
+class Group(NamedTuple):
+    doc_id: Optional[str] = None
+    group_id: Optional[int] = None
+    title: Optional[str] = None
+    type: Optional[str] = None
+    credits: int = 0
+    creator_id: Optional[int] = None
+    creator_username: Optional[str] = None
+    creator_full_name: Optional[str] = None
+    created_at: Any = None
+    bot_unreachable: Optional[str] = None
+    bot_unreachable_at: Any = None
+
+    @classmethod
+    def from_dict(cls, data: dict, doc_id: str = None) -> "Group":
+        get = data.get
+        return cls(
+            doc_id or get("doc_id"), get("group_id"), get("title"), get("type"), get("credits") or 0,
+            get("creator_id"), get("creator_username"), get("creator_full_name"), get("created_at"),
+            get("bot_unreachable"), get("bot_unreachable_at"),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "Group":
+        return cls.from_dict(snapshot.to_dict() or {}, snapshot.id)
+
+    def to_dict(self, fields=None) -> dict:
+        return _as_dict(self, fields)
+
+
+class Transaction(NamedTuple):
+    """A Radom payment, keyed by its checkout session id (payment_id)."""
+    payment_id: str
+    group_id: Optional[str] = None
+    credits: int = 0
+    status: str = "pending"
+    transaction_hash: Optional[str] = None
+    network: Optional[str] = None
+    ticker: Optional[str] = None
+    amount: Any = None
+    usd_value: Any = None
+    net_amount: Any = None
+    network_fee_amount: Any = None
+    sender_address: Optional[str] = None
+    created_at: Any = None
+    confirmed_at: Any = None
+
+    @classmethod
+    def from_dict(cls, data: dict, payment_id: str = None) -> "Transaction":
+        transaction = cls._make(map(data.get, cls._fields))
+        return transaction._replace(
+            payment_id=payment_id or transaction.payment_id,
+            credits=transaction.credits or 0,
+            status=transaction.status or "pending",
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "Transaction":
+        return cls.from_dict(snapshot.to_dict() or {}, snapshot.id)
+
+    def to_dict(self, fields=None) -> dict:
+        return _as_dict(self, fields)
+
+    def to_document(self) -> dict:
+        """The stored fields; payment_id is the document id."""
+        document = _as_dict(self)
+        del document["payment_id"]
+        return document
+
+
+class Render(NamedTuple):
+    """What delivering a render needs, e.g. after it was handed to another replica."""
+    job_id: Optional[str] = None
+    chat_id: Optional[int] = None
+    doc_id: Optional[str] = None
+    user_id: Optional[int] = None
+    user_identifier: Optional[str] = None
+    prompt_text: Optional[str] = None
+    message_id: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Render":
+        return cls._make(map(data.get, cls._fields))
+
+    def to_dict(self, fields=None) -> dict:
+        return _as_dict(self, fields)
@@ -0,0 +1,103 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from monitoring.call_accounting import record_call
+from monitoring.metrics import instrumented
+from storage.models import Render
+
+logger = logging.getLogger(__name__)
+
+PARKED = "parked"
+RESUMED = "resumed"
+
+
+class RenderHandoff:
+    """
+    Renders a draining replica could not finish in time, parked in Firestore so
+    another replica can keep polling and deliver them.
+
+    Each document is keyed by the routed job id and holds the `Render` fields
+    delivery needs: chat_id, message_id (the "in queue" animation),
+    user_identifier, prompt_text and doc_id (the group charged for it). The image
+    is not kept, so a resumed render cannot fail over to another provider; it is
+    refunded instead.
+
+    `claimable_at` works like the webhook inbox's `next_attempt_at`: parked
+    renders hold the time they were parked, and claimed ones hold their lease
+    expiry, so a render whose resuming replica died is claimed again once the
+    lease runs out. The lease outlasts a resumed render's whole poll and delivery.
+    """
+
+    def __init__(self, db, collection: str = "render_handoffs", lease_seconds: float = 600.0):
+        self.db = db
+        self.collection = db.collection(collection)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    @staticmethod
+    def _doc_id(job_id: str) -> str:
+        return job_id.replace("/", "_")
+
+    @instrumented("firestore", "handoff_park")
+    def park(self, render: Render):
+        now = datetime.now(timezone.utc)
+        self.collection.document(self._doc_id(render.job_id)).set(dict(
+            render.to_dict(),
+            status=PARKED,
+            parked_at=now,
+            claimable_at=now,
+        ))
+        record_call("firestore", "write")
+
+    @instrumented("firestore", "handoff_parked")
+    def parked(self, limit: int = 50) -> list:
+        """Renders that can be claimed: parked ones and those whose claim lease ran out."""
+        query = self.collection.where("claimable_at", "<=", datetime.now(timezone.utc)).limit(limit)
+        doc_ids = [doc.id for doc in query.stream()]
+        # Parked by a replica running code from before claimable_at existed.
+        legacy = self.collection.where("status", "==", PARKED).limit(limit)
+        doc_ids += [doc.id for doc in legacy.stream() if doc.id not in doc_ids]
+        record_call("firestore", "read", max(2, len(doc_ids)))
+        return doc_ids
+
+    @instrumented("firestore", "handoff_claim")
+    def claim(self, doc_id: str) -> Render:
+        """Takes one parked render for this replica; returns it, or None if another replica has it."""
+        doc_ref = self.collection.document(doc_id)
+
+        @firestore.transactional
+        def claim_render(transaction):
+            record_call("firestore", "transaction")
+            snapshot = doc_ref.get(transaction=transaction)
+            record_call("firestore", "read")
+            if not snapshot.exists:
+                return None
+            handoff = snapshot.to_dict()
+            now = datetime.now(timezone.utc)
+            if handoff.get("status") == RESUMED:
+                if handoff.get("claimable_at") is None or handoff["claimable_at"] > now:
+                    return None
+                logger.warning("Reclaiming render %s; its claim by %s expired", doc_id, handoff.get("owner"))
+            elif handoff.get("status") != PARKED:
+                return None
+            transaction.update(doc_ref, {
+                "status": RESUMED,
+                "owner": self.owner,
+                "resumed_at": now,
+                "claimable_at": now + timedelta(seconds=self.lease_seconds),
+                "claims": (handoff.get("claims") or 0) + 1,
+            })
+            record_call("firestore", "write")
+            return Render.from_dict(handoff)
+
+        return claim_render(self.db.transaction())
+
+    @instrumented("firestore", "handoff_complete")
+    def complete(self, job_id: str):
+        self.collection.document(self._doc_id(job_id)).delete()
+        record_call("firestore", "write")
@@ -0,0 +1,231 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from monitoring.metrics import Counter
+from storage.cache import TTLCache
+
+SHARED_CACHE_LOOKUPS = Counter(
+    "pumpreels_shared_cache_lookups_total",
+    "Shared cache lookups by namespace and result (hit, miss).",
+    ("namespace", "result"),
+)
+
+_MAGIC = b"PRSC"
+_VERSION = 1
+_FILE_HEADER = struct.Struct("<4sIII")  # magic, version, slots, slot size
+_FILE_HEADER_SIZE = 64
+# seq, key hash (0 = empty), expires_at (wall clock), key length, value length
+_SLOT = struct.Struct("<IQdHH")
+_SEQ = struct.Struct("<I")
+_PROBES = 8
+_READ_RETRIES = 100
+
+
+def _key_hash(key: bytes) -> int:
+    # Python's hash() is salted per process; every worker has to agree on slots.
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedCache:
+    """
+    Cache in a memory-mapped file that every worker process on the host maps,
+    so one worker's fill is a hit for all of them without any IPC.
+
+    The file is a fixed open-addressing table: each key lives in one of _PROBES
+    consecutive slots of `slot_size` bytes, holding its hash, expiry, key and
+    pickled value. Reads take no lock. Each slot carries a sequence number that
+    writers make odd while they rewrite it and even again when done (a seqlock),
+    so a reader that sees an odd or changed number retries instead of returning
+    a torn value. Writers serialize on flock. When all of a key's slots are
+    live, the entry closest to expiry is evicted. Values that do not fit in a
+    slot are not cached.
+
+    Only processes running as the same user can open the file (mode 0600), since
+    values are unpickled.
+    """
+
+    def __init__(self, path: str, slots: int = 8192, slot_size: int = 512):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        size = _FILE_HEADER_SIZE + slots * slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _FILE_HEADER.pack(_MAGIC, _VERSION, slots, slot_size), 0)
+                else:
+                    layout = _FILE_HEADER.unpack(os.pread(fd, _FILE_HEADER.size, 0))
+                    if layout != (_MAGIC, _VERSION, slots, slot_size):
+                        raise ValueError(
+                            f"{path} holds a different cache layout {layout[1:]}; remove it or match its size"
+                        )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        # flock is per open file, so threads of this process also need a lock of their own.
+        self._lock = threading.Lock()
+
+    def _offsets(self, key_hash: int):
+        start = key_hash % self.slots
+        for i in range(_PROBES):
+            yield _FILE_HEADER_SIZE + ((start + i) % self.slots) * self.slot_size
+
+    def _read(self, offset: int):
+        """One consistent (hash, expires_at, key, value) from a slot, or None if writers kept it busy."""
+        mm = self._mm
+        for _ in range(_READ_RETRIES):
+            seq, key_hash, expires_at, key_len, value_len = _SLOT.unpack_from(mm, offset)
+            if seq & 1:
+                continue
+            start = offset + _SLOT.size
+            data = mm[start:start + key_len + value_len] if key_hash else b""
+            if _SEQ.unpack_from(mm, offset)[0] == seq:
+                return key_hash, expires_at, data[:key_len], data[key_len:]
+        return None
+
+    def _write(self, offset: int, key_hash: int, expires_at: float, key: bytes, value: bytes):
+        mm = self._mm
+        seq = _SEQ.unpack_from(mm, offset)[0]
+        _SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        _SLOT.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF, key_hash, expires_at, len(key), len(value))
+        start = offset + _SLOT.size
+        mm[start:start + len(key) + len(value)] = key + value
+        _SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def get(self, key: str, default=None):
+        key = key.encode()
+        key_hash = _key_hash(key)
+        for offset in self._offsets(key_hash):
+            slot = self._read(offset)
+            if slot is None or slot[0] != key_hash or slot[2] != key:
+                continue
+            if slot[1] < time.time():
+                return default
+            return pickle.loads(slot[3])
+        return default
+
+    def set(self, key: str, value, ttl: float):
+        key = key.encode()
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if _SLOT.size + len(key) + len(payload) > self.slot_size:
+            return
+        key_hash = _key_hash(key)
+        now = time.time()
+        with self._locked():
+            target, target_expiry = None, None
+            for offset in self._offsets(key_hash):
+                slot_hash, expires_at, slot_key, _ = self._read(offset) or (0, 0.0, b"", b"")
+                if slot_hash == key_hash and slot_key == key:
+                    target = offset
+                    break
+                if slot_hash == 0 or expires_at < now:
+                    expires_at = float("-inf")
+                if target is None or expires_at < target_expiry:
+                    target, target_expiry = offset, expires_at
+            self._write(target, key_hash, now + ttl, key, payload)
+
+    def pop(self, key: str):
+        key = key.encode()
+        key_hash = _key_hash(key)
+        value = None
+        with self._locked():
+            for offset in self._offsets(key_hash):
+                slot = self._read(offset)
+                if slot and slot[0] == key_hash and slot[2] == key:
+                    if value is None and slot[1] >= time.time():
+                        value = pickle.loads(slot[3])
+                    self._write(offset, 0, 0.0, b"", b"")
+        return value
+
+    def clear(self):
+        with self._locked():
+            for i in range(self.slots):
+                self._write(_FILE_HEADER_SIZE + i * self.slot_size, 0, 0.0, b"", b"")
+
+    def __len__(self):
+        now = time.time()
+        live = 0
+        for i in range(self.slots):
+            slot = self._read(_FILE_HEADER_SIZE + i * self.slot_size)
+            live += bool(slot and slot[0] and slot[1] >= now)
+        return live
+
+    def _locked(self):
+        return _WriteLock(self._lock, self._fd)
+
+    def view(self, namespace: str, ttl: float) -> "SharedCacheView":
+        return SharedCacheView(self, namespace, ttl)
+
+
+class _WriteLock:
+    __slots__ = ("lock", "fd")
+
+    def __init__(self, lock: threading.Lock, fd: int):
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+        return False
+
+
+class SharedCacheView:
+    """One namespace of a SharedCache with its own TTL; a drop-in for TTLCache's get/set/pop."""
+
+    def __init__(self, cache: SharedCache, namespace: str, ttl: float):
+        self.cache = cache
+        self.namespace = namespace
+        self.ttl = ttl
+        self._hits = SHARED_CACHE_LOOKUPS.labels(namespace, "hit")
+        self._misses = SHARED_CACHE_LOOKUPS.labels(namespace, "miss")
+
+    def get(self, key, default=None):
+        value = self.cache.get(f"{self.namespace}:{key}")
+        if value is None:
+            self._misses.inc()
+            return default
+        self._hits.inc()
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        self.cache.set(f"{self.namespace}:{key}", value, self.ttl if ttl is None else ttl)
+
+    def pop(self, key):
+        return self.cache.pop(f"{self.namespace}:{key}")
+
+
+def shared_cache_from_env():
+    """
+    SHARED_CACHE_PATH (e.g. /dev/shm/pumpreels-cache) turns on the cache shared
+    by every worker that opens the same file. SHARED_CACHE_SLOTS sets its size
+    in 512-byte slots (default 8192, 4 MiB).
+    """
+    path = os.environ.get("SHARED_CACHE_PATH")
+    if not path:
+        return None
+    return SharedCache(path, slots=int(os.environ.get("SHARED_CACHE_SLOTS", 8192)))
+
+
+def cache_for(shared: SharedCache, namespace: str, ttl: float, max_entries: int = 10000):
+    """A view of the shared cache when there is one, otherwise a TTLCache private to this process."""
+    if shared is None:
+        return TTLCache(ttl, max_entries)
+    return shared.view(namespace, ttl)
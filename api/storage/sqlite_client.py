@@ -0,0 +1,279 @@
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from monitoring.metrics import instrumented
+from storage.base import StorageBackend
+from storage.firestore_client import parse_managed_payment
+from storage.models import Group
+
+GROUP_COLUMNS = (
+    "title", "type", "group_id", "creator_id", "creator_username", "creator_full_name",
+    "credits", "created_at", "bot_unreachable", "bot_unreachable_at",
+)
+TRANSACTION_COLUMNS = (
+    "group_id", "credits", "status", "transaction_hash", "network", "ticker", "amount", "usd_value",
+    "net_amount", "network_fee_amount", "sender_address", "created_at", "confirmed_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    doc_id TEXT PRIMARY KEY,
+    title TEXT,
+    type TEXT,
+    group_id INTEGER NOT NULL,
+    creator_id INTEGER,
+    creator_username TEXT,
+    creator_full_name TEXT,
+    credits INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    bot_unreachable TEXT,
+    bot_unreachable_at TEXT
+);
+CREATE INDEX IF NOT EXISTS groups_group_id ON groups (group_id);
+CREATE INDEX IF NOT EXISTS groups_creator_id ON groups (creator_id, doc_id);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    payment_id TEXT PRIMARY KEY,
+    group_id TEXT,
+    credits INTEGER,
+    status TEXT,
+    transaction_hash TEXT UNIQUE,
+    network TEXT,
+    ticker TEXT,
+    amount TEXT,
+    usd_value TEXT,
+    net_amount TEXT,
+    network_fee_amount TEXT,
+    sender_address TEXT,
+    created_at TEXT,
+    confirmed_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS render_refunds (
+    job_id TEXT PRIMARY KEY,
+    doc_id TEXT,
+    credits INTEGER,
+    refunded_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS render_charges (
+    job_id TEXT PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    charged_at TEXT
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _row_to_group(row: sqlite3.Row, doc_id: str = None) -> Group:
+    return Group.from_dict(dict(zip(row.keys(), row)), doc_id)
+
+
+class SQLiteClient(StorageBackend):
+    """
+    Single-file storage backend for single-node deployments, local runs and benchmarks.
+
+    Runs in WAL mode so readers never wait for the writer, with one connection per
+    thread. Credit changes are single UPDATE statements (`credits = credits - ?`
+    guarded by `credits >= ?`), and multi-row changes run inside BEGIN IMMEDIATE,
+    so they are atomic across threads and processes sharing the file.
+    """
+
+    def __init__(self, path: str = "pumpreels.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Groups
+
+    @instrumented("sqlite")
+    def create_group(self, data, creator_user_id, creator_username, creator_full_name):
+        doc_id = "g_" + uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO groups (doc_id, title, type, group_id, creator_id, creator_username, creator_full_name,"
+            " credits, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+            (doc_id, data['title'], data['type'], int(data['id']), creator_user_id, creator_username,
+             creator_full_name, _now()),
+        )
+        return doc_id
+
+    def put_groups(self, groups: dict):
+        """Writes groups (doc_id -> fields) in one transaction, replacing existing ones. For seeding."""
+        with self._transaction() as conn:
+            for doc_id, data in groups.items():
+                columns = [column for column in GROUP_COLUMNS if column in data]
+                conn.execute(
+                    f"INSERT OR REPLACE INTO groups (doc_id, {', '.join(columns)})"
+                    f" VALUES (?{', ?' * len(columns)})",
+                    [doc_id] + [data[column] for column in columns],
+                )
+
+    @instrumented("sqlite")
+    def get_group_by_id(self, doc_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(GROUP_COLUMNS)} FROM groups WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        return _row_to_group(row, doc_id) if row else None
+
+    @instrumented("sqlite")
+    def get_group(self, group_id):
+        row = self._connect().execute(
+            f"SELECT doc_id, {', '.join(GROUP_COLUMNS)} FROM groups WHERE group_id = ? LIMIT 1", (int(group_id),)
+        ).fetchone()
+        return _row_to_group(row) if row else None
+
+    def _select_groups(self, where: str, params: list, fields, limit, start_after) -> list:
+        columns = [column for column in (fields or GROUP_COLUMNS) if column in GROUP_COLUMNS]
+        sql = f"SELECT doc_id, {', '.join(columns)} FROM groups WHERE {where}"
+        if start_after:
+            sql += " AND doc_id > ?"
+            params.append(start_after)
+        sql += " ORDER BY doc_id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_group(row) for row in self._connect().execute(sql, params)]
+
+    @instrumented("sqlite")
+    def get_groups_by_creator(self, creator_id, fields=None, limit=None, start_after=None):
+        return self._select_groups("creator_id = ?", [creator_id], fields, limit, start_after if limit else None)
+
+    @instrumented("sqlite")
+    def get_groups_page(self, fields=None, limit=100, start_after=None):
+        return self._select_groups("1 = 1", [], fields, limit, start_after)
+
+    @instrumented("sqlite")
+    def count_groups(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM groups").fetchone()[0]
+
+    @instrumented("sqlite")
+    def mark_group_unreachable(self, doc_id, reason):
+        self._connect().execute(
+            "UPDATE groups SET bot_unreachable = ?, bot_unreachable_at = ? WHERE doc_id = ?",
+            (reason, _now(), doc_id),
+        )
+
+    # Credits
+
+    @instrumented("sqlite")
+    def add_credits(self, doc_id, amount):
+        self._connect().execute(
+            "INSERT INTO groups (doc_id, group_id, credits, created_at) VALUES (?, 0, ?, ?)"
+            " ON CONFLICT (doc_id) DO UPDATE SET credits = credits + excluded.credits",
+            (doc_id, amount, _now()),
+        )
+
+    @instrumented("sqlite")
+    def decrement_credits(self, doc_id, amount):
+        conn = self._connect()
+        updated = conn.execute(
+            "UPDATE groups SET credits = credits - ? WHERE doc_id = ? AND credits >= ?",
+            (amount, doc_id, amount),
+        ).rowcount
+        if not updated:
+            exists = conn.execute("SELECT 1 FROM groups WHERE doc_id = ?", (doc_id,)).fetchone()
+            raise ValueError("Not enough credits" if exists else "Group does not exist")
+
+    @instrumented("sqlite")
+    def refund_render_once(self, doc_id, job_id, amount):
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO render_refunds (job_id, doc_id, credits, refunded_at) VALUES (?, ?, ?, ?)",
+                    (job_id, doc_id, amount, _now()),
+                )
+                updated = conn.execute(
+                    "UPDATE groups SET credits = credits + ? WHERE doc_id = ?", (amount, doc_id)
+                ).rowcount
+                if not updated:
+                    # Raised inside the transaction so the refund marker is rolled back too.
+                    raise ValueError("Group does not exist")
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    @instrumented("sqlite")
+    def render_refunded(self, job_id):
+        return self._connect().execute("SELECT 1 FROM render_refunds WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    @instrumented("sqlite")
+    def record_render_charge(self, doc_id, job_id):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO render_charges (job_id, doc_id, charged_at) VALUES (?, ?, ?)",
+            (job_id, doc_id, _now()),
+        )
+
+    @instrumented("sqlite")
+    def render_charge(self, job_id):
+        row = self._connect().execute("SELECT doc_id FROM render_charges WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    # Payment transactions
+
+    @instrumented("sqlite")
+    def create_transaction(self, data: dict):
+        transaction = parse_managed_payment(data)._replace(created_at=_now())
+        values = [transaction.payment_id] + [
+            str(value) if column in ("amount", "usd_value", "net_amount", "network_fee_amount") and value is not None
+            else value
+            for column, value in ((column, getattr(transaction, column)) for column in TRANSACTION_COLUMNS)
+        ]
+        try:
+            self._connect().execute(
+                f"INSERT INTO transactions (payment_id, {', '.join(TRANSACTION_COLUMNS)})"
+                f" VALUES (?{', ?' * len(TRANSACTION_COLUMNS)})",
+                values,
+            )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    @instrumented("sqlite")
+    def confirm_transaction_by_tx_hash(self, transaction_hash: str):
+        with self._transaction() as conn:
+            tx = conn.execute(
+                "SELECT payment_id, group_id, credits, status FROM transactions WHERE transaction_hash = ?",
+                (transaction_hash,),
+            ).fetchone()
+            if tx is None:
+                return None
+            if tx["status"] == "confirmed":
+                return "already_confirmed"
+            group = conn.execute(
+                "SELECT doc_id FROM groups WHERE group_id = ? LIMIT 1", (int(tx["group_id"] or 0),)
+            ).fetchone()
+            if group is None:
+                raise ValueError(f"No group found for transaction {tx['payment_id']}")
+            conn.execute("UPDATE groups SET credits = credits + ? WHERE doc_id = ?", (tx["credits"] or 0, group["doc_id"]))
+            conn.execute(
+                "UPDATE transactions SET status = 'confirmed', confirmed_at = ? WHERE payment_id = ?",
+                (_now(), tx["payment_id"]),
+            )
+            return tx["group_id"]
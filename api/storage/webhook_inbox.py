@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from monitoring.call_accounting import account_calls, record_call
+from monitoring.metrics import Counter, Gauge, instrumented
+
+logger = logging.getLogger(__name__)
+
+INBOX_EVENTS = Counter(
+    "pumpreels_webhook_inbox_events_total",
+    "Webhook inbox events by source and outcome (received, duplicate, processed, retried, dead).",
+    ("source", "outcome"),
+)
+INBOX_PROCESSING = Gauge(
+    "pumpreels_webhook_inbox_processing",
+    "Inbox events currently being processed by this replica.",
+)
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+DEAD = "dead"
+
+
+def event_id_for(payload: dict) -> str:
+    """
+    The provider's event id when it sends one, otherwise a hash of the canonical
+    payload so that byte-identical redeliveries collapse onto the same inbox entry.
+    """
+    for key in ("id", "eventId", "webhookId"):
+        if payload.get(key):
+            return str(payload[key])
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return "sha256_" + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class WebhookInbox:
+    """
+    Firestore-backed inbox. Each event is one document keyed by event id.
+
+    `next_attempt_at` drives the work queue: pending events hold the time they
+    become due, claimed events hold their lease expiry (so a crashed replica's
+    events are picked up again), and finished or dead-lettered events have no
+    value at all, which drops them out of the due query without a composite index.
+    """
+
+    def __init__(self, db, source: str, lease_seconds: float = 60.0, max_attempts: int = 8):
+        self.collection = db.collection(f"{source}_webhook_inbox")
+        self.db = db
+        self.source = source
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @instrumented("firestore", "inbox_put")
+    def put(self, event_id: str, payload: dict) -> bool:
+        """Stores a raw event. Returns False if the event id was already in the inbox."""
+        now = datetime.now(timezone.utc)
+        try:
+            self.collection.document(event_id).create({
+                "payload": json.dumps(payload),
+                "event_type": payload.get("eventType"),
+                "status": PENDING,
+                "attempts": 0,
+                "received_at": now,
+                "next_attempt_at": now,
+            })
+        except AlreadyExists:
+            INBOX_EVENTS.labels(self.source, "duplicate").inc()
+            return False
+        record_call("firestore", "write")
+        INBOX_EVENTS.labels(self.source, "received").inc()
+        return True
+
+    @instrumented("firestore", "inbox_due")
+    def due(self, limit: int = 20) -> list:
+        now = datetime.now(timezone.utc)
+        query = self.collection.where("next_attempt_at", "<=", now).order_by("next_attempt_at").limit(limit)
+        event_ids = [doc.id for doc in query.stream()]
+        record_call("firestore", "read", max(1, len(event_ids)))
+        return event_ids
+
+    @instrumented("firestore", "inbox_claim")
+    def claim(self, event_id: str, owner: str):
+        """
+        Leases one event to `owner`. Returns (payload, attempt) or None when another
+        replica got there first or the event is no longer due.
+        """
+        doc_ref = self.collection.document(event_id)
+
+        @firestore.transactional
+        def claim_event(transaction):
+            record_call("firestore", "transaction")
+            snapshot = doc_ref.get(transaction=transaction)
+            record_call("firestore", "read")
+            if not snapshot.exists:
+                return None
+            event = snapshot.to_dict()
+            now = datetime.now(timezone.utc)
+            due_at = event.get("next_attempt_at")
+            if due_at is None or due_at > now:
+                return None
+            attempt = (event.get("attempts") or 0) + 1
+            transaction.update(doc_ref, {
+                "status": PROCESSING,
+                "attempts": attempt,
+                "lease_owner": owner,
+                "next_attempt_at": now + timedelta(seconds=self.lease_seconds),
+            })
+            record_call("firestore", "write")
+            return json.loads(event["payload"]), attempt
+
+        return claim_event(self.db.transaction())
+
+    @instrumented("firestore", "inbox_complete")
+    def complete(self, event_id: str):
+        self.collection.document(event_id).update({
+            "status": DONE,
+            "processed_at": datetime.now(timezone.utc),
+            "next_attempt_at": firestore.DELETE_FIELD,
+        })
+        record_call("firestore", "write")
+        INBOX_EVENTS.labels(self.source, "processed").inc()
+
+    @instrumented("firestore", "inbox_fail")
+    def fail(self, event_id: str, attempt: int, error: str):
+        """Schedules a retry with jittered exponential backoff, or dead-letters after max_attempts."""
+        update = {"last_error": error[:1000]}
+        if attempt >= self.max_attempts:
+            update.update({"status": DEAD, "next_attempt_at": firestore.DELETE_FIELD})
+            INBOX_EVENTS.labels(self.source, "dead").inc()
+            logger.error("Dead-lettered %s webhook %s after %s attempts: %s", self.source, event_id, attempt, error)
+        else:
+            delay = random.uniform(0.5, 1.0) * min(600, 5 * 2 ** (attempt - 1))
+            update.update({"status": PENDING, "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay)})
+            INBOX_EVENTS.labels(self.source, "retried").inc()
+        self.collection.document(event_id).update(update)
+        record_call("firestore", "write")
+
+
+class InboxProcessor:
+    """
+    Background loop that drains a WebhookInbox through `handler(payload)`, an async
+    callable that raises to request a retry. Several replicas can run it at once:
+    every event is claimed through a Firestore transaction before it is handled.
+    """
+
+    def __init__(self, inbox: WebhookInbox, handler, poll_interval: float = 2.0, concurrency: int = 4):
+        self.inbox = inbox
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+
+    def notify(self):
+        """Wakes the loop right away, e.g. after this replica accepted a new event."""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                event_ids = await asyncio.to_thread(self.inbox.due)
+            except Exception as e:
+                logger.error("Failed to read %s webhook inbox: %s", self.inbox.source, e)
+                event_ids = []
+            for event_id in event_ids:
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._process(event_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            if not event_ids:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _process(self, event_id: str):
+        INBOX_PROCESSING.inc()
+        try:
+            with account_calls(f"inbox:{self.inbox.source}"):
+                await self._handle(event_id)
+        except Exception as e:
+            # Bookkeeping failed; the lease expires and the event is retried.
+            logger.error("Inbox bookkeeping for %s failed: %s", event_id, e)
+        finally:
+            INBOX_PROCESSING.dec()
+            self._semaphore.release()
+
+    async def _handle(self, event_id: str):
+        claimed = await asyncio.to_thread(self.inbox.claim, event_id, self.owner)
+        if claimed is None:
+            return
+        payload, attempt = claimed
+        try:
+            await self.handler(payload)
+        except Exception as e:
+            logger.warning("Webhook %s failed on attempt %s: %s", event_id, attempt, e)
+            await asyncio.to_thread(self.inbox.fail, event_id, attempt, repr(e))
+        else:
+            await asyncio.to_thread(self.inbox.complete, event_id)
+
+    async def stop(self):
+        """Lets in-flight events finish; unclaimed ones stay in the inbox for the next start."""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,144 @@
+"""
+Keeps Telegram update handling in one uvicorn worker.
+
+PTB conversations (and their timeout jobs), per-user bot state, the /credits
+listing cache and the render supervisor live in process memory, so with several
+workers every update, and every lookup of a render started from Telegram, has to
+reach the same process. The worker holding an exclusive lock on
+`<socket path>.lock` is the bot worker: it serves those operations on a Unix
+socket, and the other workers forward to it. When it exits the lock is released
+and another worker takes over; the state it held is lost, as on a restart.
+"""
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+
+from monitoring.call_accounting import account_calls
+from monitoring.tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+# Largest request or response line; Telegram updates are a few KB.
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+
+class BotWorkerUnavailable(Exception):
+    """Raised when no worker is serving the bot, e.g. while it restarts; callers answer 503."""
+
+
+class BotWorker:
+    """
+    Runs named operations in whichever worker holds the bot lock.
+
+    `run(operations)` waits for the lock and then serves `operations` (name ->
+    coroutine function taking JSON-serializable keyword arguments and returning a
+    JSON-serializable result). `call()` runs one locally on the bot worker and
+    forwards it everywhere else.
+    """
+
+    def __init__(self, socket_path: str, retry_seconds: float = 1.0, timeout: float = 55.0):
+        self.socket_path = socket_path
+        self.lock_path = f"{socket_path}.lock"
+        self.retry_seconds = retry_seconds
+        # Below Telegram's webhook timeout, so a stuck bot worker is answered rather than retried blindly.
+        self.timeout = timeout
+        self.active = False
+        self._operations = {}
+        self._lock_fd = None
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def run(self, operations: dict):
+        self._operations = operations
+        while not self._try_lock():
+            await asyncio.sleep(self.retry_seconds)
+        # Left behind by a bot worker that died; holding the lock means nobody serves it.
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._serve, path=self.socket_path, limit=MAX_MESSAGE_BYTES)
+        self.active = True
+        logger.info("Worker %s now handles Telegram updates", os.getpid())
+        async with server:
+            await server.serve_forever()
+
+    def stop(self):
+        """Gives up the bot so another worker can take it; call after cancelling `run`."""
+        if self._lock_fd is None:
+            return
+        self.active = False
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    async def call(self, operation: str, **payload):
+        """
+        Runs `operation` on the bot worker and returns its result.
+
+        Raises:
+          BotWorkerUnavailable: If no worker serves the bot or it did not answer in time.
+          RuntimeError: If the operation itself failed on the bot worker.
+        """
+        if self.active:
+            return await self._operations[operation](**payload)
+        request = json.dumps({"operation": operation, "payload": payload}).encode() + b"\n"
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.socket_path, limit=MAX_MESSAGE_BYTES), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise BotWorkerUnavailable(f"cannot reach the bot worker: {e!r}") from e
+        try:
+            writer.write(request)
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise BotWorkerUnavailable(f"bot worker did not answer {operation}: {e!r}") from e
+        finally:
+            writer.close()
+        if not line:
+            raise BotWorkerUnavailable(f"bot worker closed the connection during {operation}")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"{operation} failed on the bot worker: {response['error']}")
+        return response["result"]
+
+    async def _serve(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            operation = request["operation"]
+            # Forwarded work gets its own trace and call ledger, like a request to this worker.
+            with start_trace(f"bot_worker {operation}"), account_calls(f"bot_worker:{operation}"):
+                try:
+                    response = {"result": await self._operations[operation](**request["payload"])}
+                except Exception as e:
+                    logger.exception("Forwarded %s failed", operation)
+                    response = {"error": repr(e)}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        except Exception as e:
+            logger.warning("Bad request on the bot worker socket: %s", e)
+        finally:
+            writer.close()
+
+
+def bot_worker_from_env():
+    """
+    BOT_SOCKET_PATH (e.g. /dev/shm/pumpreels-bot.sock, set by server.py when it
+    runs several workers) keeps Telegram update handling in one worker.
+    """
+    path = os.environ.get("BOT_SOCKET_PATH")
+    if not path:
+        return None
+    return BotWorker(path, timeout=float(os.environ.get("BOT_WORKER_TIMEOUT_SECONDS", 55)))
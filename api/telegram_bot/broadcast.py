@@ -0,0 +1,235 @@
+"""
+Resumable, rate-limited broadcasts to every registered group.
+
+    python -m telegram_bot.broadcast spring-launch                 # mini-app card to every group
+    python -m telegram_bot.broadcast spring-launch --text "..."    # plain text announcement
+
+Groups are streamed from Firestore a page at a time in document-id order. After
+each page the cursor and counters are checkpointed to broadcasts/<id>, so
+running the same broadcast id again resumes after the last finished page
+(delivery is at-least-once for the page in flight during a crash). Sends stay
+under Telegram's global limit and the per-chat limit for groups, back off on
+429 RetryAfter, and chats that blocked or removed the bot are flagged and
+skipped from then on.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from monitoring.metrics import Counter
+from storage.models import Group
+from telegram_bot.messages import MINI_APP_URL, build_mini_app_caption
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MESSAGES = Counter(
+    "pumpreels_broadcast_messages_total",
+    "Broadcast deliveries by outcome (sent, unreachable, skipped, failed).",
+    ("outcome",),
+)
+
+# Telegram allows about 30 messages per second overall and 20 per minute into one group.
+GLOBAL_RATE = 25.0
+PER_CHAT_INTERVAL = 3.0
+GROUP_FIELDS = ["group_id", "title", "credits", "bot_unreachable"]
+_UNREACHABLE_ERRORS = ("chat not found", "bot was kicked", "bot is not a member", "group chat was upgraded")
+
+
+async def send_mini_app_card(bot: Bot, group_data: Group):
+    doc_id = group_data.doc_id
+    caption = build_mini_app_caption(group_data.title, group_data.credits, doc_id)
+
+    keyboard = [
+        [InlineKeyboardButton(text="📱Open Mini App", url=MINI_APP_URL.format(doc_id=doc_id))]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await bot.send_animation(
+        chat_id=int(group_data.group_id),
+        animation="https://pumpreels-mini-app.netlify.app/rendering.gif",
+        caption=caption,
+        parse_mode="MarkdownV2",
+        reply_markup=reply_markup
+    )
+
+
+class RateLimiter:
+    """
+    Spaces sends to `rate` per second overall and `per_chat_interval` seconds
+    within one chat. `pause()` holds every sender back after a 429.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL):
+        self.interval = 1.0 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._last_sent = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id: int):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until,
+                       self._last_sent.get(chat_id, -self.per_chat_interval) + self.per_chat_interval)
+            self._next_slot = slot + self.interval
+            self._last_sent[chat_id] = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def forget(self, chat_ids):
+        for chat_id in chat_ids:
+            self._last_sent.pop(chat_id, None)
+
+
+class Broadcast:
+    """
+    One broadcast run. `send(group)` delivers to a single group dict (with doc_id,
+    group_id, title and credits) and may raise telegram errors.
+    """
+
+    def __init__(self, broadcast_id: str, firestore_client, send, limiter: RateLimiter = None,
+                 page_size: int = 50, concurrency: int = 10, max_attempts: int = 3):
+        self.broadcast_id = broadcast_id
+        self.firestore_client = firestore_client
+        self.send = send
+        self.limiter = limiter or RateLimiter()
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.checkpoint_ref = firestore_client.db.collection("broadcasts").document(broadcast_id)
+        self.state = {"cursor": None, "sent": 0, "unreachable": 0, "skipped": 0, "failed": 0, "status": "running"}
+
+    def _load_checkpoint(self):
+        snapshot = self.checkpoint_ref.get()
+        if snapshot.exists:
+            self.state.update(snapshot.to_dict())
+            logger.info("Resuming broadcast %s after %s", self.broadcast_id, self.state["cursor"])
+
+    def _save_checkpoint(self):
+        self.checkpoint_ref.set(dict(self.state, updated_at=time.time()))
+
+    @property
+    def processed(self) -> int:
+        return self.state["sent"] + self.state["unreachable"] + self.state["skipped"] + self.state["failed"]
+
+    async def run(self) -> dict:
+        await asyncio.to_thread(self._load_checkpoint)
+        if self.state["status"] == "done":
+            logger.info("Broadcast %s already finished: %s", self.broadcast_id, self.state)
+            return self.state
+        total = await asyncio.to_thread(self.firestore_client.count_groups)
+        started_at, processed_at_start = time.monotonic(), self.processed
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(group):
+            async with semaphore:
+                outcome = await self._deliver(group)
+            self.state[outcome] += 1
+            BROADCAST_MESSAGES.labels(outcome).inc()
+
+        while True:
+            page = await asyncio.to_thread(
+                self.firestore_client.get_groups_page, GROUP_FIELDS, self.page_size, self.state["cursor"]
+            )
+            if not page:
+                break
+            await asyncio.gather(*(deliver(group) for group in page))
+            self.limiter.forget(group.group_id for group in page)
+            self.state["cursor"] = page[-1].doc_id
+            await asyncio.to_thread(self._save_checkpoint)
+            self._report(total, started_at, processed_at_start)
+
+        self.state["status"] = "done"
+        await asyncio.to_thread(self._save_checkpoint)
+        self._report(total, started_at, processed_at_start)
+        return self.state
+
+    async def _deliver(self, group: Group) -> str:
+        if group.bot_unreachable or not group.group_id:
+            return "skipped"
+        chat_id = int(group.group_id)
+        for attempt in range(1, self.max_attempts + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.send(group)
+                return "sent"
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+                logger.warning("Flood limit hit; pausing broadcast for %.0fs", seconds)
+                self.limiter.pause(seconds)
+            except Forbidden as e:
+                await self._mark_unreachable(group, str(e))
+                return "unreachable"
+            except BadRequest as e:
+                if any(reason in str(e).lower() for reason in _UNREACHABLE_ERRORS):
+                    await self._mark_unreachable(group, str(e))
+                    return "unreachable"
+                logger.error("Broadcast to %s rejected: %s", chat_id, e)
+                return "failed"
+            except NetworkError as e:
+                logger.warning("Broadcast to %s failed on attempt %s: %s", chat_id, attempt, e)
+                await asyncio.sleep(attempt)
+        return "failed"
+
+    async def _mark_unreachable(self, group: Group, reason: str):
+        try:
+            await asyncio.to_thread(self.firestore_client.mark_group_unreachable, group.doc_id, reason[:200])
+        except Exception as e:
+            logger.error("Could not flag group %s as unreachable: %s", group.doc_id, e)
+
+    def _report(self, total: int, started_at: float, processed_at_start: int):
+        elapsed = time.monotonic() - started_at
+        rate = (self.processed - processed_at_start) / elapsed if elapsed else 0.0
+        remaining = max(0, total - self.processed)
+        eta = f"{remaining / rate:.0f}s" if rate else "unknown"
+        logger.info(
+            "Broadcast %s: %d/%d processed (sent %d, unreachable %d, skipped %d, failed %d), %.1f msg/s, ETA %s",
+            self.broadcast_id, self.processed, total, self.state["sent"], self.state["unreachable"],
+            self.state["skipped"], self.state["failed"], rate, eta,
+        )
+
+
+async def _main(args):
+    from storage.firestore_client import FirestoreClient
+
+    base_url = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+    bot = Bot(os.environ["TELEGRAM_BOT_TOKEN"], base_url=f"{base_url}/bot", base_file_url=f"{base_url}/file/bot")
+
+    if args.text:
+        async def send(group):
+            await bot.send_message(chat_id=int(group.group_id), text=args.text)
+    else:
+        async def send(group):
+            await send_mini_app_card(bot, group)
+
+    async with bot:
+        broadcast = Broadcast(args.broadcast_id, FirestoreClient(), send, RateLimiter(args.rate),
+                              page_size=args.page_size, concurrency=args.concurrency)
+        return await broadcast.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("broadcast_id", help="Checkpoint key; rerun with the same id to resume")
+    parser.add_argument("--text", help="Send this text instead of the mini-app card")
+    parser.add_argument("--rate", type=float, default=GLOBAL_RATE, help="Messages per second overall")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    print(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,23 @@ def generate_credit_buttons():
         [InlineKeyboardButton("12,500 Credits", url="https://pay.radom.com/pay/22084efe-2acc-46dc-aa83-255e40ec550c"),
          InlineKeyboardButton("25,000 Credits", url="https://pay.radom.com/pay/176362cb-e739-47d3-9232-c025b5d859fc")]
     ])
+
+
+def build_group_picker(groups, page, has_next):
+    """
+    One button per group plus a navigation row. Group buttons carry the Telegram
+    group id; navigation buttons carry the page number to show.
+    """
+    rows = [
+        [InlineKeyboardButton(f"{group.title} · {group.credits:,} credits",
+                              callback_data=f"select_chat_{group.group_id}")]
+        for group in groups
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"groups_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f"groups_page_{page + 1}"))
+    if navigation:
+        rows.append(navigation)
+    return InlineKeyboardMarkup(rows)
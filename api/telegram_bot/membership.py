@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+from storage.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ("creator", "administrator")
+MEMBER_STATUSES = ADMIN_STATUSES + ("member",)
+_GROUP_TYPES = ("group", "supergroup")
+
+
+class ChatMembershipCache:
+    """
+    In-memory view of who administers and belongs to each group.
+
+    Lookups hit the Bot API only on a miss; after that they are answered from
+    memory until the TTL runs out. chat_member / my_chat_member updates and
+    ordinary group messages keep the entries fresh in between (chat_member
+    updates are only sent when the webhook's allowed_updates includes them).
+
+    Only the bot worker sees those updates, so with several workers `members`
+    and `admin_changes` should be views of the shared cache: membership is then
+    read and invalidated in one place, and each worker's admin lists are
+    dropped once the bot worker records a change for the chat.
+    """
+
+    def __init__(
+        self,
+        bot,
+        ttl: float = 600.0,
+        negative_ttl: float = 60.0,
+        max_entries: int = 100000,
+        members=None,
+        admin_changes=None,
+    ):
+        self.bot = bot
+        self.negative_ttl = negative_ttl
+        # chat id -> (fetched at, admins); too big for shared cache slots, so kept per process
+        self._admins = TTLCache(ttl, max_entries)
+        self._members = members if members is not None else TTLCache(ttl, max_entries)
+        # chat id -> when its admin list last changed
+        self._admin_changes = admin_changes if admin_changes is not None else TTLCache(ttl, max_entries)
+        self._inflight = {}
+
+    def _cached_admins(self, chat_id: int):
+        cached = self._admins.get(chat_id)
+        if cached is None:
+            return None
+        fetched_at, admins = cached
+        changed_at = self._admin_changes.get(chat_id)
+        if changed_at is not None and changed_at >= fetched_at:
+            return None
+        return admins
+
+    async def get_admins(self, chat_id: int) -> list:
+        """Chat administrators (ChatMember objects), fetched at most once per TTL per chat."""
+        admins = self._cached_admins(chat_id)
+        if admins is not None:
+            return admins
+        fetched_at = time.time()
+        inflight = self._inflight.get(chat_id)
+        if inflight is None:
+            # Concurrent lookups for the same chat share one Bot API call.
+            inflight = asyncio.ensure_future(self.bot.get_chat_administrators(chat_id))
+            self._inflight[chat_id] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(chat_id, None))
+        admins = list(await asyncio.shield(inflight))
+        self._admins.set(chat_id, (fetched_at, admins))
+        return admins
+
+    async def is_member(self, chat_id: int, user_id: int) -> bool:
+        """Whether the user currently belongs to the chat (admins included)."""
+        key = (chat_id, user_id)
+        cached = self._members.get(key)
+        if cached is not None:
+            return cached
+        admins = self._cached_admins(chat_id)
+        if admins and any(admin.user.id == user_id for admin in admins):
+            return True
+        try:
+            member = await self.bot.get_chat_member(chat_id, user_id)
+        except Exception as e:
+            logger.warning("get_chat_member(%s, %s) failed: %s", chat_id, user_id, e)
+            return False
+        is_member = member.status in MEMBER_STATUSES or bool(getattr(member, "is_member", False))
+        self._remember(chat_id, user_id, is_member)
+        return is_member
+
+    def _remember(self, chat_id: int, user_id: int, is_member: bool):
+        self._members.set((chat_id, user_id), is_member, None if is_member else self.negative_ttl)
+
+    def forget_chat(self, chat_id: int):
+        self._admins.pop(chat_id)
+        self._admin_changes.set(chat_id, time.time())
+
+    def apply_update(self, update_json: dict):
+        """
+        Folds membership information carried by a raw update into the cache.
+        Cheap enough to run on every update: most bail out after one dict lookup.
+        """
+        change = update_json.get("chat_member") or update_json.get("my_chat_member")
+        if change:
+            chat_id = change["chat"]["id"]
+            old, new = change.get("old_chat_member", {}), change.get("new_chat_member", {})
+            user_id = new.get("user", {}).get("id")
+            status = new.get("status")
+            self._remember(chat_id, user_id, status in MEMBER_STATUSES or bool(new.get("is_member")))
+            if status in ADMIN_STATUSES or old.get("status") in ADMIN_STATUSES:
+                # Promotions and demotions change the admin list; refetch it on next use.
+                self.forget_chat(chat_id)
+            return
+
+        message = update_json.get("message")
+        if not message or message.get("chat", {}).get("type") not in _GROUP_TYPES:
+            return
+        chat_id = message["chat"]["id"]
+        sender = message.get("from")
+        if sender and not sender.get("is_bot"):
+            self._remember(chat_id, sender["id"], True)
+        for joined in message.get("new_chat_members", ()):
+            self._remember(chat_id, joined["id"], True)
+        left = message.get("left_chat_member")
+        if left:
+            self._remember(chat_id, left["id"], False)
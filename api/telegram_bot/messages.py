@@ -25,3 +25,34 @@ Pre-purchase credits at a discounted rate and get more value!
 ➤ *500 Videos (12,500 credits) →* `$550.00`  _(⚡ $1.10 per video)_
 ➤ *1,000 Videos (25,000 credits) →* `$1,000.00`  _(💎 $1.00 per video)_
 """
+
+MINI_APP_URL = "https://t.me/pumpreelsbot/pumpreelsapp?startapp={doc_id}"
+
+# Every character MarkdownV2 treats as markup, per https://core.telegram.org/bots/api#markdownv2-style
+_MARKDOWN_V2_ESCAPES = str.maketrans({c: "\\" + c for c in "_*[]()~`>#+-=|{}.!\\"})
+
+
+def escape_markdown_v2(text: str) -> str:
+    return str(text).translate(_MARKDOWN_V2_ESCAPES)
+
+
+def build_mini_app_caption(title, credits, doc_id) -> str:
+    """Caption for the 'Open Mini App' card posted into a group (MarkdownV2)."""
+    return (
+        f"{title} has {credits} credits remaining\n"
+        f"Generate your AI Video with our Mini App\\\n"
+        f"📱 [Open Mini App]({MINI_APP_URL.format(doc_id=doc_id)})\n\n"
+        f"OR ENTER\n"
+        f"\\/generate\\_video \\[your prompt\\] and attach an image to create your AI video instantly\\\n\n"
+        f"Powered by \\@PumpReelsBot"
+    )
+
+
+def build_buy_credits_text(group_title: str) -> str:
+    """DM sent to a group admin after the bot is added, prompting a credit purchase (MarkdownV2)."""
+    return (
+        f"👋 Thanks for adding me to *{escape_markdown_v2(group_title)}*\\!\n\n"
+        f"Before I can start working in the group, you\\'ll need to activate me by purchasing credits 💰\\.\n\n"
+        f"👇 Tap below to top up and pump your coin with PumpReels\\:\n\n"
+        f"You can always use /credits to purchase more credits later\\."
+    )
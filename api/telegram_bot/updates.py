@@ -0,0 +1,43 @@
+def bot_added_chat(update_json: dict, bot_username: str):
+    """
+    Returns the chat dict if this update is the service message for `bot_username`
+    being added to a group, otherwise None.
+
+    Almost every update is ordinary chatter, so the checks are ordered to bail out
+    on the first missing key without touching the rest of the payload.
+    """
+    message = update_json.get('message')
+    if not message:
+        return None
+
+    new_chat_participant = message.get('new_chat_participant')
+    if not new_chat_participant:
+        return None
+
+    if not new_chat_participant.get('is_bot', False):
+        return None
+
+    if new_chat_participant.get('username') != bot_username:
+        return None
+
+    return message.get('chat')
+
+
+def update_kind(update_json: dict, commands=()) -> str:
+    """
+    A low-cardinality name for an update: the command for one of `commands`
+    ("/generate_video", also as a photo caption), otherwise the update type
+    ("message", "callback_query", "my_chat_member", ...).
+    """
+    message = update_json.get('message') or update_json.get('edited_message')
+    if message:
+        text = message.get('text') or message.get('caption')
+        if text and text[0] == '/':
+            command = text.split(None, 1)[0].split('@', 1)[0]
+            return command if command[1:] in commands else "other_command"
+        if message.get('web_app_data'):
+            return "web_app_data"
+    for key in update_json:
+        if key != 'update_id':
+            return key
+    return "unknown"
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserState:
+    """What the bot remembers about one user between updates."""
+    __slots__ = ("selected_group_id", "select_group_msg_id", "credit_info_msg_id", "last_seen")
+
+    def __init__(self):
+        self.selected_group_id = None
+        self.select_group_msg_id = None
+        self.credit_info_msg_id = None
+        self.last_seen = time.monotonic()
+
+
+class UserStateStore:
+    """
+    Per-user state with idle-TTL eviction, used instead of PTB's user_data, which
+    keeps a dict for every user who ever touched the bot.
+
+    Entries are kept in last-seen order, so expiring idle users only ever looks at
+    the oldest entries and costs nothing when none are due.
+    """
+
+    def __init__(self, idle_ttl: float = 3600.0, max_users: int = 100000):
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> UserState:
+        """The user's state, created if needed and marked as just used."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = self._states[user_id] = UserState()
+            else:
+                self._states.move_to_end(user_id)
+            state.last_seen = now
+            self._evict(now)
+        return state
+
+    def pop(self, user_id: int):
+        with self._lock:
+            return self._states.pop(user_id, None)
+
+    def _evict(self, now: float):
+        while self._states:
+            user_id, oldest = next(iter(self._states.items()))
+            if now - oldest.last_seen < self.idle_ttl and len(self._states) <= self.max_users:
+                break
+            del self._states[user_id]
+
+    def __len__(self):
+        return len(self._states)
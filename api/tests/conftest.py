@@ -0,0 +1,37 @@
+import os
+import random
+
+import pytest
+
+
+@pytest.fixture(params=["sqlite", "firestore"])
+def storage(request, tmp_path):
+    """
+    A storage backend to run the StorageBackend contract against. SQLite gets a
+    fresh database per test. The Firestore client needs an emulator
+    (FIRESTORE_EMULATOR_HOST) and is skipped without one; tests never touch a real project.
+    """
+    if request.param == "sqlite":
+        from storage.sqlite_client import SQLiteClient
+
+        return SQLiteClient(str(tmp_path / "pumpreels.db"))
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        pytest.skip("FIRESTORE_EMULATOR_HOST is not set")
+    from storage.firestore_client import FirestoreClient
+
+    return FirestoreClient()
+
+
+@pytest.fixture
+def make_group(storage):
+    """Creates a group holding `credits` and returns its (doc_id, chat_id). Chat ids are random, so emulator state can be reused."""
+    def make(credits: int = 0):
+        chat_id = -1001000000000 - random.randrange(10 ** 9)
+        doc_id = storage.create_group(
+            {"id": chat_id, "title": "Test coin", "type": "supergroup"}, 5000000001, "groupadmin", "Admin"
+        )
+        if credits:
+            storage.add_credits(doc_id, credits)
+        return doc_id, chat_id
+
+    return make
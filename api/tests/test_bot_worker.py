@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from telegram_bot.bot_worker import BotWorker, BotWorkerUnavailable
+
+
+def _operations(name: str, seen: list) -> dict:
+    async def echo(value):
+        seen.append((name, value))
+        return {"worker": name, "value": value}
+
+    async def fail():
+        raise ValueError("nope")
+
+    return {"echo": echo, "fail": fail}
+
+
+async def _stop(worker: BotWorker, task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    worker.stop()
+
+
+def test_operations_run_on_the_worker_holding_the_lock(tmp_path):
+    async def run():
+        seen = []
+        path = str(tmp_path / "bot.sock")
+        first, second = BotWorker(path, retry_seconds=0.05, timeout=2), BotWorker(path, retry_seconds=0.05, timeout=2)
+        first_task = asyncio.create_task(first.run(_operations("first", seen)))
+        await asyncio.sleep(0.1)
+        second_task = asyncio.create_task(second.run(_operations("second", seen)))
+        await asyncio.sleep(0.1)
+
+        assert first.active and not second.active
+        assert await second.call("echo", value=1) == {"worker": "first", "value": 1}
+        assert await first.call("echo", value=2) == {"worker": "first", "value": 2}
+        with pytest.raises(RuntimeError, match="nope"):
+            await second.call("fail")
+
+        await _stop(first, first_task)
+        await _stop(second, second_task)
+        assert seen == [("first", 1), ("first", 2)]
+
+    asyncio.run(run())
+
+
+def test_another_worker_takes_over_when_the_bot_worker_exits(tmp_path):
+    async def run():
+        seen = []
+        path = str(tmp_path / "bot.sock")
+        first, second = BotWorker(path, retry_seconds=0.05, timeout=2), BotWorker(path, retry_seconds=0.05, timeout=2)
+        first_task = asyncio.create_task(first.run(_operations("first", seen)))
+        await asyncio.sleep(0.1)
+        second_task = asyncio.create_task(second.run(_operations("second", seen)))
+        await asyncio.sleep(0.1)
+
+        await _stop(first, first_task)
+        if not second.active:
+            with pytest.raises(BotWorkerUnavailable):
+                await first.call("echo", value=1)
+        await asyncio.sleep(0.2)
+
+        assert second.active
+        assert await first.call("echo", value=2) == {"worker": "second", "value": 2}
+        await _stop(second, second_task)
+
+    asyncio.run(run())
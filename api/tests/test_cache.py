@@ -0,0 +1,20 @@
+import time
+
+from storage.cache import TTLCache
+
+
+def test_eviction_drops_the_least_recently_read_entry():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_expired_entries_are_dropped_on_read():
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a", "missing") == "missing"
+    assert len(cache) == 0
@@ -0,0 +1,30 @@
+from storage.models import Group, Render, Transaction
+
+
+def test_to_dict_keeps_every_field():
+    group = Group(doc_id="g1", group_id=-1001, title="Test coin")
+
+    data = group.to_dict()
+
+    assert list(data) == list(Group._fields)
+    assert data["creator_username"] is None
+    assert Group.from_dict(data) == group
+
+
+def test_to_dict_of_a_projection():
+    group = Group(doc_id="g1", title="Test coin", credits=100)
+
+    assert group.to_dict(fields=("doc_id", "title", "credits")) == {"doc_id": "g1", "title": "Test coin", "credits": 100}
+
+
+def test_new_transaction_document_has_no_confirmation():
+    document = Transaction(payment_id="p1", group_id="-1001", credits=1000).to_document()
+
+    assert "payment_id" not in document
+    assert "confirmed_at" in document and document["confirmed_at"] is None
+
+
+def test_render_round_trip():
+    render = Render(job_id="pika:abc", chat_id=-1001, doc_id="g1", message_id=5)
+
+    assert Render.from_dict(render.to_dict()) == render
@@ -0,0 +1,183 @@
+"""
+Supervised renders: the concurrency cap, /cancel, and what a shutdown drain does
+with each render depending on how far it got.
+"""
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from ai_services.render_tasks import RenderSupervisor
+from storage.sqlite_client import SQLiteClient
+
+START_CREDITS = 1000
+VIDEO_CREDITS = 100
+
+
+@pytest.fixture(scope="module")
+def main_module(tmp_path_factory):
+    """The app module, imported against a throwaway SQLite database and a dummy bot token."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("STORAGE_BACKEND", "sqlite")
+        mp.setenv("SQLITE_PATH", str(tmp_path_factory.mktemp("main") / "pumpreels.db"))
+        mp.setenv("TELEGRAM_BOT_TOKEN", "123456:test-token")
+        return importlib.import_module("main")
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.deleted = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append((chat_id, message_id))
+
+
+class FakeRouter:
+    def __init__(self):
+        self.cancelled = []
+
+    async def cancel(self, job_id):
+        self.cancelled.append(job_id)
+        return True
+
+
+class FakeHandoff:
+    def __init__(self):
+        self.parked = []
+
+    def park(self, checkpoint):
+        self.parked.append(checkpoint)
+
+
+@pytest.fixture
+def app(main_module, monkeypatch, tmp_path):
+    """`main` with fresh render state, a real SQLite ledger and fake Telegram, provider and hand-off."""
+    storage = SQLiteClient(str(tmp_path / "ledger.db"))
+    doc_id = storage.create_group({"id": -1001, "title": "Test coin", "type": "supergroup"}, 1, "groupadmin", "Admin")
+    storage.add_credits(doc_id, START_CREDITS)
+    bot, router, handoff = FakeBot(), FakeRouter(), FakeHandoff()
+    monkeypatch.setattr(main_module, "storage_client", storage)
+    monkeypatch.setattr(main_module, "application", SimpleNamespace(bot=bot))
+    monkeypatch.setattr(main_module, "video_router", router)
+    monkeypatch.setattr(main_module, "render_handoff", handoff)
+    monkeypatch.setattr(main_module, "render_supervisor", RenderSupervisor(max_concurrent=10))
+    monkeypatch.setattr(main_module, "draining", False)
+    monkeypatch.setattr(main_module, "DELIVERY_GRACE_SECONDS", 0.05)
+    monkeypatch.setattr(main_module, "VIDEO_CREDITS", VIDEO_CREDITS)
+    return SimpleNamespace(main=main_module, storage=storage, doc_id=doc_id, bot=bot, router=router, handoff=handoff)
+
+
+def _credits(app) -> int:
+    return app.storage.get_group_by_id(app.doc_id).credits
+
+
+async def _stage(supervisor, stage: str, **fields):
+    """A render body that records `fields`, enters `stage` and then hangs until cancelled."""
+    render = supervisor.current()
+    render.update(**fields)
+    render.set_stage(stage)
+    await asyncio.sleep(60)
+
+
+def test_supervisor_caps_concurrent_renders():
+    async def run():
+        supervisor = RenderSupervisor(max_concurrent=1)
+        release = asyncio.Event()
+
+        async def body():
+            await release.wait()
+
+        first = supervisor.spawn(body(), chat_id=-1)
+        second = supervisor.spawn(body(), chat_id=-2)
+        await asyncio.sleep(0.01)
+        assert (first.stage, second.stage) == ("running", "waiting")
+        assert supervisor.find(chat_id=-2) is second and supervisor.get(first.task_id) is first
+
+        release.set()
+        await asyncio.gather(first.task, second.task)
+        assert len(supervisor) == 0
+
+    asyncio.run(run())
+
+
+def test_cancel_during_rendering_refunds_once(app):
+    async def run():
+        supervisor = app.main.render_supervisor
+        render = supervisor.spawn(_stage(supervisor, "rendering", job_id="pika:r1", message_id=7, charged=True),
+                                  chat_id=-1001, doc_id=app.doc_id)
+        await asyncio.sleep(0.01)
+
+        assert await app.main.cancel_render(render)
+        assert render.task.cancelled() and not render.charged
+        assert app.router.cancelled == ["pika:r1"]
+        assert app.bot.deleted == [(-1001, 7)]
+        # Already finished: a second /cancel is refused and refunds nothing.
+        assert not await app.main.cancel_render(render)
+
+    asyncio.run(run())
+    assert _credits(app) == START_CREDITS + VIDEO_CREDITS
+
+
+def test_cancel_is_refused_while_delivering(app):
+    async def run():
+        supervisor = app.main.render_supervisor
+        render = supervisor.spawn(_stage(supervisor, "delivering", job_id="pika:d1", message_id=7, charged=True),
+                                  chat_id=-1001, doc_id=app.doc_id)
+        await asyncio.sleep(0.01)
+
+        assert not await app.main.cancel_render(render)
+        assert not render.task.done() and render.charged
+        render.task.cancel()
+        await asyncio.gather(render.task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert _credits(app) == START_CREDITS
+    assert app.router.cancelled == [] and app.bot.deleted == []
+
+
+def test_drain_parks_polling_renders_and_refunds_the_rest(app):
+    async def run():
+        supervisor = app.main.render_supervisor
+        supervisor.max_concurrent = 3
+        polling = supervisor.spawn(_stage(supervisor, "rendering", job_id="pika:r1", message_id=7, charged=True),
+                                   chat_id=-1001, doc_id=app.doc_id)
+        delivering = supervisor.spawn(_stage(supervisor, "delivering", job_id="pika:d1", message_id=8, charged=True),
+                                      chat_id=-1002, doc_id=app.doc_id)
+        charged = supervisor.spawn(_stage(supervisor, "charged", charged=True), chat_id=-1003, doc_id=app.doc_id)
+        waiting = supervisor.spawn(_stage(supervisor, "rendering"), chat_id=-1004, doc_id=app.doc_id)
+        await asyncio.sleep(0.01)
+        assert waiting.stage == "waiting"
+
+        await app.main.drain_renders(timeout=0.05)
+        assert app.main.draining
+        assert all(render.task.done() for render in (polling, delivering, charged, waiting))
+        assert [checkpoint.job_id for checkpoint in app.handoff.parked] == ["pika:r1"]
+        assert polling.charged and not delivering.charged and not charged.charged
+        restarting = app.main.VIDEO_SERVICE_RESTARTING
+        assert sorted(app.bot.sent) == [(-1004, restarting), (-1003, restarting)]
+
+    asyncio.run(run())
+    # The delivering and the not-yet-submitted render are refunded; the parked one is resumed elsewhere.
+    assert _credits(app) == START_CREDITS + 2 * VIDEO_CREDITS
+    assert app.storage.render_refunded("pika:d1") and not app.storage.render_refunded("pika:r1")
+
+
+def test_drain_without_handoff_refunds_polling_renders(app, monkeypatch):
+    monkeypatch.setattr(app.main, "render_handoff", None)
+
+    async def run():
+        supervisor = app.main.render_supervisor
+        render = supervisor.spawn(_stage(supervisor, "rendering", job_id="pika:r1", message_id=7, charged=True),
+                                  chat_id=-1001, doc_id=app.doc_id)
+        await asyncio.sleep(0.01)
+        await app.main.drain_renders(timeout=0.05)
+        assert not render.charged
+
+    asyncio.run(run())
+    assert _credits(app) == START_CREDITS + VIDEO_CREDITS
+    assert app.handoff.parked == []
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from ai_services import router as router_module
+from ai_services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryBudget
+from ai_services.router import AllProvidersFailed, RenderRequest, VideoRouter
+from ai_services.video_generator import ProviderError, VideoGenerator
+
+
+class FakeProvider(VideoGenerator):
+    """Accepts jobs unless told to fail the next `failures` submissions (or all of them)."""
+
+    def __init__(self, name: str, cost_per_second: float = 0.0, failures: int = 0):
+        self.name = name
+        self.cost_per_second = cost_per_second
+        self.failures = failures
+        self.submissions = 0
+
+    async def create_video(self, image_bytes, prompt_text, negative_prompt="", duration=5, resolution="720p"):
+        self.submissions += 1
+        if self.failures:
+            self.failures -= 1
+            raise ProviderError(self.name, "rejected")
+        return f"task{self.submissions}"
+
+    async def get_task_status(self, task_id):
+        return {"status": "finished", "video_url": f"https://example.com/{task_id}.mp4"}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(router_module, "backoff_delay", lambda attempt: 0)
+
+
+def _request() -> RenderRequest:
+    return RenderRequest(b"image", "a coin on the moon")
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout():
+    breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available() and not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN and breaker.available()
+    assert breaker.allow_request()
+    # The single probe is taken; further calls wait for its outcome.
+    assert not breaker.available() and not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+
+
+def test_retry_budget_is_exhausted_and_refilled_by_deposits():
+    budget = RetryBudget(ratio=0.5, min_tokens=2, max_tokens=3)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+    for _ in range(10):
+        budget.deposit()
+    assert [budget.try_spend() for _ in range(4)] == [True, True, True, False]
+
+
+def test_router_retries_a_provider_before_moving_on():
+    flaky = FakeProvider("flaky", failures=1)
+    router = VideoRouter([flaky, FakeProvider("spare", cost_per_second=1.0)])
+    job_id = asyncio.run(router.submit(_request()))
+    assert job_id == "flaky:task2"
+    assert router.breakers["flaky"].state == CLOSED
+
+
+def test_router_fails_over_in_rank_order():
+    cheap = FakeProvider("cheap", failures=10)
+    middle = FakeProvider("middle", cost_per_second=0.1)
+    pricey = FakeProvider("pricey", cost_per_second=1.0)
+    router = VideoRouter([pricey, cheap, middle], max_attempts=2)
+    assert router.ranked() == ["cheap", "middle", "pricey"]
+
+    job_id = asyncio.run(router.submit(_request()))
+    assert job_id == "middle:task1"
+    assert cheap.submissions == 2 and pricey.submissions == 0
+
+
+def test_router_skips_providers_whose_circuit_is_open():
+    broken = FakeProvider("broken", failures=10)
+    healthy = FakeProvider("healthy", cost_per_second=1.0)
+    router = VideoRouter([broken, healthy], max_attempts=1, failure_threshold=2, open_seconds=60)
+    asyncio.run(router.submit(_request()))
+    asyncio.run(router.submit(_request()))
+    assert router.breakers["broken"].state == OPEN
+
+    assert asyncio.run(router.submit(_request())) == "healthy:task3"
+    assert broken.submissions == 2
+
+
+def test_router_raises_when_every_provider_fails():
+    first, second = FakeProvider("first", failures=10), FakeProvider("second", cost_per_second=1.0, failures=10)
+    router = VideoRouter([first, second], max_attempts=2)
+    with pytest.raises(AllProvidersFailed, match="second: rejected"):
+        asyncio.run(router.submit(_request()))
+    assert first.submissions == 2 and second.submissions == 2
+
+
+def test_router_stops_retrying_when_the_budget_is_spent():
+    flaky = FakeProvider("flaky", failures=100)
+    router = VideoRouter([flaky], max_attempts=10, failure_threshold=100)
+    router.retry_budgets["flaky"] = RetryBudget(ratio=0, min_tokens=2)
+    with pytest.raises(AllProvidersFailed):
+        asyncio.run(router.submit(_request()))
+    # One first attempt and two retries before the budget ran out.
+    assert flaky.submissions == 3
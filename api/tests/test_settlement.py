@@ -0,0 +1,82 @@
+"""
+Exactly-once money paths: Radom payment settlement and render refunds.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import payloads
+
+PLAN_CREDITS = 1000
+VIDEO_CREDITS = 100
+
+
+def record_payment(storage, chat_id: int):
+    event = payloads.managed_payment_event(chat_id, PLAN_CREDITS)
+    assert storage.create_transaction(event) is True
+    return event, event["eventData"]["managedPayment"]["transactions"][0]["transactionHash"]
+
+
+def test_confirmation_credits_the_group(storage, make_group):
+    doc_id, chat_id = make_group()
+    _, tx_hash = record_payment(storage, chat_id)
+
+    assert storage.confirm_transaction_by_tx_hash(tx_hash) == str(chat_id)
+    assert storage.get_group_by_id(doc_id).credits == PLAN_CREDITS
+
+
+def test_duplicate_confirmation_credits_once(storage, make_group):
+    doc_id, chat_id = make_group()
+    _, tx_hash = record_payment(storage, chat_id)
+
+    assert storage.confirm_transaction_by_tx_hash(tx_hash) == str(chat_id)
+    assert storage.confirm_transaction_by_tx_hash(tx_hash) == "already_confirmed"
+    assert storage.get_group_by_id(doc_id).credits == PLAN_CREDITS
+
+
+def test_concurrent_confirmations_credit_once(storage, make_group):
+    doc_id, chat_id = make_group()
+    _, tx_hash = record_payment(storage, chat_id)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(storage.confirm_transaction_by_tx_hash, [tx_hash] * 8))
+
+    assert results.count(str(chat_id)) == 1
+    assert results.count("already_confirmed") == 7
+    assert storage.get_group_by_id(doc_id).credits == PLAN_CREDITS
+
+
+def test_redelivered_payment_does_not_reset_a_confirmed_transaction(storage, make_group):
+    doc_id, chat_id = make_group()
+    event, tx_hash = record_payment(storage, chat_id)
+    storage.confirm_transaction_by_tx_hash(tx_hash)
+
+    assert storage.create_transaction(event) is False
+    assert storage.confirm_transaction_by_tx_hash(tx_hash) == "already_confirmed"
+    assert storage.get_group_by_id(doc_id).credits == PLAN_CREDITS
+
+
+def test_unknown_transaction_hash(storage):
+    assert storage.confirm_transaction_by_tx_hash(uuid.uuid4().hex) is None
+
+
+def test_second_refund_returns_false(storage, make_group):
+    doc_id, _ = make_group(credits=VIDEO_CREDITS)
+    storage.decrement_credits(doc_id, VIDEO_CREDITS)
+    job_id = f"pika:{uuid.uuid4().hex}"
+
+    assert storage.render_refunded(job_id) is False
+    assert storage.refund_render_once(doc_id, job_id, VIDEO_CREDITS) is True
+    assert storage.refund_render_once(doc_id, job_id, VIDEO_CREDITS) is False
+    assert storage.render_refunded(job_id) is True
+    assert storage.get_group_by_id(doc_id).credits == VIDEO_CREDITS
+
+
+def test_concurrent_refunds_refund_once(storage, make_group):
+    doc_id, _ = make_group()
+    job_id = f"pika:{uuid.uuid4().hex}"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: storage.refund_render_once(doc_id, job_id, VIDEO_CREDITS), range(8)))
+
+    assert results.count(True) == 1
+    assert storage.get_group_by_id(doc_id).credits == VIDEO_CREDITS
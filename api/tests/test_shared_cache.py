@@ -0,0 +1,75 @@
+import multiprocessing
+import time
+
+from storage.shared_cache import SharedCache
+
+# Few slots for the keys in play, so writers also keep evicting each other's entries.
+SLOTS = 16
+KEYS = [f"key{i}" for i in range(24)]
+RUN_SECONDS = 1.0
+
+
+def _value(key: str, n: int) -> dict:
+    """A value that can be checked on its own: its filler is derived from its key and counter."""
+    return {"key": key, "n": n, "filler": f"{key}:{n}:" * (n % 20)}
+
+
+def _write(path: str, worker: int, deadline: float):
+    cache = SharedCache(path, slots=SLOTS)
+    n = worker
+    while time.time() < deadline:
+        key = KEYS[n % len(KEYS)]
+        cache.set(key, _value(key, n), ttl=60)
+        if n % 7 == 0:
+            cache.pop(key)
+        n += 3
+
+
+def _read(path: str, deadline: float, results):
+    cache = SharedCache(path, slots=SLOTS)
+    reads = torn = 0
+    while time.time() < deadline:
+        for key in KEYS:
+            try:
+                value = cache.get(key)
+            except Exception:
+                torn += 1
+                continue
+            if value is None:
+                continue
+            reads += 1
+            if value["key"] != key or value != _value(key, value["n"]):
+                torn += 1
+    results.put((reads, torn))
+
+
+def test_concurrent_readers_never_see_torn_values(tmp_path):
+    path = str(tmp_path / "cache")
+    SharedCache(path, slots=SLOTS)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    deadline = time.time() + RUN_SECONDS
+    processes = [context.Process(target=_write, args=(path, worker, deadline)) for worker in range(3)]
+    processes += [context.Process(target=_read, args=(path, deadline, results)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=30) for _ in range(3)]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert sum(reads for reads, _ in outcomes) > 0
+    assert sum(torn for _, torn in outcomes) == 0
+
+
+def test_values_written_by_one_process_are_read_by_another(tmp_path):
+    path = str(tmp_path / "cache")
+    context = multiprocessing.get_context("fork")
+    writer = context.Process(target=lambda: SharedCache(path).set("greeting", {"hello": "world"}, ttl=60))
+    writer.start()
+    writer.join(timeout=30)
+
+    cache = SharedCache(path)
+    assert cache.get("greeting") == {"hello": "world"}
+    assert cache.pop("greeting") == {"hello": "world"}
+    assert cache.get("greeting") is None
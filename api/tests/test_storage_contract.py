@@ -0,0 +1,68 @@
+"""
+StorageBackend behaviour every backend must share: credits, group lookups and
+render charges. Settlement and refunds are covered in test_settlement.py.
+"""
+import uuid
+
+import pytest
+
+VIDEO_CREDITS = 100
+
+
+def test_decrement_credits(storage, make_group):
+    doc_id, _ = make_group(credits=250)
+
+    storage.decrement_credits(doc_id, VIDEO_CREDITS)
+
+    assert storage.get_group_by_id(doc_id).credits == 150
+
+
+def test_decrement_credits_without_enough_credits(storage, make_group):
+    doc_id, _ = make_group(credits=50)
+
+    with pytest.raises(ValueError, match="Not enough credits"):
+        storage.decrement_credits(doc_id, VIDEO_CREDITS)
+    assert storage.get_group_by_id(doc_id).credits == 50
+
+
+def test_decrement_credits_of_missing_group(storage):
+    with pytest.raises(ValueError, match="Group does not exist"):
+        storage.decrement_credits(uuid.uuid4().hex, VIDEO_CREDITS)
+
+
+def test_refund_to_missing_group_is_not_recorded(storage):
+    job_id = f"pika:{uuid.uuid4().hex}"
+    with pytest.raises(ValueError, match="Group does not exist"):
+        storage.refund_render_once(uuid.uuid4().hex, job_id, VIDEO_CREDITS)
+    assert storage.render_refunded(job_id) is False
+
+
+def test_decrement_credits_never_goes_negative(storage, make_group):
+    doc_id, _ = make_group(credits=VIDEO_CREDITS)
+    storage.decrement_credits(doc_id, VIDEO_CREDITS)
+
+    with pytest.raises(ValueError, match="Not enough credits"):
+        storage.decrement_credits(doc_id, VIDEO_CREDITS)
+    assert storage.get_group_by_id(doc_id).credits == 0
+
+
+def test_group_lookups(storage, make_group):
+    doc_id, chat_id = make_group(credits=VIDEO_CREDITS)
+
+    group = storage.get_group(chat_id)
+    assert group.doc_id == doc_id
+    assert group.group_id == chat_id
+    assert group.credits == VIDEO_CREDITS
+    assert group.creator_username == "groupadmin"
+    assert storage.get_group_by_id(doc_id) == group
+    assert storage.get_group(chat_id - 1) is None
+    assert storage.get_group_by_id(uuid.uuid4().hex) is None
+
+
+def test_render_charge(storage, make_group):
+    doc_id, _ = make_group()
+    job_id = f"pika:{uuid.uuid4().hex}"
+
+    assert storage.render_charge(job_id) is None
+    storage.record_render_charge(doc_id, job_id)
+    assert storage.render_charge(job_id) == doc_id
@@ -0,0 +1 @@
+from .auth import verify_init_data
@@ -0,0 +1,53 @@
+import functools
+import hashlib
+import hmac
+import json
+import logging
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=4)
+def _secret_key(bot_token: str) -> bytes:
+    # Depends only on the bot token, so derive it once instead of on every request.
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def verify_init_data(init_data: str, bot_token: str) -> dict:
+    """
+    Validates Telegram WebApp initData as described in
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+
+    Parameters:
+      init_data (str): Raw query string from `Telegram.WebApp.initData`.
+      bot_token (str): Token of the bot the mini app belongs to.
+
+    Returns:
+      The decoded fields (with "user" parsed from JSON), or None if the signature is invalid.
+    """
+    vals = {}
+    for pair in init_data.split('&'):
+        key, sep, value = pair.partition('=')
+        if not sep:
+            return None
+        vals[key] = unquote(value)
+
+    their_hash = vals.pop("hash", None)
+    if not their_hash:
+        return None
+
+    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(vals.items()))
+    our_hash = hmac.new(_secret_key(bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
+
+    if not hmac.compare_digest(our_hash, their_hash):
+        return None
+
+    if "user" in vals:
+        try:
+            vals["user"] = json.loads(vals["user"])
+        except Exception as e:
+            logger.error(f"Error getting user: {e}")
+            return None
+
+    return vals